@@ -14,3 +14,26 @@ MDB = getenv("MDB", "")
 CLOUD_NAME=""
 API_KEY=""
 API_SECRET=""
+
+# Batch engine: concurrent download workers and messages committed per second
+BATCH_WORKERS = int(getenv("BATCH_WORKERS", "3"))
+BATCH_RATE = float(getenv("BATCH_RATE", "1"))
+# Pipe media from the userbot's download straight into the Bot's upload
+STREAM_MEDIA = getenv("STREAM_MEDIA", "True").lower() == "true"
+# Job scheduler: worker coroutines, batches allowed to run at once, and
+# global caps on concurrent downloads, uploads and ffmpeg processes
+QUEUE_WORKERS = int(getenv("QUEUE_WORKERS", "8"))
+BATCH_SLOTS = int(getenv("BATCH_SLOTS", "4"))
+# Workers reserved for single /clone jobs, so batches never hold them up
+CLONE_WORKERS = int(getenv("CLONE_WORKERS", "4"))
+DOWNLOAD_SLOTS = int(getenv("DOWNLOAD_SLOTS", "6"))
+UPLOAD_SLOTS = int(getenv("UPLOAD_SLOTS", "6"))
+FFMPEG_SLOTS = int(getenv("FFMPEG_SLOTS", "2"))
+# Transfers (save_file/get_file) each client runs at once; Pyrogram's
+# default of 1 would serialise parallel part uploads and downloads
+MAX_TRANSMISSIONS = int(getenv("MAX_TRANSMISSIONS", "8"))
+# Seconds an ffmpeg process may run before it is killed
+FFMPEG_TIMEOUT = float(getenv("FFMPEG_TIMEOUT", "60"))
+# Outbound HTTP (thumbnails, Cloudinary): pooled connections and seconds per request
+HTTP_CONNECTIONS = int(getenv("HTTP_CONNECTIONS", "20"))
+HTTP_TIMEOUT = float(getenv("HTTP_TIMEOUT", "30"))
@@ -1,6 +1,6 @@
 from pyrogram import Client
 from pyromod import listen
-from config import API_ID, API_HASH, BOT_TOKEN, SESSION, FORCESUB
+from config import API_ID, API_HASH, BOT_TOKEN, SESSION, FORCESUB, MAX_TRANSMISSIONS
 import logging, time, sys
 
 log_file = "bot_logs.txt"
@@ -17,7 +17,13 @@ logger = logging.getLogger(__name__)
 logging.getLogger("pyrogram").setLevel(logging.INFO)
 
 # Initialize the user client with session string
-userbot = Client("myacc", api_id=API_ID, api_hash=API_HASH, session_string=SESSION)
+userbot = Client(
+    "myacc",
+    api_id=API_ID,
+    api_hash=API_HASH,
+    session_string=SESSION,
+    max_concurrent_transmissions=MAX_TRANSMISSIONS
+)
 
 try:
     userbot.start()
@@ -31,7 +37,8 @@ Bot = Client(
     bot_token=BOT_TOKEN,
     api_id=int(API_ID),
     api_hash=API_HASH,
-    workers=50
+    workers=50,
+    max_concurrent_transmissions=MAX_TRANSMISSIONS
 )    
 
 try:
@@ -35,5 +35,20 @@ if __name__ == "__main__":
     
     logger.info("Bot Started :)")
     
+    # Re-queue jobs left waiting by the previous run, then pick up the
+    # batches it was in the middle of
+    import asyncio
+    from main.plugins.jobqueue import job_queue
+    from main.plugins.batch import resume_interrupted_batches
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(job_queue.recover())
+    loop.create_task(resume_interrupted_batches())
+    
     # Use Pyrogram's idle function instead of Telethon's run_until_disconnected
     idle()
+    
+    # Write out statistics counters that are still buffered in memory
+    from main.plugins.db import db
+    asyncio.get_event_loop().run_until_complete(db.flush_stats())
+    from main.plugins.httpclient import http_client
+    asyncio.get_event_loop().run_until_complete(http_client.close())
@@ -4,35 +4,44 @@ import os
 import asyncio
 import json
 import re
+import shutil
 from datetime import timedelta
 
 from .. import userbot
 from .. import Bot
-from main.plugins.pyroplug import check, get_msg
+from main.plugins.pyroplug import check, get_msg, check_channel_content_protection, needs_download, will_stream, prefetch_media, prestream_media, batch_download_dir, safe_send_message
+from main.plugins.ratelimit import batch_limiter, limiter
+from main.plugins.chatcache import chat_cache
+from main.plugins.mediacache import media_cache
+from main.plugins.progress import cancel_transfers, progress_hub
 from main.plugins.helpers import get_link, screenshot
-from main.plugins.db import db
+from main.plugins.db import db, reserved_billing, RESUMABLE_BATCH_STATUSES
+from main.plugins.jobqueue import job_queue, job_priority
 
 from pyrogram import Client, filters
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from pyrogram.errors import FloodWait, PeerIdInvalid, ChatIdInvalid
 
-from config import AUTH, ADMIN_ONLY
+from config import AUTH, ADMIN_ONLY, BATCH_WORKERS, BATCH_SLOTS
 
 MESSAGE_COOLDOWN = 5
+PREFETCH_CHUNK = 200  # most IDs Telegram returns from a single get_messages
 CONVERSATION_TIMEOUT = 120
+MAX_BATCH_RESUMES = 3  # restarts a job may survive before it is given up as failed
 
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 logging.getLogger("pyrogram").setLevel(logging.WARNING)
 
-batch = []
-ids = []
+# Users whose batch is in the setup conversation, queued or running;
+# dropping a user from the set stops their batch at the next message
+batch = set()
 last_message_time = {}
 
-def is_auth(user_id):
+async def is_auth(user_id):
     try:
-        return user_id in AUTH or db.is_user_authorized(user_id)
+        return user_id in AUTH or await db.is_user_authorized(user_id)
     except Exception as e:
         logger.error(f"Error checking auth status: {e}")
         return False
@@ -75,13 +84,11 @@ async def extract_chat_info(userbot, base_link):
             # Keep username as is for public channels
             chat_id = username
         
-        # Try to get channel name
+        # Try to get channel name (cached, shared with pyroplug's lookups)
         try:
-            chat = await userbot.get_chat(chat_id)
-            if hasattr(chat, 'title'):
+            chat = await chat_cache.get(userbot, chat_id)
+            if chat.title:
                 channel_name = chat.title
-            elif hasattr(chat, 'first_name'):
-                channel_name = chat.first_name
         except Exception as e:
             logger.warning(f"Could not get channel name: {e}")
             # For private channels, try to get at least one message to extract the chat info
@@ -89,8 +96,8 @@ async def extract_chat_info(userbot, base_link):
                 try:
                     # Try to get chat info from message history
                     async for msg in userbot.get_chat_history(chat_id, limit=1):
-                        chat = await userbot.get_chat(chat_id)
-                        if hasattr(chat, 'title'):
+                        chat = await chat_cache.get(userbot, chat_id)
+                        if chat.title:
                             channel_name = chat.title
                         break
                 except Exception as e2:
@@ -164,16 +171,16 @@ def parse_set_theory_notation(text, start_msg_id=None):
     
     return sorted(list(message_ids))
 
-def check_user_limits(user_id):
+async def check_user_limits(user_id, check_quota=True):
     try:
-        if user_id in AUTH or db.is_user_authorized(user_id):
+        if user_id in AUTH or await db.is_user_authorized(user_id):
             return True, None
         
-        remaining_msgs = db.get_remaining_messages(user_id)
+        remaining_msgs = await db.get_remaining_messages(user_id) if check_quota else None
         if remaining_msgs is not None and remaining_msgs <= 0:
             return False, "You've reached your message limit."
         
-        expiration_time = db.get_expiration_time_remaining(user_id)
+        expiration_time = await db.get_expiration_time_remaining(user_id)
         if expiration_time is not None and expiration_time.total_seconds() <= 0:
             return False, "Your subscription has expired."
         
@@ -182,12 +189,51 @@ def check_user_limits(user_id):
         logger.error(f"Error checking user limits: {e}")
         return True, None
 
-def calculate_timer(index):
-    if index < 250: return 2
-    if index < 1000: return 3
-    if index < 10000: return 4
-    if index < 50000: return 5
-    return 6
+class MessagePrefetcher:
+    """Fetches a batch's source messages PREFETCH_CHUNK IDs per get_messages
+    call. Workers asking for IDs in the same chunk share one request, and
+    chunks the engine has moved past are dropped."""
+
+    def __init__(self, userbot, chat_id, message_ids):
+        self.userbot = userbot
+        self.chat_id = chat_id
+        self.message_ids = message_ids
+        self._positions = {msg_id: pos for pos, msg_id in enumerate(message_ids)}
+        self._chunks = {}
+
+    async def _fetch(self, start):
+        ids = self.message_ids[start:start + PREFETCH_CHUNK]
+        messages = await limiter.call(self.userbot.get_messages, self.chat_id, ids)
+        return {msg.id: msg for msg in messages if msg and not getattr(msg, 'empty', False)}
+
+    async def get(self, msg_id):
+        start = self._positions[msg_id] // PREFETCH_CHUNK * PREFETCH_CHUNK
+        if start not in self._chunks:
+            for old_start in [s for s in self._chunks if s < start - PREFETCH_CHUNK]:
+                del self._chunks[old_start]
+            self._chunks[start] = asyncio.ensure_future(self._fetch(start))
+        messages = await self._chunks[start]
+        return messages.get(msg_id)
+
+async def prepare_batch_item(prefetcher, userbot, client, item, source_chat_id, pinned_ids, download, ctx):
+    """Download stage of the batch engine: resolve one message ahead of its
+    turn and, when it can only be cloned by re-uploading, fetch its media."""
+    try:
+        item["message"] = await prefetcher.get(item["msg_id"])
+    except Exception as e:
+        logger.error(f"Error getting original message: {e}")
+        return item
+    
+    item["is_pinned"] = item["msg_id"] in pinned_ids
+    # Streamable media is piped straight into the Bot's upload instead of
+    # staged on disk, so commit only has to send it; media the Bot already
+    # uploaded is re-sent by file_id without either
+    if download and needs_download(item["message"]) and not await media_cache.lookup(item["message"], ctx):
+        if will_stream(item["message"], ctx):
+            item["uploaded"] = await prestream_media(userbot, client, item["message"])
+        else:
+            item["file"] = await prefetch_media(userbot, source_chat_id, item["message"], ctx)
+    return item
 
 def create_progress_bar(current, total, length=20):
     filled_length = int(length * current // total)
@@ -217,18 +263,15 @@ async def update_countdown(client, chat_id, message_id, current, total, stats=No
             if count > 0:  # Only show file types that have counts > 0
                 progress += f"• **{file_type}:** `{count}`\n"
     
-    try:
-        await client.edit_message_text(
-            chat_id=chat_id,
-            message_id=message_id,
-            text=progress,
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("❌ Cancel Batch", callback_data="cancel")],
-                [InlineKeyboardButton("📢 Join Channel", url="https://t.me/officialharsh_g")]
-            ])
-        )
-    except Exception as e:
-        logger.error(f"Error updating countdown: {e}")
+    # Coalesced with every other status edit; only the latest state is sent
+    progress_hub.publish(
+        client, chat_id, message_id, progress,
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("❌ Cancel Batch", callback_data="cancel")],
+            [InlineKeyboardButton("📢 Join Channel", url="https://t.me/officialharsh_g")]
+        ]),
+        final=current >= total
+    )
 
 def format_size(size_bytes):
     if size_bytes < 1024:
@@ -255,18 +298,21 @@ def format_stats_summary(stats, total_size=None):
     return summary
 
 async def handle_floodwait(client, sender, wait_time):
-    wait_msg = await client.send_message(
+    # Slow every caller on this client down too, not just this batch
+    limiter.penalize(client, wait_time)
+    wait_msg = await safe_send_message(
+        client,
         sender, 
         f"⏱️ **FloodWait Detected**\n\nWaiting `{wait_time}s` due to Telegram's rate limit..."
     )
-    # Add extra time to the wait to be safer
-    await asyncio.sleep(wait_time + 5)
-    try:
-        await client.delete_messages(sender, wait_msg.id)
-    except Exception as e:
-        logger.error(f"Error deleting wait message: {e}")
+    await asyncio.sleep(wait_time)
+    if wait_msg:
+        try:
+            await client.delete_messages(sender, wait_msg.id)
+        except Exception as e:
+            logger.error(f"Error deleting wait message: {e}")
       
-async def run_batch(userbot, client, sender, countdown_msg, base_link, message_ids=None, fetch_all=False):
+async def run_batch(userbot, client, sender, countdown_id, base_link, message_ids=None, fetch_all=False, ctx=None, job=None):
     file_stats = {
         "Videos": 0,
         "Photos": 0,
@@ -282,17 +328,32 @@ async def run_batch(userbot, client, sender, countdown_msg, base_link, message_i
     
     total_size = 0
     processed_count = 0
+    start = 0
+    job_id = None
     
-    is_authorized = sender in AUTH or db.is_user_authorized(sender)
+    # A resumed job brings its message list, stats and cursor from the
+    # batch_jobs collection; everything before the cursor is already done
+    if job is not None:
+        job_id = job["_id"]
+        start = job["cursor"]
+        message_ids = job["message_ids"]
+        fetch_all = False
+        file_stats.update(job["stats"].get("file_stats", {}))
+        total_size = job["stats"].get("total_size", 0)
+        processed_count = job["stats"].get("processed_count", 0)
+    
+    if ctx is None:
+        ctx = await db.get_user_context(sender)
+    is_authorized = sender in AUTH or ctx.is_authorized
     
     # Get chat_id where to send messages
     dest_chat_id = None
     try:
-        dest_chat_id = db.get_chat_id(sender)
+        dest_chat_id = job["dest_chat_id"] if job is not None else ctx.chat_id
         # Validate chat_id
         if dest_chat_id:
             try:
-                await client.get_chat(dest_chat_id)
+                await chat_cache.get(client, dest_chat_id)
             except (PeerIdInvalid, ChatIdInvalid):
                 logger.warning(f"Invalid destination chat_id {dest_chat_id} for user {sender}. Using sender's ID instead.")
                 dest_chat_id = sender
@@ -306,6 +367,7 @@ async def run_batch(userbot, client, sender, countdown_msg, base_link, message_i
     # If chat_id is None or invalid, use sender's ID
     if not dest_chat_id:
         dest_chat_id = sender
+    ctx.chat_id = dest_chat_id
     
     # Extract chat info
     chat_info = await extract_chat_info(userbot, base_link)
@@ -390,7 +452,56 @@ async def run_batch(userbot, client, sender, countdown_msg, base_link, message_i
         
     total = len(message_ids)
     
+    # Take the user's message quota for the whole batch up front; unused
+    # units go back via release_batch_quota when the run stops
+    reserved_quota, quota_left = None, None
+    if job is not None:
+        if job.get("reserved_quota") is not None and not job.get("reservation_released"):
+            # The previous process died holding the reservation: its units
+            # are still taken in the database, so only hold them again
+            reserved_quota = job["reserved_quota"]
+            db.restore_quota_reservation(sender, reserved_quota - processed_count)
+            quota_left = await db.get_remaining_messages(sender) or 0
+        elif job.get("reserved_quota") is not None:
+            # The unused units were given back when the run stopped; take
+            # what the rest of the batch needs again
+            reserved, quota_left = await db.reserve_quota(sender, total - start)
+            if reserved is None:
+                await client.send_message(sender, "⚠️ **Could not reserve your message quota.** Please try again in a moment.")
+                return
+            if quota_left is not None:
+                if reserved == 0:
+                    await client.send_message(sender, "⚠️ **Batch paused:** You've reached your message limit. Use /resume once it's renewed.")
+                    return
+                if reserved < total - start:
+                    message_ids = message_ids[:start + reserved]
+                    total = start + reserved
+                    await client.send_message(
+                        sender,
+                        f"⚠️ **Your message limit only covers** `{reserved}` **more messages.** Processing those only."
+                    )
+                reserved_quota = processed_count + reserved
+            await db.set_batch_job_reservation(job_id, reserved_quota)
+    elif not is_authorized:
+        reserved, quota_left = await db.reserve_quota(sender, total)
+        if reserved is None:
+            await client.send_message(sender, "⚠️ **Could not reserve your message quota.** Please try again in a moment.")
+            return
+        if quota_left is not None:
+            if reserved == 0:
+                await client.send_message(sender, "⚠️ **Batch cancelled:** You've reached your message limit.")
+                return
+            if reserved < total:
+                message_ids = message_ids[:reserved]
+                total = reserved
+                await client.send_message(
+                    sender,
+                    f"⚠️ **Your message limit only covers** `{reserved}` **messages.** Processing those only."
+                )
+            reserved_quota = reserved
+    
     # Pin a message in the destination chat with channel name and message count
+    # (a resumed job keeps the one pinned by its first run)
     pin_text = (
         f"📥 **Batch Download Started**\n\n"
         f"📢 **Channel:** `{channel_name}`\n"
@@ -398,78 +509,128 @@ async def run_batch(userbot, client, sender, countdown_msg, base_link, message_i
         f"ℹ️ This batch process was initiated at `{time.strftime('%Y-%m-%d %H:%M:%S')}`"
     )
     
-    try:
-        # Send the initial pin message to the destination chat
-        pin_msg = await client.send_message(dest_chat_id, pin_text)
-        
-        # Pin the message and delete the service message
-        xy = await client.pin_chat_message(
-            dest_chat_id, 
-            pin_msg.id, 
-            disable_notification=True, 
-            both_sides=True
-        )
+    pin_msg_id = job.get("pin_msg_id") if job is not None else None
+    if job is None:
+        try:
+            # Send the initial pin message to the destination chat
+            pin_msg = await client.send_message(dest_chat_id, pin_text)
+            pin_msg_id = pin_msg.id
         
-        # Delete the service message for pinning
-        if xy:
-            await client.delete_messages(dest_chat_id, xy.id)
+            # Pin the message and delete the service message
+            xy = await client.pin_chat_message(
+                dest_chat_id, 
+                pin_msg.id, 
+                disable_notification=True, 
+                both_sides=True
+            )
         
-        # Inform the user that we've pinned a message
-        await client.send_message(
-            sender,
-            f"📌 **Pinned information message in destination chat**\n\n"
-            f"🔄 Starting batch processing now..."
-        )
-    except Exception as e:
-        logger.error(f"Error pinning message: {e}")
-        await client.send_message(
-            sender,
-            "⚠️ **Could not pin message in destination chat**\n\n"
-            "Continuing with batch processing..."
-        )
-    
-    for i, msg_id in enumerate(message_ids):
-        if f'{sender}' not in batch:
-            logger.info(f"Batch cancelled by user {sender}")
-            break
-        
-        can_continue, limit_msg = check_user_limits(sender)
-        if not can_continue:
-            await client.send_message(sender, f"⚠️ **Batch cancelled:** {limit_msg}")
-            if f'{sender}' in batch:
-                batch.remove(f'{sender}')
-            db.set_user_in_batch(sender, False)
-            await client.edit_message_text(
-                chat_id=sender,
-                message_id=countdown_msg.id,
-                text=f"**❌ Batch process stopped.**\n\n**Reason:** {limit_msg}",
-                reply_markup=None
+            chat_cache.invalidate(dest_chat_id)
+        
+            # Delete the service message for pinning
+            if xy:
+                await client.delete_messages(dest_chat_id, xy.id)
+        
+            # Inform the user that we've pinned a message
+            await client.send_message(
+                sender,
+                f"📌 **Pinned information message in destination chat**\n\n"
+                f"🔄 Starting batch processing now..."
             )
-            break
-            
-        try:
-            current_link = f"{base_link}/{msg_id}"
-            # Calculate timer based on index and add more time
-            timer = calculate_timer(i)
-            
-            status_msg = await client.send_message(
-                dest_chat_id, 
-                f"🔄 **Processing** `{i+1}/{total}` (ID: `{msg_id}`)..."
+        except Exception as e:
+            logger.error(f"Error pinning message: {e}")
+            await client.send_message(
+                sender,
+                "⚠️ **Could not pin message in destination chat**\n\n"
+                "Continuing with batch processing..."
             )
+        
+        job_id = await db.create_batch_job(sender, base_link, message_ids, dest_chat_id, pin_msg_id, reserved_quota)
+    
+    # Download stage: BATCH_WORKERS tasks resolve messages (and pre-download
+    # or stream-upload media from protected chats) ahead of the commit loop
+    # below, which sends strictly in message order. `window` caps how far
+    # ahead the workers may run, so at most that many files sit on disk at once.
+    is_protected = source_chat_type == "private" and await check_channel_content_protection(userbot, source_chat_id)
+    try:
+        pinned_ids = await chat_cache.pinned_ids(userbot, source_chat_id)
+    except Exception as e:
+        logger.error(f"Error getting pinned messages of source chat: {e}")
+        pinned_ids = set()
+    prefetcher = MessagePrefetcher(userbot, source_chat_id, message_ids)
+    window = asyncio.Semaphore(BATCH_WORKERS * 2)
+    pending_ids = iter(enumerate(message_ids[start:], start))
+    slots = {}
+    
+    def slot(index):
+        if index not in slots:
+            slots[index] = asyncio.get_running_loop().create_future()
+        return slots[index]
+    
+    async def download_worker():
+        while True:
+            await window.acquire()
+            try:
+                index, msg_id = next(pending_ids)
+            except StopIteration:
+                window.release()
+                return
+            # get_msg reuses message, file and the chat flags instead of refetching them
+            item = {
+                "msg_id": msg_id,
+                "link": f"{base_link}/{msg_id}",
+                "message": None,
+                "file": None,
+                "uploaded": None,
+                "is_pinned": False,
+                "is_protected": is_protected
+            }
+            try:
+                item = await prepare_batch_item(prefetcher, userbot, client, item, source_chat_id, pinned_ids, is_protected, ctx)
+            except asyncio.CancelledError:
+                shutil.rmtree(batch_download_dir(source_chat_id, msg_id), ignore_errors=True)
+                raise
+            except Exception as e:
+                logger.error(f"Error preparing message {msg_id}: {e}")
+            slot(index).set_result(item)
+    
+    workers = [asyncio.create_task(download_worker()) for _ in range(BATCH_WORKERS)]
+    
+    cursor = start
+    try:
+        for i, msg_id in enumerate(message_ids[start:], start):
+            if f'{sender}' not in batch:
+                logger.info(f"Batch cancelled by user {sender}")
+                break
             
-            # Try to get the original message to determine type before processing
+            item = await slot(i)
+            # done: the cursor may move past this message; failed: it was skipped
+            done, failed = False, False
             try:
-                # First try using check(userbot, client, current_link) to verify if accessible
-                is_accessible, _ = await check(userbot, client, current_link)
+                can_continue, limit_msg = await check_user_limits(sender, check_quota=reserved_quota is None)
+                if not can_continue:
+                    await client.send_message(sender, f"⚠️ **Batch cancelled:** {limit_msg}")
+                    batch.discard(f'{sender}')
+                    await db.set_user_in_batch(sender, False)
+                    progress_hub.discard(sender, countdown_id)
+                    await client.edit_message_text(
+                        chat_id=sender,
+                        message_id=countdown_id,
+                        text=f"**❌ Batch process stopped.**\n\n**Reason:** {limit_msg}",
+                        reply_markup=None
+                    )
+                    break
                 
-                if is_accessible:
-                    # Use proper error handling for getting the message
+                try:
+                    # Commit stage: paced by the limiter shared by all running batches
+                    await batch_limiter.acquire()
+                    
+                    status_msg = await client.send_message(
+                        dest_chat_id, 
+                        f"🔄 **Processing** `{i+1}/{total}` (ID: `{msg_id}`)..."
+                    )
+                    
                     try:
-                        # For private channels, we need to use the proper format
-                        if source_chat_type == "private":
-                            original_message = await userbot.get_messages(source_chat_id, msg_id)
-                        else:
-                            original_message = await userbot.get_messages(source_chat_id, msg_id)
+                        original_message = item["message"]
                         
                         # Process message and update statistics
                         if original_message:
@@ -510,77 +671,103 @@ async def run_batch(userbot, client, sender, countdown_msg, base_link, message_i
                                 
                             else:
                                 file_stats["Other"] += 1
-                    except Exception as get_msg_err:
-                        logger.error(f"Error getting original message: {get_msg_err}")
-                
-                # Now call get_msg to process and forward the message
-                await get_msg(userbot, client, dest_chat_id, status_msg.id, current_link, 0)
-                processed_count += 1
-                try:
-                    await status_msg.delete()
-                except:
-                    pass
-                
-                # Update the countdown with the latest stats after each successful processing
-                await update_countdown(client, sender, countdown_msg.id, i+1, total, file_stats, channel_name, total_size)
-                
-            except Exception as msg_error:
-                logger.error(f"Error in get_msg for ID {msg_id}: {msg_error}")
-                await client.send_message(
-                    sender,
-                    f"⚠️ **Error processing message** `{msg_id}`: `{str(msg_error)}`\n"
-                    f"Continuing with next message..."
-                )
-            
-            if not is_authorized:
-                remaining_msgs = db.get_remaining_messages(sender)
-                if remaining_msgs is not None:
-                    db.decrement_message_limit(sender)
+                        
+                        # Now call get_msg to process and forward the message
+                        billing = reserved_billing.set(reserved_quota is not None)
+                        try:
+                            await get_msg(userbot, client, dest_chat_id, status_msg.id, item["link"], 0, ctx, item)
+                        finally:
+                            reserved_billing.reset(billing)
+                        processed_count += 1
+                        if reserved_quota is not None:
+                            db.use_reserved_quota(sender)
+                        try:
+                            await status_msg.delete()
+                        except:
+                            pass
+                        
+                        # Update the countdown with the latest stats after each successful processing
+                        await update_countdown(client, sender, countdown_id, i+1, total, file_stats, channel_name, total_size)
+                        
+                    except Exception as msg_error:
+                        failed = True
+                        logger.error(f"Error in get_msg for ID {msg_id}: {msg_error}")
+                        await client.send_message(
+                            sender,
+                            f"⚠️ **Error processing message** `{msg_id}`: `{str(msg_error)}`\n"
+                            f"Continuing with next message..."
+                        )
+                    done = True
                     
-                    if i % 10 == 0 or remaining_msgs <= 5:
-                        remaining = max(0, remaining_msgs - 1)
-                        expiry_str = db.get_expiration_time_formatted(sender)
-                        if remaining > 0:
-                            await client.send_message(
-                                sender, 
-                                f"📊 **Status Update**\n\n"
-                                f"• **Remaining messages:** `{remaining}`\n"
-                                f"• **Subscription expires in:** `{expiry_str}`"
-                            )
-                        elif remaining == 0:
-                            await client.send_message(
-                                sender,
-                                "⚠️ **Warning: This is your last message!**\n\n"
-                                f"• **Subscription expires in:** `{expiry_str}`"
-                            )
-            
-            # Add more sleep time to avoid FloodWait
-            await asyncio.sleep(MESSAGE_COOLDOWN + 1)
-            try:
-                await client.delete_messages(sender, status_msg.id)
-            except Exception as e:
-                pass
-            
-            # Add dynamic sleep time based on index + extra time to avoid floodwait
-            await asyncio.sleep(timer + 1)
+                    if reserved_quota is not None:
+                        remaining = db.get_reserved_quota(sender) + quota_left
+                        if i % 10 == 0 or remaining <= 5:
+                            expiry_str = await db.get_expiration_time_formatted(sender)
+                            if remaining > 0:
+                                await client.send_message(
+                                    sender, 
+                                    f"📊 **Status Update**\n\n"
+                                    f"• **Remaining messages:** `{remaining}`\n"
+                                    f"• **Subscription expires in:** `{expiry_str}`"
+                                )
+                            elif remaining == 0:
+                                await client.send_message(
+                                    sender,
+                                    "⚠️ **Warning: This is your last message!**\n\n"
+                                    f"• **Subscription expires in:** `{expiry_str}`"
+                                )
+                    
+                except FloodWait as fw:
+                    if fw.value > 300:
+                        await client.send_message(
+                            sender, 
+                            f'⚠️ **FloodWait too long** (`{fw.value}s`), cancelling batch'
+                        )
+                        break
+                    failed, done = failed or not done, True
+                    await handle_floodwait(client, sender, fw.value)
+                except Exception as e:
+                    failed, done = failed or not done, True
+                    logger.error(f"Error processing {msg_id}: {e}")
+                    await client.send_message(
+                        sender, 
+                        f"⚠️ **Skipped** `{msg_id}` due to error: `{str(e)}`"
+                    )
+            finally:
+                slots.pop(i, None)
+                window.release()
+                if item["file"]:
+                    shutil.rmtree(batch_download_dir(source_chat_id, msg_id), ignore_errors=True)
+                if done:
+                    cursor = i + 1
+                    if job_id is not None:
+                        await db.checkpoint_batch_job(
+                            job_id, cursor,
+                            {"file_stats": file_stats, "total_size": total_size, "processed_count": processed_count},
+                            msg_id if failed else None
+                        )
             
-        except FloodWait as fw:
-            if fw.value > 300:
-                await client.send_message(
-                    sender, 
-                    f'⚠️ **FloodWait too long** (`{fw.value}s`), cancelling batch'
-                )
+            if f'{sender}' not in batch:
                 break
-            await handle_floodwait(client, sender, fw.value)
-        except Exception as e:
-            logger.error(f"Error processing {msg_id}: {e}")
-            await client.send_message(
-                sender, 
-                f"⚠️ **Skipped** `{msg_id}` due to error: `{str(e)}`"
-            )
-        
-        if f'{sender}' not in batch:
-            break
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        # Drop media the workers fetched for messages that were never committed
+        for fut in slots.values():
+            if fut.done() and fut.result()["file"]:
+                shutil.rmtree(batch_download_dir(source_chat_id, fut.result()["msg_id"]), ignore_errors=True)
+        await release_batch_quota(sender, job_id)
+    
+    # A job that stopped for any other reason (e.g. a very long FloodWait)
+    # stays resumable; one cut off by a crash is still "running"
+    if job_id is not None:
+        if cursor >= total:
+            await db.set_batch_job_status(job_id, "completed")
+        elif f'{sender}' not in batch:
+            await db.set_batch_job_status(job_id, "cancelled")
+        else:
+            await db.set_batch_job_status(job_id, "interrupted")
     
     # Update the pinned message with completion info
     try:
@@ -600,7 +787,7 @@ async def run_batch(userbot, client, sender, countdown_msg, base_link, message_i
         # Update the pinned message
         await client.edit_message_text(
             chat_id=dest_chat_id,
-            message_id=pin_msg.id,
+            message_id=pin_msg_id,
             text=complete_pin_text
         )
     except Exception as e:
@@ -622,6 +809,154 @@ async def run_batch(userbot, client, sender, countdown_msg, base_link, message_i
         "dest_chat_id": dest_chat_id
     }
 
+async def report_batch_results(client, user_id, cd_id, batch_results, total, fetch_all=False):
+    """Send the completion summary and close the countdown message"""
+    # Generate completion message with statistics if batch_results exists
+    completion_message = "✅ **Batch completed successfully!**"
+    
+    if batch_results:
+        stats_summary = format_stats_summary(batch_results["file_stats"], batch_results["total_size"])
+        completion_message += f"\n\n{stats_summary}\n\n**✅ Total Processed:** `{batch_results['processed_count']}` files"
+        
+        # Add destination information
+        if batch_results.get("dest_chat_id") and batch_results["dest_chat_id"] != user_id:
+            try:
+                dest_chat = await client.get_chat(batch_results["dest_chat_id"])
+                completion_message += f"\n\n**📤 Files sent to:** `{dest_chat.title if hasattr(dest_chat, 'title') else 'your selected chat'}`"
+            except Exception as e:
+                logger.error(f"Error getting destination chat info: {e}")
+    
+    await client.send_message(user_id, completion_message)
+    
+    final_text = f"✅ **Batch process completed.**\n\n"
+    if fetch_all:
+        if batch_results:
+            final_text += f"📊 Downloaded `{batch_results['processed_count']}` messages successfully."
+        else:
+            final_text += "📊 Downloaded messages successfully."
+    else:
+        if batch_results:
+            final_text += f"📊 Processed `{batch_results['processed_count']}` out of `{total}` files."
+        else:
+            final_text += f"📊 Processed `{total}` files."
+    
+    progress_hub.discard(user_id, cd_id)
+    await client.edit_message_text(
+        chat_id=user_id,
+        message_id=cd_id,
+        text=final_text,
+        reply_markup=None
+    )
+
+async def release_batch_quota(user_id, job_id=None):
+    """Give back the unused part of a batch's quota reservation and note on
+    its job that it was given back, so it is never refunded twice"""
+    await db.release_quota(user_id)
+    if job_id is not None:
+        await db.set_batch_job_reservation(job_id, released=True)
+
+async def discard_batch_job(job, status="cancelled"):
+    """Close an unfinished batch job and give back the quota it still holds"""
+    await db.set_batch_job_status(job["_id"], status)
+    # Only a job cut off by a crash still holds its reservation
+    if job.get("reserved_quota") is not None and not job.get("reservation_released"):
+        db.restore_quota_reservation(job["user_id"], job["reserved_quota"] - job["stats"].get("processed_count", 0))
+        await release_batch_quota(job["user_id"], job["_id"])
+
+async def resume_batch_job(client, job):
+    """Continue a batch job from its last checkpoint"""
+    user_id = job["user_id"]
+    batch.add(f'{user_id}')
+    await db.set_user_in_batch(user_id, True)
+    await db.set_batch_job_status(job["_id"], "running")
+    total = len(job["message_ids"])
+    
+    try:
+        ctx = await db.get_user_context(user_id)
+        cd = await client.send_message(
+            user_id,
+            f"🔁 **Resuming batch**\n\n"
+            f"📑 **Total files:** `{total}`\n"
+            f"✅ **Already done:** `{job['cursor']}`\n"
+            f"📌 **Continuing with:** `{job['message_ids'][job['cursor']]}`",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("❌ Cancel Batch", callback_data="cancel")],
+                [InlineKeyboardButton("📢 Join Channel", url="https://t.me/officialharsh_g")]
+            ])
+        )
+        batch_results = await run_batch(userbot, client, user_id, cd.id, job["base_link"], ctx=ctx, job=job)
+        await report_batch_results(client, user_id, cd.id, batch_results, total)
+    except Exception as e:
+        logger.error(f"Error resuming batch job {job['_id']}: {e}")
+        await safe_send_message(client, user_id, f"⚠️ **Error resuming batch:** `{str(e)}`")
+    finally:
+        batch.discard(f'{user_id}')
+        await db.set_user_in_batch(user_id, False)
+        await release_batch_quota(user_id, job["_id"])
+
+async def run_batch_job(job):
+    """Scheduler handler for "batch" jobs: a batch set up with /batch, or an
+    unfinished one to resume (payload holds its batch_job_id)"""
+    user_id = job["user_id"]
+    payload = job["payload"]
+    if payload.get("batch_job_id") is not None:
+        batch_job = await db.get_batch_job(payload["batch_job_id"])
+        if batch_job and batch_job["status"] in RESUMABLE_BATCH_STATUSES:
+            await resume_batch_job(Bot, batch_job)
+        return
+    
+    batch.add(f'{user_id}')
+    await db.set_user_in_batch(user_id, True)
+    try:
+        ctx = await db.get_user_context(user_id)
+        if payload["fetch_all"]:
+            batch_results = await run_batch(userbot, Bot, user_id, payload["cd_id"], payload["base_link"], fetch_all=True, ctx=ctx)
+        else:
+            batch_results = await run_batch(userbot, Bot, user_id, payload["cd_id"], payload["base_link"], message_ids=payload["message_ids"], ctx=ctx)
+        await report_batch_results(Bot, user_id, payload["cd_id"], batch_results, len(payload["message_ids"]), payload["fetch_all"])
+    except Exception as e:
+        logger.error(f"Batch error: {e}")
+        await safe_send_message(Bot, user_id, f"⚠️ **Error processing batch:** `{str(e)}`")
+    finally:
+        batch.discard(f'{user_id}')
+        await db.set_user_in_batch(user_id, False)
+        await db.release_quota(user_id)
+
+# Running batches are picked up again from batch_jobs, not re-run from scratch
+job_queue.register("batch", run_batch_job, limit=BATCH_SLOTS, rerun=False)
+
+async def queue_batch(user_id, payload, ctx=None):
+    """Submit a batch to the scheduler and tell the user if it has to wait"""
+    job = await job_queue.submit("batch", user_id, payload, job_priority(user_id, ctx))
+    ahead = job_queue.queued_ahead(job) if job else 0
+    if ahead:
+        await safe_send_message(
+            Bot,
+            user_id,
+            f"⏳ **Batch queued,** `{ahead}` batch{'es' if ahead != 1 else ''} ahead of yours. It starts automatically."
+        )
+    return job
+
+async def resume_interrupted_batches():
+    """Restart every batch the previous process was running when it stopped"""
+    for job in await db.get_running_batch_jobs():
+        if job["cursor"] >= len(job["message_ids"]):
+            # Stopped between the last checkpoint and closing the job
+            await discard_batch_job(job, "completed")
+            continue
+        if job.get("resumes", 0) >= MAX_BATCH_RESUMES:
+            logger.warning(f"Giving up on batch job {job['_id']} of user {job['user_id']}")
+            await discard_batch_job(job, "failed")
+            await safe_send_message(
+                Bot,
+                job["user_id"],
+                "⚠️ **Your batch could not be resumed after a restart.**\n\nUse /batch to start it again."
+            )
+            continue
+        logger.info(f"Resuming batch job {job['_id']} of user {job['user_id']} at {job['cursor']}/{len(job['message_ids'])}")
+        ctx = await db.get_user_context(job["user_id"])
+        await queue_batch(job["user_id"], {"batch_job_id": job["_id"]}, ctx)
+
 @Bot.on_message(filters.command("batch") & filters.private)
 async def batch_handler(client, message):
         
@@ -630,29 +965,35 @@ async def batch_handler(client, message):
         await message.reply("You are not authorised to use this bot please contact Admin(@B34STXBOT)")
         return
     user_id = message.from_user.id
-    is_authorized = user_id in AUTH or db.is_user_authorized(user_id)
+    ctx = await db.get_user_context(user_id)
+    is_authorized = user_id in AUTH or ctx.is_authorized
     if not is_authorized:
-        time_remaining = db.get_expiration_time_remaining(user_id)
+        time_remaining = ctx.expiration_remaining
         if time_remaining is None or time_remaining == timedelta(0):
             return await message.reply("🚫 **You are not authorized to use batch!**")
     
-    if f'{user_id}' in batch:
+    if f'{user_id}' in batch or job_queue.has_job(user_id, "batch"):
         return await message.reply("⚠️ You've already started one batch, wait for it to complete or use `/cancel` to cancel it!")
     
+    if await db.get_resumable_batch_job(user_id):
+        return await message.reply("⚠️ You have an unfinished batch, use `/resume` to continue it or `/cancel` to discard it!")
+    
     current_time = time.time()
     if user_id in last_message_time and (current_time - last_message_time[user_id]) < MESSAGE_COOLDOWN:
         wait_time = round(MESSAGE_COOLDOWN - (current_time - last_message_time[user_id]))
         return await message.reply(f"⏱️ Please wait `{wait_time}` seconds before sending another message.")
     
     last_message_time[user_id] = current_time
-    db.set_user_in_batch(user_id, True)
-    batch.append(f'{user_id}')
+    await db.set_user_in_batch(user_id, True)
+    batch.add(f'{user_id}')
+    # Once queued, the scheduler's batch handler owns the cleanup below
+    queued = False
     
     try:
         # Check for destination chat ID
         dest_chat_id = None
         try:
-            dest_chat_id = db.get_chat_id(user_id)
+            dest_chat_id = ctx.chat_id
             if dest_chat_id:
                 try:
                     chat = await client.get_chat(dest_chat_id)
@@ -684,15 +1025,11 @@ async def batch_handler(client, message):
         
         if not base_link or not start_msg_id:
             await client.send_message(user_id, "❌ **Invalid link format.** Please provide a valid Telegram message link.")
-            batch.remove(f'{user_id}')
-            db.set_user_in_batch(user_id, False)
             return
         
         s, r = await check(userbot, client, start_link)
         if not s:
             await client.send_message(user_id, f"❌ **Link verification failed:** {r}")
-            batch.remove(f'{user_id}')
-            db.set_user_in_batch(user_id, False)
             return
         
         range_msg = await client.send_message(
@@ -732,19 +1069,12 @@ async def batch_handler(client, message):
                 user_id, 
                 "❌ **Could not understand the range specification.** Please try again with a valid format."
             )
-            batch.remove(f'{user_id}')
-            db.set_user_in_batch(user_id, False)
             return
         
         if not fetch_all and len(message_ids) > 100000:
             await client.send_message(user_id, "⚠️ **Maximum 100,000 files per batch.**")
-            batch.remove(f'{user_id}')
-            db.set_user_in_batch(user_id, False)
             return
         
-        if not fetch_all:
-            ids.extend(message_ids)
-        
         cd_text = "🚀 **Batch process started**\n\n"
         if fetch_all:
             cd_text += "📑 **Downloading all messages in the chat (BETA feature)**"
@@ -764,59 +1094,17 @@ async def batch_handler(client, message):
             ])
         )
         
-        batch_results = None
-        
-        if fetch_all:
-            # Get chat info to prepare for batch processing
-            chat_info = await extract_chat_info(userbot, base_link)
-                
-            batch_results = await run_batch(userbot, client, user_id, cd, base_link, fetch_all=True)
-        else:
-            batch_results = await run_batch(userbot, client, user_id, cd, base_link, message_ids=message_ids)
-        
-        # Generate completion message with statistics if batch_results exists
-        completion_message = "✅ **Batch completed successfully!**"
-        
-        if batch_results:
-            stats_summary = format_stats_summary(batch_results["file_stats"], batch_results["total_size"])
-            completion_message += f"\n\n{stats_summary}\n\n**✅ Total Processed:** `{batch_results['processed_count']}` files"
-            
-            # Add destination information
-            if batch_results.get("dest_chat_id") and batch_results["dest_chat_id"] != user_id:
-                try:
-                    dest_chat = await client.get_chat(batch_results["dest_chat_id"])
-                    completion_message += f"\n\n**📤 Files sent to:** `{dest_chat.title if hasattr(dest_chat, 'title') else 'your selected chat'}`"
-                except Exception as e:
-                    logger.error(f"Error getting destination chat info: {e}")
-        
-        await client.send_message(user_id, completion_message)
+        if f'{user_id}' not in batch:
+            # Cancelled while answering the questions above
+            return
         
-        if fetch_all:
-            final_text = f"✅ **Batch process completed.**\n\n"
-            if batch_results:
-                final_text += f"📊 Downloaded `{batch_results['processed_count']}` messages successfully."
-            else:
-                final_text += "📊 Downloaded messages successfully."
-                
-            await client.edit_message_text(
-                chat_id=user_id,
-                message_id=cd.id,
-                text=final_text,
-                reply_markup=None
-            )
-        else:
-            final_text = f"✅ **Batch process completed.**\n\n"
-            if batch_results:
-                final_text += f"📊 Processed `{batch_results['processed_count']}` out of `{len(message_ids)}` files."
-            else:
-                final_text += f"📊 Processed `{len(message_ids)}` files."
-                
-            await client.edit_message_text(
-                chat_id=user_id,
-                message_id=cd.id,
-                text=final_text,
-                reply_markup=None
-            )
+        # The batch itself runs on the scheduler, within BATCH_SLOTS running batches
+        queued = await queue_batch(user_id, {
+            "base_link": base_link,
+            "message_ids": message_ids,
+            "fetch_all": fetch_all,
+            "cd_id": cd.id
+        }, ctx) is not None
         
     except asyncio.TimeoutError:
         await client.send_message(user_id, "⏱️ **Response timed out after 2 minutes!**")
@@ -824,44 +1112,65 @@ async def batch_handler(client, message):
         logger.error(f"Batch error: {e}")
         await client.send_message(user_id, f"⚠️ **Error processing batch:** `{str(e)}`")
     finally:
-        if ids:
-            ids.clear()
-        if f'{user_id}' in batch:
-            batch.remove(f'{user_id}')
-        db.set_user_in_batch(user_id, False)
-        
+        if not queued:
+            batch.discard(f'{user_id}')
+            await db.set_user_in_batch(user_id, False)
+
+async def cancel_user_batch(user_id):
+    """Stop the user's batch wherever it is: in the setup conversation,
+    waiting in the queue, running, or left unfinished by an earlier run.
+    Returns False if there was nothing to cancel."""
+    user_id_str = f'{user_id}'
+    live = user_id_str in batch
+    batch.discard(user_id_str)
+    cancel_transfers(user_id)
+    queued = await job_queue.cancel(user_id, "batch")
+    unfinished = None
+    # A running batch closes its own job; anything else is closed here
+    if not live or (queued and queued["payload"].get("batch_job_id") is not None):
+        unfinished = await db.get_resumable_batch_job(user_id)
+        if unfinished:
+            await discard_batch_job(unfinished)
+    await db.set_user_in_batch(user_id, False)
+    return bool(live or queued or unfinished)
+
 @Bot.on_message(filters.command("cancel") & filters.private)
 async def cancel_command(client, message):
-    user_id = message.from_user.id
-    user_id_str = f'{user_id}'
-    
-    if user_id_str not in batch:
+    if not await cancel_user_batch(message.from_user.id):
         await message.reply("❌ **No active batch to cancel!**")
         return
     
-    if ids:
-        ids.clear()
-    if user_id_str in batch:
-        batch.remove(user_id_str)
-    db.set_user_in_batch(user_id, False)
-    
     await message.reply("✅ **Batch cancelled successfully!**")
 
+@Bot.on_message(filters.command("resume") & filters.private)
+async def resume_command(client, message):
+    if ADMIN_ONLY:
+      if not is_admin(message.from_user.id):
+        await message.reply("You are not authorised to use this bot please contact Admin(@B34STXBOT)")
+        return
+    user_id = message.from_user.id
+    ctx = await db.get_user_context(user_id)
+    is_authorized = user_id in AUTH or ctx.is_authorized
+    if not is_authorized:
+        time_remaining = ctx.expiration_remaining
+        if time_remaining is None or time_remaining == timedelta(0):
+            return await message.reply("🚫 **You are not authorized to use batch!**")
+    
+    if f'{user_id}' in batch or job_queue.has_job(user_id, "batch"):
+        return await message.reply("⚠️ Your batch is already running, wait for it to complete or use `/cancel` to cancel it!")
+    
+    job = await db.get_resumable_batch_job(user_id)
+    if not job:
+        return await message.reply("❌ **No unfinished batch to resume!**")
+    
+    await queue_batch(user_id, {"batch_job_id": job["_id"]}, ctx)
+
 @Bot.on_callback_query(filters.regex("^cancel$"))
 async def cancel_callback(client, callback_query):
-    user_id = callback_query.from_user.id
-    user_id_str = f'{user_id}'
-    
-    if user_id_str not in batch:
+    if not await cancel_user_batch(callback_query.from_user.id):
         await callback_query.answer("❌ No active batch to cancel!", show_alert=True)
         return
     
-    if ids:
-        ids.clear()
-    if user_id_str in batch:
-        batch.remove(user_id_str)
-    db.set_user_in_batch(user_id, False)
-    
     await callback_query.answer("✅ Batch cancelled successfully!", show_alert=True)
     await callback_query.edit_message_text("❌ **Batch process cancelled!**")
 
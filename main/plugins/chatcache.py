@@ -0,0 +1,136 @@
+import asyncio
+import time
+import logging
+from collections import OrderedDict
+
+from pyrogram import enums
+
+from main.plugins.ratelimit import limiter
+
+logger = logging.getLogger(__name__)
+
+# Resolved chats are reused for CHAT_CACHE_TTL seconds; least recently used
+# entries are evicted once CHAT_CACHE_SIZE chats are held
+CHAT_CACHE_TTL = 600
+CHAT_CACHE_SIZE = 2000
+
+def _flag(value):
+    if isinstance(value, str):
+        return value.lower() in ['true', '1', 'yes']
+    return bool(value)
+
+class ChatInfo:
+    """The parts of a resolved chat the clone paths need."""
+
+    def __init__(self, chat):
+        self.chat = chat
+        self.id = chat.id
+        self.username = getattr(chat, 'username', None)
+        self.title = getattr(chat, 'title', None) or getattr(chat, 'first_name', None)
+        # Any of these means forwarding/copying is refused by Telegram
+        self.is_protected = (
+            _flag(getattr(chat, 'has_protected_content', False)) or
+            _flag(getattr(chat, 'noforwards', False)) or
+            _flag(getattr(chat, 'restricted', False))
+        )
+        pinned = getattr(chat, 'pinned_message', None)
+        self.pinned_message_id = pinned.id if pinned else None
+
+class ChatCache:
+    """TTL cache of get_chat results per client, keyed by chat ID and username.
+
+    Bot and userbot see chats differently (membership, access hashes), so
+    each client has its own entries. Failed lookups are not cached.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._pinned = OrderedDict()
+        self._inflight = {}
+
+    @staticmethod
+    def _key(client, chat_id):
+        if isinstance(chat_id, str):
+            chat_id = chat_id.lstrip('@').lower()
+        return (getattr(client, "name", None), chat_id)
+
+    def _store(self, client, info):
+        expires = time.monotonic() + CHAT_CACHE_TTL
+        keys = [self._key(client, info.id)]
+        if info.username:
+            keys.append(self._key(client, info.username))
+        for key in keys:
+            self._entries[key] = (expires, info)
+            self._entries.move_to_end(key)
+        while len(self._entries) > CHAT_CACHE_SIZE:
+            self._entries.popitem(last=False)
+
+    async def get(self, client, chat_id):
+        """Return the ChatInfo for a chat ID or username, resolving it at most once per TTL."""
+        key = self._key(client, chat_id)
+        cached = self._entries.get(key)
+        if cached and cached[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            return cached[1]
+
+        # Concurrent batch workers asking for the same chat share one request
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._resolve(client, chat_id))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _resolve(self, client, chat_id):
+        info = ChatInfo(await limiter.call(client.get_chat, chat_id))
+        self._store(client, info)
+        return info
+
+    async def pinned_ids(self, client, chat_id):
+        """Set of every pinned message ID in a chat, built with one pinned-filter
+        search and reused for CHAT_CACHE_TTL seconds."""
+        key = self._key(client, chat_id)
+        cached = self._pinned.get(key)
+        if cached and cached[0] > time.monotonic():
+            self._pinned.move_to_end(key)
+            return cached[1]
+
+        task = self._inflight.get(("pinned",) + key)
+        if task is None:
+            task = asyncio.ensure_future(self._index_pinned(client, chat_id, key))
+            self._inflight[("pinned",) + key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(("pinned",) + key, None))
+        return await asyncio.shield(task)
+
+    async def _index_pinned(self, client, chat_id, key):
+        try:
+            pinned = set()
+            async for msg in client.search_messages(chat_id, filter=enums.MessagesFilter.PINNED):
+                pinned.add(msg.id)
+        except Exception as e:
+            # Bots can't search; the chat's top pinned message is all they get
+            logger.warning(f"Pinned search failed for {chat_id}, using top pinned message only: {e}")
+            info = await self.get(client, chat_id)
+            pinned = {info.pinned_message_id} if info.pinned_message_id else set()
+        self._pinned[key] = (time.monotonic() + CHAT_CACHE_TTL, pinned)
+        self._pinned.move_to_end(key)
+        while len(self._pinned) > CHAT_CACHE_SIZE:
+            self._pinned.popitem(last=False)
+        return pinned
+
+    def invalidate(self, chat_id):
+        """Forget a chat and its pinned index for every client, e.g. after its pin or protection changed."""
+        if isinstance(chat_id, str):
+            chat_id = chat_id.lstrip('@').lower()
+        # Drop the ID and username aliases together
+        names = {chat_id}
+        for (_, key), (_, info) in self._entries.items():
+            if key == chat_id:
+                names.add(info.id)
+                if info.username:
+                    names.add(info.username.lower())
+        for cache in (self._entries, self._pinned):
+            for key in [k for k in cache if k[1] in names]:
+                del cache[key]
+
+chat_cache = ChatCache()
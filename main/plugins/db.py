@@ -1,6 +1,11 @@
+import asyncio
+import contextvars
 import pymongo
+from pymongo import AsyncMongoClient, ReturnDocument
 import logging
 import re
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from config import MDB, AUTH
 
@@ -18,11 +23,136 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 logging.getLogger("pyrogram").setLevel(logging.INFO)
 
+# In-process cache of user documents, refreshed after USER_CACHE_TTL seconds
+# and evicted least-recently-used once USER_CACHE_SIZE users are held
+USER_CACHE_TTL = 60
+USER_CACHE_SIZE = 5000
+
+# Statistics counters are buffered in memory and written every N seconds
+STATS_FLUSH_INTERVAL = 30
+
+# Set while a batch clones on quota it reserved up front (and spends with
+# use_reserved_quota), so increment_cloned_count doesn't charge again. Being a
+# context variable, it only covers that batch's task, not the user's other clones
+reserved_billing = contextvars.ContextVar("reserved_billing", default=False)
+
+# Batch jobs in these states can be picked up again with /resume; "running"
+# ones left over from a previous process are also resumed on boot
+RESUMABLE_BATCH_STATUSES = ["running", "interrupted"]
+
+def format_remaining_time(remaining):
+    """Format a timedelta as e.g. '2 days, 3 hours, 5 minutes'"""
+    days = remaining.days
+    hours, remainder = divmod(remaining.seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    
+    time_parts = []
+    if days > 0:
+        time_parts.append(f"{days} day{'s' if days != 1 else ''}")
+    if hours > 0:
+        time_parts.append(f"{hours} hour{'s' if hours != 1 else ''}")
+    if minutes > 0:
+        time_parts.append(f"{minutes} minute{'s' if minutes != 1 else ''}")
+    
+    if not days and not hours and seconds > 0:
+        time_parts.append(f"{seconds} second{'s' if seconds != 1 else ''}")
+        
+    if not time_parts:
+        return "Less than a second"
+        
+    return ", ".join(time_parts)
+
+class UserContext:
+    """Snapshot of a user's state taken once at the start of a request"""
+    
+    def __init__(self, user_id, user, ban_data, is_admin=False):
+        now = datetime.now()
+        user = user or {}
+        self.user_id = user_id
+        self.exists = bool(user)
+        self.is_admin = is_admin
+        
+        # Premium state (expired premium counts as free)
+        expiration_time = user.get("expiration_time")
+        self.premium_expired = bool(expiration_time and expiration_time < now)
+        self.expiration_time = None if self.premium_expired else expiration_time
+        self.premium_level = 0 if self.premium_expired else user.get("premium_level", 0)
+        self.message_limit = None if self.premium_expired else user.get("message_limit")
+        self.is_authorized = is_admin or self.premium_level > 0
+        
+        # Ban state
+        self.is_banned = ban_data is not None
+        self.ban_reason = ban_data.get("reason") if ban_data else None
+        
+        # Mute state
+        mute_until = user.get("mute_until")
+        self.mute_expired = bool(user.get("muted") and mute_until and mute_until < now)
+        self.is_muted = bool(user.get("muted")) and not self.mute_expired
+        self.mute_reason = user.get("mute_reason") if self.is_muted else None
+        self.mute_remaining = mute_until - now if self.is_muted and mute_until else None
+        
+        # Settings
+        self.in_batch = user.get("in_batch", False)
+        self.chat_id = user.get("chat_id") or user_id
+        self.thumbnail = user.get("thumbnail")
+        self.thumbnail_enabled = user.get("thumbnail_enabled", True)
+        self.watermark_text = user.get("watermark_text")
+    
+    @property
+    def expiration_remaining(self):
+        """Time left on premium, None if no expiration is set"""
+        if not self.expiration_time:
+            return None
+        return max(self.expiration_time - datetime.now(), timedelta(0))
+    
+    @property
+    def mute_time_formatted(self):
+        """Same output as Database.get_mute_time_formatted"""
+        if not self.is_muted:
+            return "Not muted"
+        if self.mute_remaining is None:
+            return "Indefinite"
+        return format_remaining_time(self.mute_remaining)
+
 class Database:
     def __init__(self):
-        """Initialize the database connection"""
+        """Initialize the database connection
+        
+        Index creation and the stats seed run once on a short-lived blocking
+        client at import time; every method after that goes through the
+        asyncio client so handlers never block the event loop on Mongo.
+        """
         try:
-            self.client = pymongo.MongoClient(MDB)
+            setup_client = pymongo.MongoClient(MDB)
+            try:
+                setup_db = setup_client["TelegramBot"]
+                
+                # Create indexes
+                setup_db["users"].create_index("user_id", unique=True)
+                setup_db["banned_users"].create_index("user_id", unique=True)
+                setup_db["authorized_users"].create_index("user_id", unique=True)
+                setup_db["welcome_log"].create_index("user_id", unique=True)
+                setup_db["keys"].create_index("key", unique=True)
+                setup_db["warnings"].create_index("user_id")
+                setup_db["batch_jobs"].create_index([("user_id", 1), ("status", 1)])
+                setup_db["batch_jobs"].create_index("status")
+                setup_db["job_queue"].create_index("enqueued_at")
+                setup_db["media_cache"].create_index(
+                    [("unique_id", 1), ("file_size", 1), ("variant", 1)],
+                    unique=True
+                )
+                
+                # Initialize stats collection
+                if setup_db["statistics"].count_documents({}) == 0:
+                    setup_db["statistics"].insert_one({
+                        "cloned_messages": 0,
+                        "downloaded_messages": 0,
+                        "thumbnails_set": 0
+                    })
+            finally:
+                setup_client.close()
+            
+            self.client = AsyncMongoClient(MDB)
             self.db = self.client["TelegramBot"]
             
             # Collections
@@ -33,22 +163,15 @@ class Database:
             self.welcome_log = self.db["welcome_log"]
             self.keys = self.db["keys"]
             self.warnings = self.db["warnings"]
+            self.batch_jobs = self.db["batch_jobs"]
+            self.job_queue = self.db["job_queue"]
+            self.media_cache = self.db["media_cache"]
             
-            # Create indexes
-            self.users.create_index("user_id", unique=True)
-            self.banned.create_index("user_id", unique=True)
-            self.authorized.create_index("user_id", unique=True)
-            self.welcome_log.create_index("user_id", unique=True)
-            self.keys.create_index("key", unique=True)
-            self.warnings.create_index("user_id")
-            
-            # Initialize stats collection
-            if self.stats.count_documents({}) == 0:
-                self.stats.insert_one({
-                    "cloned_messages": 0,
-                    "downloaded_messages": 0,
-                    "thumbnails_set": 0
-                })
+            self._user_cache = OrderedDict()
+            self._cache_epoch = 0
+            self._pending_stats = {}
+            self._stats_flusher = None
+            self._quota_reservations = {}
             
             logger.info("Database connected successfully")
         except Exception as e:
@@ -72,45 +195,68 @@ class Database:
             ))
         return False
 
+    async def _get_user(self, user_id):
+        """Get a user document, served from the in-process cache when fresh"""
+        cached = self._user_cache.get(user_id)
+        if cached and cached[0] > time.monotonic():
+            self._user_cache.move_to_end(user_id)
+            return cached[1]
+        
+        # A write that lands while the read is in flight must not be
+        # overwritten by the stale document it returns
+        epoch = self._cache_epoch
+        user = await self.users.find_one({"user_id": user_id})
+        self._cache_user(user_id, user, epoch)
+        return user
+
+    def _cache_user(self, user_id, user, epoch):
+        """Store a user document read when the cache was at the given epoch"""
+        if epoch != self._cache_epoch:
+            return
+        self._user_cache[user_id] = (time.monotonic() + USER_CACHE_TTL, user)
+        self._user_cache.move_to_end(user_id)
+        while len(self._user_cache) > USER_CACHE_SIZE:
+            self._user_cache.popitem(last=False)
+
+    async def _update_user(self, user_id, update, upsert=False):
+        """Update a user document and drop its cached copy"""
+        try:
+            return await self.users.update_one({"user_id": user_id}, update, upsert=upsert)
+        finally:
+            self.invalidate_user(user_id)
+
+    def invalidate_user(self, user_id):
+        """Forget the cached document for a user"""
+        self._cache_epoch += 1
+        self._user_cache.pop(user_id, None)
+
     ### User Management ###
-    def add_user(self, user_id, username=None, first_name=None, last_name=None):
+    async def add_user(self, user_id, username=None, first_name=None, last_name=None):
         """Add or update user in database"""
         try:
-            # Check if user exists
-            user = self.users.find_one({"user_id": user_id})
-            
-            if user:
-                # Update existing user
-                update_data = {
-                    "$set": {
-                        "username": username,
-                        "first_name": first_name,
-                        "last_name": last_name,
-                        "last_activity": datetime.now()
-                    }
-                }
-            else:
-                # Create new user with default values
-                update_data = {
-                    "$set": {
-                        "user_id": user_id,
-                        "username": username,
-                        "first_name": first_name,
-                        "last_name": last_name,
-                        "last_activity": datetime.now(),
-                        "thumbnail": None,
-                        "thumbnail_enabled": False,
-                        "watermark_text": None,
-                        "chat_id": None,
-                        "premium_level": 0,
-                        "message_limit": None,
-                        "last_key_redeem": None,
-                        "expiration_time": None
-                    }
+            # Single upsert: profile fields are always refreshed, default
+            # values are only written when the user is created
+            update_data = {
+                "$set": {
+                    "username": username,
+                    "first_name": first_name,
+                    "last_name": last_name,
+                    "last_activity": datetime.now()
+                },
+                "$setOnInsert": {
+                    "thumbnail": None,
+                    "thumbnail_enabled": False,
+                    "watermark_text": None,
+                    "chat_id": None,
+                    "premium_level": 0,
+                    "message_limit": None,
+                    "last_key_redeem": None,
+                    "expiration_time": None
                 }
+            }
             
-            result = self.users.update_one(
-                {"user_id": user_id},
+            result = await self._update_user(
+                user_id,
                 update_data,
                 upsert=True
             )
@@ -119,7 +265,53 @@ class Database:
             logger.error(f"Error adding user: {e}")
             return False
 
-    def set_chat_id(self, user_id, chat_id):
+    async def get_user_context(self, user_id):
+        """Load user, ban and mute state for one request in a single query
+        
+        Returns:
+            UserContext: Snapshot that handlers pass down instead of
+                         calling the individual getters again
+        """
+        try:
+            epoch = self._cache_epoch
+            cursor = await self.users.aggregate([
+                {"$match": {"user_id": user_id}},
+                {"$limit": 1},
+                {"$lookup": {
+                    "from": self.banned.name,
+                    "localField": "user_id",
+                    "foreignField": "user_id",
+                    "as": "ban"
+                }}
+            ])
+            docs = await cursor.to_list(None)
+            
+            if docs:
+                user = docs[0]
+                bans = user.pop("ban", [])
+                ban_data = bans[0] if bans else None
+                self._cache_user(user_id, user, epoch)
+            else:
+                # Users that were never added can still be banned
+                user = None
+                ban_data = await self.banned.find_one({"user_id": user_id})
+            
+            ctx = UserContext(user_id, user, ban_data, self._is_admin(user_id))
+            
+            # Apply the same lazy expiry writes as the individual getters
+            if ctx.premium_expired:
+                await self._update_user(
+                    user_id,
+                    {"$set": {"premium_level": 0, "expiration_time": None, "message_limit": None}}
+                )
+            if ctx.mute_expired:
+                await self.unmute_user(user_id)
+            return ctx
+        except Exception as e:
+            logger.error(f"Error loading user context: {e}")
+            return UserContext(user_id, None, None, self._is_admin(user_id))
+
+    async def set_chat_id(self, user_id, chat_id):
       """Set chat ID for user"""
       try:
           # Validate chat_id is an integer
@@ -127,8 +319,8 @@ class Database:
               logger.error(f"Invalid chat_id: {chat_id}. Must be an integer.")
               return False
             
-          result = self.users.update_one(
-              {"user_id": user_id},
+          result = await self._update_user(
+              user_id,
               {"$set": {"chat_id": chat_id}}
           )
           return result.modified_count > 0
@@ -136,21 +328,21 @@ class Database:
           logger.error(f"Error setting chat ID: {e}")
           return False
 
-    def get_chat_id(self, user_id):
+    async def get_chat_id(self, user_id):
       """Get user's chat ID. Returns user_id if chat_id is not available."""
       try:
-          user = self.users.find_one({"user_id": user_id})
+          user = await self._get_user(user_id)
           chat_id = user.get("chat_id") if user else None
           return chat_id if chat_id else user_id
       except Exception as e:
           logger.error(f"Error getting chat ID: {e}")
           return user_id
 
-    def remove_chat_id(self, user_id):
+    async def remove_chat_id(self, user_id):
       """Remove chat ID for user"""
       try:
-          result = self.users.update_one(
-              {"user_id": user_id},
+          result = await self._update_user(
+              user_id,
               {"$unset": {"chat_id": ""}}
           )
           return result.modified_count > 0
@@ -159,11 +351,11 @@ class Database:
           return False
 
     ### Thumbnail Management ###
-    def set_thumbnail(self, user_id, thumbnail):
+    async def set_thumbnail(self, user_id, thumbnail):
         """Set custom thumbnail for user"""
         try:
             # Get the current thumbnail
-            current_doc = self.users.find_one({"user_id": user_id})
+            current_doc = await self._get_user(user_id)
             
             # If the user has the same thumbnail already, return True
             # without making an unnecessary DB update
@@ -174,8 +366,8 @@ class Database:
                 if not self._validate_thumbnail(thumbnail):
                     return False
                     
-            result = self.users.update_one(
-                {"user_id": user_id},
+            result = await self._update_user(
+                user_id,
                 {"$set": {"thumbnail": thumbnail}}
             )
             
@@ -183,27 +375,27 @@ class Database:
             if result.matched_count > 0:
                 # Also update stats if actually changed
                 if result.modified_count > 0:
-                    self.stats.update_one({}, {"$inc": {"thumbnails_set": 1}})
+                    self._buffer_stat("thumbnails_set", 1)
                 return True
             return False
         except Exception as e:
             logger.error(f"Error setting thumbnail: {e}")
             return False
 
-    def get_thumbnail(self, user_id):
+    async def get_thumbnail(self, user_id):
         """Get user's thumbnail"""
         try:
-            user = self.users.find_one({"user_id": user_id})
+            user = await self._get_user(user_id)
             return user.get("thumbnail") if user else None
         except Exception as e:
             logger.error(f"Error getting thumbnail: {e}")
             return None
 
-    def remove_thumbnail(self, user_id):
+    async def remove_thumbnail(self, user_id):
         """Remove user's thumbnail"""
         try:
-            result = self.users.update_one(
-                {"user_id": user_id},
+            result = await self._update_user(
+                user_id,
                 {"$unset": {"thumbnail": ""}}
             )
             return result.modified_count > 0
@@ -212,17 +404,17 @@ class Database:
             return False
 
     ### Authorization System ###
-    def is_user_authorized(self, user_id):
+    async def is_user_authorized(self, user_id):
         """Check if user is authorized"""
         try:
             if self._is_admin(user_id):
                 return True
-            user = self.users.find_one({"user_id": user_id})
+            user = await self._get_user(user_id)
             if not user:
                 return False
             if user.get("expiration_time") and user["expiration_time"] < datetime.now():
-                self.users.update_one(
-                    {"user_id": user_id},
+                await self._update_user(
+                    user_id,
                     {"$set": {"premium_level": 0, "expiration_time": None, "message_limit": None}}
                 )
                 return False
@@ -231,7 +423,7 @@ class Database:
             logger.error(f"Error checking authorization: {e}")
             return False
 
-    def authorize_user(self, user_id, auth_by=None, expiration_hours=None, message_limit=None, premium_level=1):
+    async def authorize_user(self, user_id, auth_by=None, expiration_hours=None, message_limit=None, premium_level=1):
         """Authorize a user with optional expiration, message limit, and premium level"""
         try:
             expiration_time = datetime.now() + timedelta(hours=expiration_hours) if expiration_hours else None
@@ -242,8 +434,8 @@ class Database:
                 "auth_by": auth_by,
                 "timestamp": datetime.now()
             }
-            result = self.users.update_one(
-                {"user_id": user_id},
+            result = await self._update_user(
+                user_id,
                 {"$set": update_data}
             )
             return result.modified_count > 0 or result.matched_count > 0
@@ -251,11 +443,11 @@ class Database:
             logger.error(f"Error authorizing user: {e}")
             return False
 
-    def unauthorize_user(self, user_id):
+    async def unauthorize_user(self, user_id):
         """Unauthorize a user"""
         try:
-            result = self.users.update_one(
-                {"user_id": user_id},
+            result = await self._update_user(
+                user_id,
                 {"$set": {"premium_level": 0, "expiration_time": None, "message_limit": None}}
             )
             return result.modified_count > 0
@@ -264,7 +456,7 @@ class Database:
             return False
 
     ### Key Management ###
-    def create_key(self, key, expiration_time=None, message_limit=None, premium_level=0, created_by=None):
+    async def create_key(self, key, expiration_time=None, message_limit=None, premium_level=0, created_by=None):
         """Create a new key"""
         try:
             key_data = {
@@ -277,28 +469,28 @@ class Database:
                 "redeemed_by": None,
                 "redeemed_at": None
             }
-            result = self.keys.insert_one(key_data)
+            result = await self.keys.insert_one(key_data)
             return result.inserted_id
         except Exception as e:
             logger.error(f"Error creating key: {e}")
             return None
 
-    def get_key(self, key):
+    async def get_key(self, key):
         """Get key by key string"""
         try:
-            return self.keys.find_one({"key": key})
+            return await self.keys.find_one({"key": key})
         except Exception as e:
             logger.error(f"Error getting key: {e}")
             return None
             
-    def get_remaining_messages(self, user_id):
+    async def get_remaining_messages(self, user_id):
         """Get remaining message limit for user
     
     Returns:
         int or None: Number of messages remaining, None if unlimited
     """
         try:
-            user = self.users.find_one({"user_id": user_id})
+            user = await self._get_user(user_id)
             if not user:
                 return None
             return user.get("message_limit")
@@ -306,14 +498,14 @@ class Database:
             logger.error(f"Error getting remaining messages: {e}")
             return None
 
-    def get_expiration_time_remaining(self, user_id):
+    async def get_expiration_time_remaining(self, user_id):
         """Get time remaining until user's premium expires
     
     Returns:
         timedelta or None: Time remaining until expiration, None if no expiration
     """
         try:
-           user = self.users.find_one({"user_id": user_id})
+           user = await self._get_user(user_id)
            if not user or not user.get("expiration_time"):
               return None
         
@@ -330,7 +522,7 @@ class Database:
           logger.error(f"Error getting expiration time: {e}")
           return None
 
-    def get_expiration_time_formatted(self, user_id):
+    async def get_expiration_time_formatted(self, user_id):
         """Get formatted string of time remaining until user's premium expires
     
     Returns:
@@ -338,7 +530,7 @@ class Database:
              appropriate message if no expiration or expired
     """
         try:
-          remaining = self.get_expiration_time_remaining(user_id)
+          remaining = await self.get_expiration_time_remaining(user_id)
         
           if remaining is None:
             return "No expiration set"
@@ -371,15 +563,15 @@ class Database:
           logger.error(f"Error formatting expiration time: {e}")
           return "Error determining expiration"
 
-    def redeem_key(self, key, user_id):
+    async def redeem_key(self, key, user_id):
        """Redeem a key for a user"""
        try:
         # Get user data first
-          user = self.users.find_one({"user_id": user_id})
+          user = await self._get_user(user_id)
           if not user:
             # Create user record if it doesn't exist
-            self.add_user(user_id)
-            user = self.users.find_one({"user_id": user_id})
+            await self.add_user(user_id)
+            user = await self._get_user(user_id)
         
         # Check for cooldown first
           last_redeem = user.get("last_key_redemption")
@@ -389,10 +581,10 @@ class Database:
         # Now check if user is already authorized
           if user.get("premium_level", 0) > 0:
             # Update last redemption timestamp even for failed attempts
-              self.users.update_one({"user_id": user_id}, {"$set": {"last_key_redemption": datetime.now()}})
+              await self._update_user(user_id, {"$set": {"last_key_redemption": datetime.now()}})
               return False, "You are already authorized. You don't need to redeem any key to use features of the bot."
             
-          key_data = self.get_key(key)
+          key_data = await self.get_key(key)
           if not key_data:
             return False, "Key not found"
           if key_data["redeemed_by"]:
@@ -432,8 +624,8 @@ class Database:
             "last_key_redemption": datetime.now()
         }
         
-          self.users.update_one({"user_id": user_id}, {"$set": update_data})
-          self.keys.update_one(
+          await self._update_user(user_id, {"$set": update_data})
+          await self.keys.update_one(
             {"key": key},
             {"$set": {"redeemed_by": user_id, "redeemed_at": datetime.now()}}
         )
@@ -442,12 +634,120 @@ class Database:
           logger.error(f"Error redeeming key: {e}")
           return False, "Error redeeming key"
 
+    ### Quota ###
+    async def consume_quota(self, user_id, count=1):
+        """Atomically use count units of a user's message limit
+        
+        Returns:
+            tuple: (consumed, remaining) where consumed is a boolean and
+                   remaining is the limit left afterwards, None if unlimited
+        """
+        try:
+            user = await self._get_user(user_id)
+            if not user or user.get("message_limit") is None:
+                return True, None
+            
+            # Conditional update: never goes below zero, even with several
+            # handlers racing for the same user
+            result = await self.users.find_one_and_update(
+                {"user_id": user_id, "message_limit": {"$gte": count}},
+                {"$inc": {"message_limit": -count}},
+                projection={"message_limit": 1},
+                return_document=ReturnDocument.AFTER
+            )
+            self.invalidate_user(user_id)
+            if result is not None:
+                return True, result["message_limit"]
+            
+            # The limit may have been removed since the cached read
+            user = await self._get_user(user_id)
+            remaining = user.get("message_limit") if user else None
+            return remaining is None, remaining
+        except Exception as e:
+            logger.error(f"Error consuming quota: {e}")
+            return False, None
+
+    async def reserve_quota(self, user_id, count):
+        """Take up to count units of a user's message limit in one go
+        
+        The reserved units are held in memory; use_reserved_quota spends
+        them and release_quota gives back whatever was not used.
+        
+        Returns:
+            tuple: (reserved, remaining) where reserved is the number of units
+                   granted and remaining is the limit left in the database,
+                   None if the user has no limit. reserved is None when the
+                   reservation could not be made at all.
+        """
+        try:
+            for _ in range(5):
+                user = await self.users.find_one({"user_id": user_id}, {"message_limit": 1})
+                limit = user.get("message_limit") if user else None
+                if limit is None:
+                    return count, None
+                
+                reserved = min(count, max(limit, 0))
+                if reserved == 0:
+                    return 0, limit
+                
+                # Compare-and-swap on the value we read
+                result = await self.users.find_one_and_update(
+                    {"user_id": user_id, "message_limit": limit},
+                    {"$inc": {"message_limit": -reserved}},
+                    projection={"message_limit": 1},
+                    return_document=ReturnDocument.AFTER
+                )
+                if result is not None:
+                    self.invalidate_user(user_id)
+                    self._quota_reservations[user_id] = self._quota_reservations.get(user_id, 0) + reserved
+                    return reserved, result["message_limit"]
+            
+            logger.warning(f"Could not reserve quota for {user_id}: limit kept changing")
+            return None, None
+        except Exception as e:
+            logger.error(f"Error reserving quota: {e}")
+            return None, None
+
+    def use_reserved_quota(self, user_id, count=1):
+        """Spend reserved units, returns how many are left"""
+        left = max(self._quota_reservations.get(user_id, 0) - count, 0)
+        if user_id in self._quota_reservations:
+            self._quota_reservations[user_id] = left
+        return left
+
+    def restore_quota_reservation(self, user_id, count):
+        """Hold count units that were taken from the database by an earlier
+        process (an interrupted batch) without taking them again"""
+        if count > 0:
+            self._quota_reservations[user_id] = self._quota_reservations.get(user_id, 0) + count
+
+    def get_reserved_quota(self, user_id):
+        """Get the number of reserved units not used yet"""
+        return self._quota_reservations.get(user_id, 0)
+
+    async def release_quota(self, user_id):
+        """Return unused reserved units to the user's message limit"""
+        left = self._quota_reservations.pop(user_id, 0)
+        if not left:
+            return True
+        try:
+            # Skip users whose limit was cleared meanwhile ($inc fails on null)
+            await self.users.update_one(
+                {"user_id": user_id, "message_limit": {"$ne": None}},
+                {"$inc": {"message_limit": left}}
+            )
+            self.invalidate_user(user_id)
+            return True
+        except Exception as e:
+            logger.error(f"Error releasing quota: {e}")
+            return False
+
     ### Batch Processing ###
-    def set_user_in_batch(self, user_id, in_batch=True):
+    async def set_user_in_batch(self, user_id, in_batch=True):
         """Set user's batch status"""
         try:
-            self.users.update_one(
-                {"user_id": user_id},
+            await self._update_user(
+                user_id,
                 {"$set": {"in_batch": in_batch}}
             )
             return True
@@ -455,86 +755,301 @@ class Database:
             logger.error(f"Error setting batch status: {e}")
             return False
 
-    def is_user_in_batch(self, user_id):
+    async def is_user_in_batch(self, user_id):
         """Check if user is in batch"""
         try:
-            user = self.users.find_one({"user_id": user_id})
+            user = await self._get_user(user_id)
             return user.get("in_batch", False) if user else False
         except Exception as e:
             logger.error(f"Error checking batch status: {e}")
             return False
 
+    ### Batch Jobs ###
+    async def create_batch_job(self, user_id, base_link, message_ids, dest_chat_id, pin_msg_id=None, reserved_quota=None):
+        """Record a batch's spec so it survives a restart
+        
+        Returns:
+            ObjectId: the job's ID, None if it could not be saved
+        """
+        try:
+            now = datetime.now()
+            result = await self.batch_jobs.insert_one({
+                "user_id": user_id,
+                "status": "running",
+                "base_link": base_link,
+                "message_ids": message_ids,
+                "dest_chat_id": dest_chat_id,
+                "pin_msg_id": pin_msg_id,
+                "reserved_quota": reserved_quota,
+                "reservation_released": False,
+                "cursor": 0,
+                "failed_ids": [],
+                "stats": {},
+                "resumes": 0,
+                "created_at": now,
+                "updated_at": now
+            })
+            return result.inserted_id
+        except Exception as e:
+            logger.error(f"Error creating batch job: {e}")
+            return None
+
+    async def checkpoint_batch_job(self, job_id, cursor, stats, failed_id=None):
+        """Save a batch's progress after message_ids[cursor - 1] was handled
+        
+        Messages are committed strictly in order, so everything before
+        cursor is done; failed_id records one that was skipped on an error.
+        """
+        try:
+            update = {"$set": {"cursor": cursor, "stats": stats, "updated_at": datetime.now()}}
+            if failed_id is not None:
+                update["$push"] = {"failed_ids": failed_id}
+            await self.batch_jobs.update_one({"_id": job_id}, update)
+            return True
+        except Exception as e:
+            logger.error(f"Error checkpointing batch job: {e}")
+            return False
+
+    async def set_batch_job_status(self, job_id, status):
+        """Mark a batch job running, interrupted, completed, cancelled or failed"""
+        try:
+            update = {"$set": {"status": status, "updated_at": datetime.now()}}
+            if status == "running":
+                update["$inc"] = {"resumes": 1}
+            await self.batch_jobs.update_one({"_id": job_id}, update)
+            return True
+        except Exception as e:
+            logger.error(f"Error setting batch job status: {e}")
+            return False
+
+    async def set_batch_job_reservation(self, job_id, reserved_quota=None, released=False):
+        """Record a batch's quota reservation: `reserved_quota` units taken for
+        it in total, and whether the unused part was given back already (a
+        crashed process never gets to give it back)"""
+        try:
+            update = {"reservation_released": released, "updated_at": datetime.now()}
+            if reserved_quota is not None:
+                update["reserved_quota"] = reserved_quota
+            await self.batch_jobs.update_one({"_id": job_id}, {"$set": update})
+            return True
+        except Exception as e:
+            logger.error(f"Error setting batch job reservation: {e}")
+            return False
+
+    async def get_resumable_batch_job(self, user_id):
+        """Get the user's latest batch that stopped before finishing, None if there is none"""
+        try:
+            return await self.batch_jobs.find_one(
+                {"user_id": user_id, "status": {"$in": RESUMABLE_BATCH_STATUSES}},
+                sort=[("created_at", -1)]
+            )
+        except Exception as e:
+            logger.error(f"Error getting resumable batch job: {e}")
+            return None
+
+    async def get_batch_job(self, job_id):
+        """Get a batch job by its ID"""
+        try:
+            return await self.batch_jobs.find_one({"_id": job_id})
+        except Exception as e:
+            logger.error(f"Error getting batch job: {e}")
+            return None
+
+    async def get_running_batch_jobs(self):
+        """Get batch jobs still marked running, i.e. cut off by a restart"""
+        try:
+            return await self.batch_jobs.find({"status": "running"}).to_list(None)
+        except Exception as e:
+            logger.error(f"Error getting running batch jobs: {e}")
+            return []
+
+    ### Job Queue ###
+    async def save_queued_job(self, kind, user_id, priority, payload):
+        """Persist a job waiting in the scheduler's queue
+        
+        Returns:
+            ObjectId: the stored job's ID, None if it could not be saved
+        """
+        try:
+            result = await self.job_queue.insert_one({
+                "kind": kind,
+                "user_id": user_id,
+                "priority": priority,
+                "payload": payload,
+                "status": "queued",
+                "enqueued_at": datetime.now()
+            })
+            return result.inserted_id
+        except Exception as e:
+            logger.error(f"Error saving queued job: {e}")
+            return None
+
+    async def set_queued_job_status(self, job_id, status):
+        """Mark a stored job queued or running"""
+        try:
+            await self.job_queue.update_one({"_id": job_id}, {"$set": {"status": status}})
+            return True
+        except Exception as e:
+            logger.error(f"Error setting queued job status: {e}")
+            return False
+
+    async def remove_queued_job(self, job_id):
+        """Delete a stored job once it finished or was cancelled"""
+        try:
+            await self.job_queue.delete_one({"_id": job_id})
+            return True
+        except Exception as e:
+            logger.error(f"Error removing queued job: {e}")
+            return False
+
+    async def get_queued_jobs(self):
+        """Get every stored job, oldest first"""
+        try:
+            return await self.job_queue.find({}).sort("enqueued_at", 1).to_list(None)
+        except Exception as e:
+            logger.error(f"Error getting queued jobs: {e}")
+            return []
+
+    ### Media Cache ###
+    async def get_cached_media(self, unique_id, file_size, variant):
+        """Get the Bot's upload of a source file, None if it was never uploaded"""
+        try:
+            return await self.media_cache.find_one(
+                {"unique_id": unique_id, "file_size": file_size, "variant": variant}
+            )
+        except Exception as e:
+            logger.error(f"Error getting cached media: {e}")
+            return None
+
+    async def cache_media(self, unique_id, file_size, variant, kind, file_id):
+        """Remember the file_id the Bot got when it uploaded a source file"""
+        try:
+            await self.media_cache.update_one(
+                {"unique_id": unique_id, "file_size": file_size, "variant": variant},
+                {"$set": {"kind": kind, "file_id": file_id, "cached_at": datetime.now()}},
+                upsert=True
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Error caching media: {e}")
+            return False
+
+    async def remove_cached_media(self, unique_id, file_size, variant):
+        """Forget a cached upload, e.g. because its file_id stopped working"""
+        try:
+            await self.media_cache.delete_one(
+                {"unique_id": unique_id, "file_size": file_size, "variant": variant}
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Error removing cached media: {e}")
+            return False
+
     ### Statistics ###
-    def increment_cloned_count(self, user_id, count=1):
+    async def increment_cloned_count(self, user_id, count=1):
         """Update cloned messages count and decrement message limit if applicable"""
         try:
-            user = self.users.find_one({"user_id": user_id})
-            if user and user.get("message_limit") is not None:
-                if user["message_limit"] <= 0:
+            # A batch drawing on its reservation accounts for the message itself
+            if not reserved_billing.get():
+                consumed, _ = await self.consume_quota(user_id)
+                if not consumed:
                     return False
-                self.users.update_one({"user_id": user_id}, {"$inc": {"message_limit": -1}})
-            self.stats.update_one({}, {"$inc": {"cloned_messages": count}})
+            self._buffer_stat("cloned_messages", count)
             return True
         except Exception as e:
             logger.error(f"Error updating cloned count: {e}")
             return False
 
-    def increment_downloaded_count(self, count=1):
+    async def increment_downloaded_count(self, count=1):
         """Update downloaded messages count"""
         try:
-            self.stats.update_one({}, {"$inc": {"downloaded_messages": count}})
+            self._buffer_stat("downloaded_messages", count)
             return True
         except Exception as e:
             logger.error(f"Error updating download count: {e}")
             return False
 
-    def get_stats(self):
+    def _buffer_stat(self, field, count):
+        """Add to an in-memory counter that flush_stats writes out in bulk"""
+        self._pending_stats[field] = self._pending_stats.get(field, 0) + count
+        if self._stats_flusher is None or self._stats_flusher.done():
+            self._stats_flusher = asyncio.get_running_loop().create_task(self._flush_stats_loop())
+
+    async def _flush_stats_loop(self):
+        """Flush buffered counters every STATS_FLUSH_INTERVAL seconds"""
+        while True:
+            await asyncio.sleep(STATS_FLUSH_INTERVAL)
+            await self.flush_stats()
+
+    async def flush_stats(self):
+        """Write all buffered counters to the statistics document with one $inc"""
+        pending, self._pending_stats = self._pending_stats, {}
+        if not pending:
+            return True
+        try:
+            await self.stats.update_one({}, {"$inc": pending})
+            return True
+        except Exception as e:
+            logger.error(f"Error flushing stats: {e}")
+            # Put the counts back so the next flush retries them
+            for field, count in pending.items():
+                self._pending_stats[field] = self._pending_stats.get(field, 0) + count
+            return False
+
+    def _with_pending_stats(self, stats):
+        """Add counters that have not been flushed yet to a stats document"""
+        stats = dict(stats or {})
+        for field, count in self._pending_stats.items():
+            stats[field] = stats.get(field, 0) + count
+        return stats
+
+    async def get_stats(self):
         """Get all statistics"""
         try:
-            return self.stats.find_one({}) or {}
+            return self._with_pending_stats(await self.stats.find_one({}))
         except Exception as e:
             logger.error(f"Error getting stats: {e}")
             return {}
 
-    def get_user_count(self):
+    async def get_user_count(self):
         """Get total number of users"""
         try:
-            return self.users.count_documents({})
+            return await self.users.count_documents({})
         except Exception as e:
             logger.error(f"Error getting user count: {e}")
             return 0
 
-    def get_cloned_messages_count(self):
+    async def get_cloned_messages_count(self):
         """Get total cloned messages count"""
         try:
-            stats = self.stats.find_one({})
-            return stats.get("cloned_messages", 0) if stats else 0
+            stats = await self.get_stats()
+            return stats.get("cloned_messages", 0)
         except Exception as e:
             logger.error(f"Error getting cloned messages count: {e}")
             return 0
 
-    def get_downloaded_messages_count(self):
+    async def get_downloaded_messages_count(self):
         """Get total downloaded messages count"""
         try:
-            stats = self.stats.find_one({})
-            return stats.get("downloaded_messages", 0) if stats else 0
+            stats = await self.get_stats()
+            return stats.get("downloaded_messages", 0)
         except Exception as e:
             logger.error(f"Error getting downloaded messages count: {e}")
             return 0
 
-    def get_recent_users(self, limit=5):
+    async def get_recent_users(self, limit=5):
         """Get recently active users"""
         try:
-            return list(self.users.find().sort("last_activity", -1).limit(limit))
+            return await self.users.find().sort("last_activity", -1).limit(limit).to_list(None)
         except Exception as e:
             logger.error(f"Error getting recent users: {e}")
             return []
 
     ### Ban System ###
-    def ban_user(self, user_id, banned_by=None, reason=None):
+    async def ban_user(self, user_id, banned_by=None, reason=None):
       """Ban a user"""
       try:
-          result = self.banned.update_one(
+          result = await self.banned.update_one(
             {"user_id": user_id},
             {"$set": {
                 "banned_by": banned_by, 
@@ -548,14 +1063,14 @@ class Database:
           logger.error(f"Error banning user: {e}")
           return False
 
-    def is_user_banned(self, user_id):
+    async def is_user_banned(self, user_id):
       """Check if user is banned and get reason
     
     Returns:
         tuple: (is_banned, reason) where is_banned is a boolean and reason is a string or None
     """
       try:
-          ban_data = self.banned.find_one({"user_id": user_id})
+          ban_data = await self.banned.find_one({"user_id": user_id})
           if ban_data:
               return True, ban_data.get("reason")
           return False, None
@@ -563,30 +1078,30 @@ class Database:
           logger.error(f"Error checking ban status: {e}")
           return False, None
 
-    def unban_user(self, user_id):
+    async def unban_user(self, user_id):
         """Unban a user"""
         try:
-            result = self.banned.delete_one({"user_id": user_id})
+            result = await self.banned.delete_one({"user_id": user_id})
             return result.deleted_count > 0
         except Exception as e:
             logger.error(f"Error unbanning user: {e}")
             return False
     
-    def get_thumbnail_enabled(self, user_id):
+    async def get_thumbnail_enabled(self, user_id):
         """Get thumbnail enabled status for user"""
         try:
-            user = self.users.find_one({"user_id": user_id})
+            user = await self._get_user(user_id)
             # Default to True if not set for backward compatibility
             return user.get("thumbnail_enabled", True) if user else True
         except Exception as e:
             logger.error(f"Error getting thumbnail status: {e}")
             return True  # Default to enabled on error
     
-    def set_thumbnail_enabled(self, user_id, enabled=True):
+    async def set_thumbnail_enabled(self, user_id, enabled=True):
         """Set thumbnail enabled status for user"""
         try:
-            result = self.users.update_one(
-                {"user_id": user_id},
+            result = await self._update_user(
+                user_id,
                 {"$set": {"thumbnail_enabled": enabled}}
             )
             return result.modified_count > 0 or result.matched_count > 0
@@ -595,10 +1110,10 @@ class Database:
             return False
 
     ### User Info ###
-    def get_user_info(self, user_id):
+    async def get_user_info(self, user_id):
         """Get user information"""
         try:
-            user = self.users.find_one({"user_id": user_id})
+            user = await self._get_user(user_id)
             if user:
                 return {
                     "user_id": user["user_id"],
@@ -619,56 +1134,59 @@ class Database:
             return None
 
     ### User Lists ###
-    def get_all_users(self):
+    async def get_all_users(self):
         """Get all users"""
         try:
-            return list(self.users.find({}))
+            return await self.users.find({}).to_list(None)
         except Exception as e:
             logger.error(f"Error getting users: {e}")
             return []
 
-    def get_authorized_users(self):
+    async def get_authorized_users(self):
         """Get authorized users"""
         try:
-            return list(self.users.find({"premium_level": {"$gt": 0}}))
+            return await self.users.find({"premium_level": {"$gt": 0}}).to_list(None)
         except Exception as e:
             logger.error(f"Error getting authorized users: {e}")
             return []
 
-    def get_banned_users(self):
+    async def get_banned_users(self):
         """Get banned users"""
         try:
-            return list(self.banned.find({}))
+            return await self.banned.find({}).to_list(None)
         except Exception as e:
             logger.error(f"Error getting banned users: {e}")
             return []
 
-    def set_watermark_text(self, user_id, text):
+    async def set_watermark_text(self, user_id, text):
        """Set watermark text for user"""
        try:
-          result = self.users.update_one(
-            {"user_id": user_id},
+          result = await self._update_user(
+            user_id,
             {"$set": {"watermark_text": text}}
           )
+          # Imported here so the database layer doesn't load Pillow at startup
+          from main.plugins.watermark import watermark_overlays
+          watermark_overlays.invalidate(user_id)
           return result.modified_count > 0
        except Exception as e:
           logger.error(f"Error setting watermark text: {e}")
           return False
 
-    def get_watermark_text(self, user_id):
+    async def get_watermark_text(self, user_id):
        """Get user's watermark text"""
        try:
-          user = self.users.find_one({"user_id": user_id})
+          user = await self._get_user(user_id)
           return user.get("watermark_text") if user else None
        except Exception as e:
           logger.error(f"Error getting watermark text: {e}")
           return None
       
-    def warn_user(self, user_id, warned_by=None, reason=None):
+    async def warn_user(self, user_id, warned_by=None, reason=None):
      """Warn a user and return the current warning count"""
      try:
         # Get current warnings
-        current_warnings = self.get_user_warnings(user_id)
+        current_warnings = await self.get_user_warnings(user_id)
         
         # Add new warning
         warning_data = {
@@ -677,7 +1195,7 @@ class Database:
             "reason": reason,
             "timestamp": datetime.now()
         }
-        self.warnings.insert_one(warning_data)
+        await self.warnings.insert_one(warning_data)
         
         # Return the new warning count
         return current_warnings + 1
@@ -685,23 +1203,23 @@ class Database:
         logger.error(f"Error warning user: {e}")
         return 0
 
-    def get_user_warnings(self, user_id):
+    async def get_user_warnings(self, user_id):
       """Get number of warnings for a user"""
       try:
-          return self.warnings.count_documents({"user_id": user_id})
+          return await self.warnings.count_documents({"user_id": user_id})
       except Exception as e:
           logger.error(f"Error getting user warnings: {e}")
           return 0
 
-    def get_user_warnings_details(self, user_id):
+    async def get_user_warnings_details(self, user_id):
       """Get details of all warnings for a user"""
       try:
-          return list(self.warnings.find({"user_id": user_id}).sort("timestamp", -1))
+          return await self.warnings.find({"user_id": user_id}).sort("timestamp", -1).to_list(None)
       except Exception as e:
           logger.error(f"Error getting warning details: {e}")
           return []
 
-    def remove_warning(self, user_id, warning_id=None):
+    async def remove_warning(self, user_id, warning_id=None):
       """Remove a warning from a user
     
     Args:
@@ -714,15 +1232,15 @@ class Database:
       try:
           if warning_id:
             # Remove specific warning
-              result = self.warnings.delete_one({"_id": warning_id, "user_id": user_id})
+              result = await self.warnings.delete_one({"_id": warning_id, "user_id": user_id})
           else:
             # Remove most recent warning
-              most_recent = self.warnings.find_one(
+              most_recent = await self.warnings.find_one(
                 {"user_id": user_id}, 
                 sort=[("timestamp", -1)]
             )
               if most_recent:
-                result = self.warnings.delete_one({"_id": most_recent["_id"]})
+                result = await self.warnings.delete_one({"_id": most_recent["_id"]})
               else:
                   return False
                 
@@ -731,16 +1249,16 @@ class Database:
           logger.error(f"Error removing warning: {e}")
           return False
 
-    def clear_warnings(self, user_id):
+    async def clear_warnings(self, user_id):
       """Remove all warnings for a user"""
       try:
-          result = self.warnings.delete_many({"user_id": user_id})
+          result = await self.warnings.delete_many({"user_id": user_id})
           return result.deleted_count > 0
       except Exception as e:
           logger.error(f"Error clearing warnings: {e}")
           return False
                
-    def mute_user(self, user_id, muted_by=None, duration=None, reason=None):
+    async def mute_user(self, user_id, muted_by=None, duration=None, reason=None):
       """Mute a user for a specified duration
     
     Args:
@@ -754,8 +1272,8 @@ class Database:
     """
       try:
           mute_until = datetime.now() + timedelta(minutes=duration) if duration else None
-          result = self.users.update_one(
-            {"user_id": user_id},
+          result = await self._update_user(
+            user_id,
             {"$set": {
                 "muted": True,
                 "muted_by": muted_by,
@@ -769,7 +1287,7 @@ class Database:
           logger.error(f"Error muting user: {e}")
           return False
 
-    def unmute_user(self, user_id):
+    async def unmute_user(self, user_id):
       """Unmute a user
     
     Args:
@@ -779,8 +1297,8 @@ class Database:
         bool: True if unmuted successfully, False otherwise
     """
       try:
-          result = self.users.update_one(
-            {"user_id": user_id},
+          result = await self._update_user(
+            user_id,
             {"$unset": {
                 "muted": "",
                 "muted_by": "",
@@ -794,7 +1312,7 @@ class Database:
           logger.error(f"Error unmuting user: {e}")
           return False
 
-    def is_user_muted(self, user_id):
+    async def is_user_muted(self, user_id):
       """Check if user is muted and get reason and remaining time
     
     Returns:
@@ -804,7 +1322,7 @@ class Database:
                time_remaining is a timedelta or None (if mute is indefinite)
     """
       try:
-          user = self.users.find_one({"user_id": user_id})
+          user = await self._get_user(user_id)
           if not user or "muted" not in user or not user["muted"]:
               return False, None, None
             
@@ -812,7 +1330,7 @@ class Database:
           if user.get("mute_until"):
               if user["mute_until"] < datetime.now():
                 # Mute expired, remove it
-                  self.unmute_user(user_id)
+                  await self.unmute_user(user_id)
                   return False, None, None
               else:
                 # Calculate remaining time
@@ -825,14 +1343,14 @@ class Database:
           logger.error(f"Error checking mute status: {e}")
           return False, None, None
 
-    def get_mute_time_formatted(self, user_id):
+    async def get_mute_time_formatted(self, user_id):
       """Get formatted string of time remaining for mute
     
     Returns:
         str: Formatted time string or appropriate message
     """
       try:
-          is_muted, _, remaining = self.is_user_muted(user_id)
+          is_muted, _, remaining = await self.is_user_muted(user_id)
         
           if not is_muted:
               return "Not muted"
@@ -840,31 +1358,12 @@ class Database:
           if remaining is None:
               return "Indefinite"
         
-        # Format remaining time
-          days = remaining.days
-          hours, remainder = divmod(remaining.seconds, 3600)
-          minutes, seconds = divmod(remainder, 60)
-        
-          time_parts = []
-          if days > 0:
-              time_parts.append(f"{days} day{'s' if days != 1 else ''}")
-          if hours > 0:
-              time_parts.append(f"{hours} hour{'s' if hours != 1 else ''}")
-          if minutes > 0:
-              time_parts.append(f"{minutes} minute{'s' if minutes != 1 else ''}")
-        
-          if not days and not hours and seconds > 0:
-              time_parts.append(f"{seconds} second{'s' if seconds != 1 else ''}")
-            
-          if not time_parts:
-              return "Less than a second"
-            
-          return ", ".join(time_parts)
+          return format_remaining_time(remaining)
       except Exception as e:
           logger.error(f"Error formatting mute time: {e}")
           return "Error determining mute time"
              
-    def get_user_level(self, user_id):
+    async def get_user_level(self, user_id):
        """Get user's premium level
        
        Args:
@@ -874,7 +1373,7 @@ class Database:
            int: The user's premium level (0 for free users, 1+ for premium)
        """
        try:
-          user = self.users.find_one({"user_id": user_id})
+          user = await self._get_user(user_id)
           if not user:
              return 0
           
@@ -0,0 +1,141 @@
+import os
+import struct
+import asyncio
+import logging
+
+from pyrogram.errors import FloodWait
+
+from main.plugins.helpers import screenshot
+from main.plugins.jobqueue import stage
+from main.plugins.ratelimit import limiter
+
+logger = logging.getLogger(__name__)
+
+# Videos at least this big get their thumbnail made from the head of the
+# file while the rest downloads; smaller ones finish too soon to matter
+EARLY_THUMB_MIN_SIZE = 100 * 1024 * 1024
+# MiB of the file fetched for it (stream_media yields 1 MiB chunks)
+EARLY_THUMB_HEAD_MB = 16
+EARLY_THUMB_DIR = os.path.join("downloads", "heads")
+# How long upload_media waits for an unfinished early thumbnail before
+# taking its own screenshot, and how long a finished one nobody took is kept
+EARLY_THUMB_WAIT = 15
+EARLY_THUMB_TTL = 600
+
+def is_faststart(path):
+    """Whether an MP4's moov box sits, complete, before its mdat in the file at `path`"""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        offset = 0
+        while offset + 8 <= size:
+            f.seek(offset)
+            box_size, box_type = struct.unpack(">I4s", f.read(8))
+            if box_size == 1:
+                box_size = struct.unpack(">Q", f.read(8))[0]
+            elif box_size == 0:
+                box_size = size - offset
+            if box_type == b"moov":
+                return offset + box_size <= size
+            if box_type == b"mdat" or box_size < 8:
+                return False
+            offset += box_size
+    return False
+
+def watermark_of(ctx):
+    """The user's watermark text, "" when unset or switched off with "no" """
+    text = ctx.watermark_text if ctx else None
+    return "" if not text or text.lower() == "no" else text
+
+def needs_screenshot(msg, ctx):
+    """Whether upload_media will fall back to an ffmpeg screenshot for this video"""
+    if ctx is None:
+        return False
+    if watermark_of(ctx):
+        return True
+    if ctx.thumbnail and ctx.thumbnail_enabled:
+        return False
+    return not msg.video.thumbs
+
+class EarlyThumbnails:
+    """Screenshots taken from the first few MiB of a faststart MP4.
+
+    `start` fetches the head of the file with stream_media alongside the
+    full download, through the same download stage and rate limiter, and
+    takes a screenshot of it. upload_media then `take`s that file instead of
+    running ffmpeg on the finished download. The frame comes from early in
+    the video, so it is handed over directly and never enters the screenshot
+    cache, which holds mid-video frames. Files that aren't faststart are left
+    to the normal path.
+    """
+
+    def __init__(self):
+        self._pending = {}
+
+    def start(self, userbot, msg, sender, ctx):
+        video = msg.video if msg else None
+        if video is None or video.mime_type != "video/mp4" or (video.file_size or 0) < EARLY_THUMB_MIN_SIZE:
+            return
+        key = (video.file_unique_id, watermark_of(ctx))
+        if key in self._pending or not needs_screenshot(msg, ctx):
+            return
+        loop = asyncio.get_running_loop()
+        self._pending[key] = loop.create_task(self._extract(userbot, msg, sender, ctx))
+        loop.call_later(EARLY_THUMB_TTL, self._expire, key, self._pending[key])
+
+    async def _fetch_head(self, userbot, msg, head):
+        bucket = limiter.bucket(userbot.stream_media)
+        async with stage("download"):
+            await bucket.acquire()
+            try:
+                with open(head, "wb") as f:
+                    async for chunk in userbot.stream_media(msg, limit=EARLY_THUMB_HEAD_MB):
+                        f.write(chunk)
+            except FloodWait as e:
+                # The head is optional; back off like every other caller and skip it
+                bucket.on_flood_wait(e.value)
+                return False
+            bucket.on_success()
+        return True
+
+    async def _extract(self, userbot, msg, sender, ctx):
+        video = msg.video
+        head = os.path.join(EARLY_THUMB_DIR, f"{video.file_unique_id}_{id(msg)}.mp4")
+        try:
+            os.makedirs(EARLY_THUMB_DIR, exist_ok=True)
+            if not await self._fetch_head(userbot, msg, head) or not is_faststart(head):
+                return None
+            # Aim for the middle of what was fetched, or the middle of the
+            # video if the head happens to cover that far
+            covered = (video.duration or 0) * os.path.getsize(head) / video.file_size
+            duration = min(video.duration or 0, covered)
+            return await screenshot(head, duration, sender, ctx, None, watermark_of(ctx))
+        except Exception as e:
+            logger.error(f"Early thumbnail for {video.file_unique_id} failed: {e}")
+            return None
+        finally:
+            if os.path.exists(head):
+                os.remove(head)
+
+    async def take(self, media_id, watermark_text):
+        """The early screenshot of this media and watermark, now owned by the
+        caller, or None if there is none or it isn't ready in time"""
+        task = self._pending.pop((media_id, watermark_text or ""), None)
+        if task is None:
+            return None
+        await asyncio.wait([task], timeout=EARLY_THUMB_WAIT)
+        if not task.done():
+            task.cancel()
+            return None
+        return task.result()
+
+    def _expire(self, key, task):
+        """Delete an early screenshot nobody took, e.g. because the upload failed"""
+        if self._pending.get(key) is not task:
+            return
+        del self._pending[key]
+        if not task.done():
+            task.cancel()
+        elif not task.cancelled() and task.result() and os.path.exists(task.result()):
+            os.remove(task.result())
+
+early_thumbnails = EarlyThumbnails()
@@ -8,10 +8,11 @@ from pyrogram.errors import FloodWait, UserNotParticipant, ChatAdminRequired, Ch
 from pyrogram.types import Message
 from .. import userbot, Bot
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
-from config import FORCESUB ,AUTH, LOG_GROUP, ADMIN_ONLY
+from config import FORCESUB ,AUTH, LOG_GROUP, ADMIN_ONLY, CLONE_WORKERS
 from main.plugins.pyroplug import get_msg, is_bot_url
 from main.plugins.helpers import get_link, join, screenshot
 from main.plugins.db import db
+from main.plugins.jobqueue import job_queue, job_priority
 
 log_file = "bot_logs.txt"
 logging.basicConfig(
@@ -39,13 +40,14 @@ message = "Send me the message link you want to start saving from, as a reply to
 
 process = []
 timer = {}
-user = []
 
 def is_admin(user_id: int) -> bool:
     return user_id in AUTH
 
-def is_auth(user_id: int) -> bool:
-    return user_id in AUTH or db.is_user_authorized(user_id)
+async def is_auth(user_id: int, ctx=None) -> bool:
+    if ctx is not None:
+        return user_id in AUTH or ctx.is_authorized
+    return user_id in AUTH or await db.is_user_authorized(user_id)
 
 async def force_sub(client: Client, channel_list, user_id: int) -> tuple:
     # Convert single string to list for consistent handling
@@ -143,13 +145,13 @@ async def log_action(action: str, user_id: int = None, admin_id: int = None,
     except Exception as e:
         logger.error(f"Failed to log action: {e}")
 
-def check_cooldown(user_id: int) -> tuple:
-    if user_id in AUTH or db.is_user_authorized(user_id):
+async def check_cooldown(user_id: int, ctx=None) -> tuple:
+    if await is_auth(user_id, ctx):
         return False, 0
     
     current_time = time.time()
     if user_id in timer:
-        premium_level = db.get_user_level(user_id)
+        premium_level = ctx.premium_level if ctx else await db.get_user_level(user_id)
         cooldown_time = COOLDOWN_TIMES.get(premium_level, COOLDOWN_TIMES[None])
         time_passed = current_time - timer[user_id]
         if time_passed < cooldown_time:
@@ -187,11 +189,13 @@ async def clone(client: Client, message: Message):
     user_id = message.from_user.id
     user_info = message.from_user
     
-    if db.is_user_in_batch(user_id):
+    # One query for user, ban and mute state; passed down the whole pipeline
+    ctx = await db.get_user_context(user_id)
+    if ctx.in_batch:
         return
     
     try:
-        db.add_user(
+        await db.add_user(
             user_id=user_info.id,
             username=user_info.username,
             first_name=user_info.first_name,
@@ -200,23 +204,20 @@ async def clone(client: Client, message: Message):
     except Exception as e:
         logger.error(f"Error adding user to DB: {e}")
 
-    is_banned, ban_reason = db.is_user_banned(user_id)
-    if is_banned:
-        await message.reply(f"You are banned. Reason: {ban_reason or 'No reason provided'}")
+    if ctx.is_banned:
+        await message.reply(f"You are banned. Reason: {ctx.ban_reason or 'No reason provided'}")
         return
 
-    is_muted, mute_reason, _ = db.is_user_muted(user_id)
-    if is_muted:
-        mute_time = db.get_mute_time_formatted(user_id)
-        mute_text = f"🔇 Muted for {mute_time} remaining"
-        if mute_reason:
-            mute_text += f". Reason: {mute_reason}"
+    if ctx.is_muted:
+        mute_text = f"🔇 Muted for {ctx.mute_time_formatted} remaining"
+        if ctx.mute_reason:
+            mute_text += f". Reason: {ctx.mute_reason}"
         await message.reply(mute_text)
         return
 
-    in_cooldown, remaining = check_cooldown(user_id)
+    in_cooldown, remaining = await check_cooldown(user_id, ctx)
     if in_cooldown:
-        level = db.get_user_level(user_id)
+        level = ctx.premium_level
         level_info = f"Premium Level {level}" if level else "Free User"
         await message.reply(f"Please try again after {int(remaining)}s. ({level_info})")
         return
@@ -231,13 +232,14 @@ async def clone(client: Client, message: Message):
         )
 
     links = message.text.split("\n")
-    max_links = 10 if is_auth(user_id) else 1
+    max_links = 10 if await is_auth(user_id, ctx) else 1
     
     if len(links) > max_links:
-        msg = "Max 10 links" if is_auth(user_id) else "Unauthorized: 1 link max"
+        msg = "Max 10 links" if await is_auth(user_id, ctx) else "Unauthorized: 1 link max"
         await message.reply(msg)
         return
 
+    clone_links = []
     for link in links:
         link = link.strip()
         if not link:
@@ -267,40 +269,60 @@ async def clone(client: Client, message: Message):
              )
           return
 
-        if str(user_id) in user:
-            await message.reply("You already have an active process. Please wait and try again after ongoing process is completed.")
-            return
-
-        user.append(str(user_id))
-        edit = await message.reply("Processing your request...")
+        if 't.me/+' in clean_link or 'addlist' in clean_link:
+            edit = await message.reply("Processing your request...")
+            try:
+                await edit.edit(await join(userbot, clean_link))
+            except Exception as e:
+                logger.error(f"Join error: {e}")
+                await edit.edit(f"Error joining {clean_link}\n\n{e}")
+            continue
         
-        try:
-            if 't.me/+' in clean_link or 'addlist' in clean_link:
-                join_result = await join(userbot, clean_link)
-                await edit.edit(join_result)
-                user.remove(str(user_id))
-                return
+        clone_links.append(clean_link)
+
+    if not clone_links:
+        return
 
-            file_name = None
-            if '|' in link:
-                parts = link.split('|')
-                if len(parts) == 2:
-                    file_name = parts[1].strip()
+    if job_queue.has_job(user_id, "clone"):
+        await message.reply("You already have an active process. Please wait and try again after ongoing process is completed.")
+        return
+
+    # Cloning runs on the scheduler's workers, not inside this handler
+    job = await job_queue.submit(
+        "clone", user_id,
+        {"links": clone_links, "reply_to": message.id},
+        job_priority(user_id, ctx)
+    )
+    ahead = job_queue.queued_ahead(job) if job else 0
+    if ahead:
+        await message.reply(f"⏳ Queued, {ahead} request{'s' if ahead != 1 else ''} ahead of yours.")
 
-            await get_msg(userbot, Bot, user_id, edit.id, clean_link, 0)
+async def delete_later(msg, delay):
+    await asyncio.sleep(delay)
+    try:
+        await msg.delete()
+    except:
+        pass
 
+async def run_clone_job(job):
+    """Scheduler handler for "clone" jobs: clone each link the user sent"""
+    user_id = job["user_id"]
+    ctx = await db.get_user_context(user_id)
+    for link in job["payload"]["links"]:
+        if job["cancelled"]:
+            break
+        edit = await Bot.send_message(user_id, "Processing your request...", reply_to_message_id=job["payload"]["reply_to"])
+        try:
+            await get_msg(userbot, Bot, user_id, edit.id, link, 0, ctx)
         except FloodWait as fw:
             await Bot.send_message(user_id, f'FloodWait: Try after {fw.value}s')
             await log_action("FloodWait Error", user_id=user_id, error=f"{fw.value}s")
         except Exception as e:
             logger.error(f"Clone error: {e}")
-            await Bot.send_message(user_id, f"Error cloning {clean_link}\n\n{e}")
+            await Bot.send_message(user_id, f"Error cloning {link}\n\n{e}")
             await log_action("Clone Error", user_id=user_id, error=str(e))
         finally:
-            if str(user_id) in user:
-                user.remove(str(user_id))
-            await asyncio.sleep(30)  # Keep message visible for 30 seconds
-            try:
-                await edit.delete()
-            except:
-                pass
+            # Keep message visible for 30 seconds without holding the worker
+            asyncio.get_running_loop().create_task(delete_later(edit, 30))
+
+job_queue.register("clone", run_clone_job, workers=CLONE_WORKERS)
@@ -2,12 +2,16 @@ from pyrogram.errors import FloodWait, InviteHashInvalid, InviteHashExpired, Use
 from pyrogram import errors
 from pyrogram.raw import functions, types
 from main.plugins.db import db
+from main.plugins.jobqueue import job_priority
+from main.plugins.mediapool import media_pool
+from main.plugins.probe import video_prober
+from main.plugins.thumbcache import screenshot_cache
+from main.plugins.watermark import watermark_overlays
 
-import asyncio, subprocess, re, os, time
+import asyncio, subprocess, re, os, time, io, tempfile
 from pathlib import Path
 from datetime import datetime as dt
 import math
-import cv2
 
 import logging
 
@@ -24,15 +28,60 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 logging.getLogger("pyrogram").setLevel(logging.INFO)
 
+class FileSlice(io.RawIOBase):
+    """Read-only view of `length` bytes of a file starting at `offset`.
+
+    Pyrogram uploads any seekable file object, so a slice can be passed to
+    send_document as if it were a standalone part file, without copying it.
+    """
+
+    def __init__(self, path, offset, length, name):
+        self._file = open(path, "rb")
+        self._offset = offset
+        self._length = length
+        self._pos = 0
+        self.name = name
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            pos += self._pos
+        elif whence == io.SEEK_END:
+            pos += self._length
+        self._pos = min(max(pos, 0), self._length)
+        return self._pos
+
+    def read(self, size=-1):
+        remaining = self._length - self._pos
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        if size <= 0:
+            return b""
+        self._file.seek(self._offset + self._pos)
+        data = self._file.read(size)
+        self._pos += len(data)
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self._file.close()
+        super().close()
+
 #to get width, height and duration(in sec) of a video
-def video_metadata(file):
-    vcap = cv2.VideoCapture(f'{file}')
-    width = round(vcap.get(cv2.CAP_PROP_FRAME_WIDTH ))
-    height = round(vcap.get(cv2.CAP_PROP_FRAME_HEIGHT ))
-    fps = vcap.get(cv2.CAP_PROP_FPS)
-    frame_count = vcap.get(cv2.CAP_PROP_FRAME_COUNT)
-    duration = round(frame_count / fps)
-    return {'width' : width, 'height' : height, 'duration' : duration }
+async def video_metadata(file, priority=0):
+    return await video_prober.probe(file, priority)
 
 #Join private chat-------------------------------------------------------------------------------------------------------------
 
@@ -172,28 +221,34 @@ def get_link(string):
     
 #Screenshot---------------------------------------------------------------------------------------------------------------
 
+# Screenshots are written here, each under a name of its own
+SCREENSHOT_DIR = "downloads"
+
 def hhmmss(seconds):
     return time.strftime('%H:%M:%S',time.gmtime(seconds))
 
-async def screenshot(video, duration, sender):
-    """Generate a thumbnail from a video with optional watermark"""
+async def screenshot(video, duration, sender, ctx=None, media_id=None, watermark_text=None):
+    """Generate a thumbnail from a video with optional watermark.
+
+    With `media_id` (the source's file_unique_id) the result is cached and a
+    later call for the same media and watermark skips ffmpeg. Pass
+    `watermark_text` when the caller already has it ("" for none).
+    """
     time_stamp = hhmmss(int(duration)/2)
-    out = dt.now().isoformat("_", "seconds") + ".jpg"
-    watermark_text = db.get_watermark_text(sender)
+    # A unique file per call: concurrent screenshots must never share a path,
+    # or one video's frame could be cached under another's key
+    os.makedirs(SCREENSHOT_DIR, exist_ok=True)
+    fd, out = tempfile.mkstemp(suffix=".jpg", dir=SCREENSHOT_DIR)
+    os.close(fd)
+    if watermark_text is None:
+        watermark_text = ctx.watermark_text if ctx else await db.get_watermark_text(sender)
     
-    if watermark_text:
-        # Escape single quotes for ffmpeg
-        watermark_text_escaped = watermark_text.replace("'", "'\\''")
-        cmd = [
-            "ffmpeg",
-            "-ss", time_stamp,
-            "-i", video,
-            "-vf", f"drawtext=text='{watermark_text_escaped}':fontcolor=0xD2691E:fontsize=90:x=(w-text_w)/2:y=h-text_h-50:font=Arial Bold",
-            "-frames:v", "1",
-            out,
-            "-y"
-        ]
-    else:
+    if screenshot_cache.get(media_id, watermark_text, out):
+        return out
+    
+    # ffmpeg only grabs the plain frame, which is cached on its own so other
+    # watermarks of the same video skip ffmpeg too
+    if not screenshot_cache.get(media_id, "", out):
         cmd = [
             "ffmpeg",
             "-ss", time_stamp,
@@ -202,16 +257,17 @@ async def screenshot(video, duration, sender):
             out,
             "-y"
         ]
+        returncode = await media_pool.run(cmd, job_priority(sender, ctx))
+        if returncode != 0 or not os.path.getsize(out):
+            os.remove(out)
+            return None
+        screenshot_cache.put(media_id, "", out)
     
-    process = await asyncio.create_subprocess_exec(
-        *cmd,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE
-    )
-    stdout, stderr = await process.communicate()
-    x = stderr.decode().strip()
-    y = stdout.decode().strip()
-    if os.path.isfile(out):
-        return out
-    else:
-        return None
+    if watermark_text:
+        try:
+            await watermark_overlays.apply(out, sender, watermark_text)
+        except Exception as e:
+            logger.error(f"Error drawing watermark: {e}")
+            return out
+        screenshot_cache.put(media_id, watermark_text, out)
+    return out
@@ -0,0 +1,109 @@
+import os
+import asyncio
+import logging
+from collections import OrderedDict
+
+import aiohttp
+
+from config import HTTP_CONNECTIONS, HTTP_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# Bodies kept for conditional GET revalidation, least-recently-used past this
+HTTP_CACHE_BYTES = 16 * 1024 * 1024
+# Larger responses are returned but never kept
+HTTP_CACHE_MAX_ITEM = 5 * 1024 * 1024
+
+class HttpClient:
+    """Shared aiohttp session for every outbound HTTP call the bot makes.
+
+    One connection pool (HTTP_CONNECTIONS sockets, reused across requests),
+    a total timeout per request so a slow host can't hang a handler, and
+    conditional GET: bodies that came with an ETag or Last-Modified are
+    kept, revalidated with If-None-Match/If-Modified-Since and served from
+    memory on 304.
+    """
+
+    def __init__(self, connections=HTTP_CONNECTIONS, timeout=HTTP_TIMEOUT):
+        self.connections = connections
+        self.timeout = timeout
+        self._session = None
+        self._lock = asyncio.Lock()
+        self._cache = OrderedDict()
+        self._cache_size = 0
+        self.revalidated = 0
+
+    async def session(self):
+        if self._session is None or self._session.closed:
+            async with self._lock:
+                if self._session is None or self._session.closed:
+                    self._session = aiohttp.ClientSession(
+                        connector=aiohttp.TCPConnector(limit=self.connections, ttl_dns_cache=300),
+                        timeout=aiohttp.ClientTimeout(total=self.timeout, connect=min(10, self.timeout))
+                    )
+        return self._session
+
+    def _store(self, url, validators, body):
+        old = self._cache.pop(url, None)
+        if old is not None:
+            self._cache_size -= len(old[1])
+        if not validators or len(body) > HTTP_CACHE_MAX_ITEM:
+            return
+        self._cache[url] = (validators, body)
+        self._cache_size += len(body)
+        while self._cache_size > HTTP_CACHE_BYTES:
+            _, (_, evicted) = self._cache.popitem(last=False)
+            self._cache_size -= len(evicted)
+
+    async def get_bytes(self, url):
+        """Body of a GET, or None on a non-200 status or network error"""
+        headers = {}
+        cached = self._cache.get(url)
+        if cached:
+            validators = cached[0]
+            if "etag" in validators:
+                headers["If-None-Match"] = validators["etag"]
+            if "last_modified" in validators:
+                headers["If-Modified-Since"] = validators["last_modified"]
+        try:
+            session = await self.session()
+            async with session.get(url, headers=headers) as response:
+                if response.status == 304 and cached:
+                    self._cache.move_to_end(url)
+                    self.revalidated += 1
+                    return cached[1]
+                if response.status != 200:
+                    logger.error(f"GET {url} returned {response.status}")
+                    return None
+                body = await response.read()
+                validators = {}
+                if response.headers.get("ETag"):
+                    validators["etag"] = response.headers["ETag"]
+                if response.headers.get("Last-Modified"):
+                    validators["last_modified"] = response.headers["Last-Modified"]
+                self._store(url, validators, body)
+                return body
+        except Exception as e:
+            logger.error(f"GET {url} failed: {e}")
+            return None
+
+    async def post_json(self, url, fields, files=None):
+        """POST a multipart form and return the decoded JSON reply.
+
+        `files` maps form field names to local paths uploaded as file parts.
+        """
+        form = aiohttp.FormData()
+        for name, value in fields.items():
+            form.add_field(name, str(value))
+        for name, path in (files or {}).items():
+            with open(path, "rb") as f:
+                form.add_field(name, f.read(), filename=os.path.basename(path))
+        session = await self.session()
+        async with session.post(url, data=form) as response:
+            return await response.json(content_type=None)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+http_client = HttpClient()
@@ -0,0 +1,226 @@
+import asyncio
+import heapq
+import itertools
+import time
+import logging
+
+from main.plugins.db import db
+
+from config import AUTH, QUEUE_WORKERS, DOWNLOAD_SLOTS, UPLOAD_SLOTS
+
+logger = logging.getLogger(__name__)
+
+# Admins are scheduled ahead of every premium level
+ADMIN_PRIORITY = 100
+# Weight of the newest sample in the moving-average queue wait
+WAIT_SMOOTHING = 0.2
+
+# Global caps on the heavy stages, shared by every job and batch worker:
+# `async with stage("download"): ...` (ffmpeg runs through mediapool)
+stage_slots = {
+    "download": asyncio.Semaphore(DOWNLOAD_SLOTS),
+    "upload": asyncio.Semaphore(UPLOAD_SLOTS)
+}
+
+def stage(name):
+    return stage_slots[name]
+
+def job_priority(user_id, ctx=None):
+    """Scheduling priority of a user's jobs: admins, then premium level"""
+    if user_id in AUTH:
+        return ADMIN_PRIORITY
+    return ctx.premium_level if ctx else 0
+
+class JobQueue:
+    """Priority queue of user jobs, run by a fixed pool of worker coroutines.
+
+    A job is a dict with kind, user_id, priority and a payload of plain values
+    (links, message IDs) that a handler registered for its kind turns back into
+    work. Higher priority runs first, FIFO within a priority, and each kind can
+    be capped at `limit` running jobs so long batches can't take every worker.
+    A kind registered with its own `workers` gets a lane of dedicated workers
+    that only serve it, so quick jobs never wait behind long ones.
+    A user holds at most one job per kind. Jobs are mirrored to the job_queue
+    collection so queued ones survive a restart; when Mongo is unavailable a
+    job simply lives in memory only.
+    """
+
+    def __init__(self, workers=QUEUE_WORKERS):
+        self.workers = workers
+        self._handlers = {}
+        self._lanes = {}
+        self._queues = {}
+        self._running = {}
+        self._active = {}
+        self._seq = itertools.count()
+        self._changed = asyncio.Condition()
+        self._tasks = []
+        self._wait_avg = 0
+        self._dispatched = 0
+
+    def register(self, kind, handler, limit=None, rerun=True, workers=None):
+        """Run jobs of `kind` with `await handler(job)`.
+
+        `rerun=False` drops jobs of this kind that were already running when
+        the previous process stopped, for handlers that recover on their own.
+        `workers` gives the kind its own lane of that many workers instead of
+        the shared pool.
+        """
+        self._handlers[kind] = (handler, limit, rerun)
+        if workers:
+            self._lanes[kind] = workers
+
+    def has_job(self, user_id, kind):
+        """Whether the user has a job of this kind queued or running"""
+        return (user_id, kind) in self._active
+
+    async def submit(self, kind, user_id, payload, priority=0):
+        """Queue a job; returns it, or None if the user already has one of this kind"""
+        if self.has_job(user_id, kind):
+            return None
+        job = {
+            "_id": None,
+            "kind": kind,
+            "user_id": user_id,
+            "priority": priority,
+            "payload": payload,
+            "started": False,
+            "cancelled": False
+        }
+        # Hold the user's slot while the job is saved, so a second submit
+        # arriving during the insert is refused instead of queued twice
+        self._active[(user_id, kind)] = job
+        try:
+            job["_id"] = await db.save_queued_job(kind, user_id, priority, payload)
+        except BaseException:
+            if self._active.get((user_id, kind)) is job:
+                del self._active[(user_id, kind)]
+            raise
+        if job["cancelled"]:
+            # Cancelled while it was being saved
+            if job["_id"] is not None:
+                await db.remove_queued_job(job["_id"])
+            return None
+        await self._push(job)
+        return job
+
+    async def _push(self, job):
+        job["enqueued_at"] = time.monotonic()
+        job["started"] = False
+        job["cancelled"] = False
+        heapq.heappush(self._queues.setdefault(job["kind"], []), (-job["priority"], next(self._seq), job))
+        self._active[(job["user_id"], job["kind"])] = job
+        self._start_workers()
+        # Every lane waits on the same condition, so wake them all
+        async with self._changed:
+            self._changed.notify_all()
+
+    def queued_ahead(self, job):
+        """Jobs of the same kind that will start before this one"""
+        key = (-job["priority"], job["enqueued_at"])
+        return sum(
+            1 for priority, _, other in self._queues.get(job["kind"], [])
+            if not other["cancelled"] and (priority, other["enqueued_at"]) < key
+        )
+
+    async def cancel(self, user_id, kind):
+        """Cancel the user's job of this kind.
+
+        A queued job is dropped and returned; a running one is only flagged
+        (handlers check `job["cancelled"]`), and None is returned.
+        """
+        job = self._active.pop((user_id, kind), None)
+        if job is None:
+            return None
+        job["cancelled"] = True
+        if job["started"]:
+            return None
+        if job["_id"] is not None:
+            await db.remove_queued_job(job["_id"])
+        return job
+
+    def _start_workers(self):
+        if not self._tasks:
+            loop = asyncio.get_running_loop()
+            self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+            for kind, workers in self._lanes.items():
+                self._tasks += [loop.create_task(self._worker(kind)) for _ in range(workers)]
+
+    def _pop_ready(self, lane=None):
+        """Take the best queued job whose kind is under its running limit,
+        from `lane`'s kind, or from the kinds without a lane"""
+        best = None
+        for kind, queue in self._queues.items():
+            if (lane is None and kind in self._lanes) or (lane is not None and kind != lane):
+                continue
+            while queue and queue[0][2]["cancelled"]:
+                heapq.heappop(queue)
+            limit = self._handlers.get(kind, (None, None, True))[1]
+            if not queue or (limit is not None and self._running.get(kind, 0) >= limit):
+                continue
+            if best is None or queue[0][:2] < self._queues[best][0][:2]:
+                best = kind
+        if best is None:
+            return None
+        return heapq.heappop(self._queues[best])[2]
+
+    async def _next(self, lane=None):
+        async with self._changed:
+            while True:
+                job = self._pop_ready(lane)
+                if job is not None:
+                    return job
+                await self._changed.wait()
+
+    async def _worker(self, lane=None):
+        while True:
+            job = await self._next(lane)
+            kind = job["kind"]
+            job["started"] = True
+            self._running[kind] = self._running.get(kind, 0) + 1
+            wait = time.monotonic() - job["enqueued_at"]
+            self._wait_avg = wait if not self._dispatched else WAIT_SMOOTHING * wait + (1 - WAIT_SMOOTHING) * self._wait_avg
+            self._dispatched += 1
+            try:
+                if job["_id"] is not None:
+                    await db.set_queued_job_status(job["_id"], "running")
+                handler = self._handlers[kind][0]
+                await handler(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"{kind} job of user {job['user_id']} failed: {e}")
+            finally:
+                self._running[kind] -= 1
+                if self._active.get((job["user_id"], kind)) is job:
+                    del self._active[(job["user_id"], kind)]
+            if job["_id"] is not None:
+                await db.remove_queued_job(job["_id"])
+            async with self._changed:
+                self._changed.notify_all()
+
+    async def recover(self):
+        """Queue again the jobs the previous process left in the job_queue collection"""
+        for doc in await db.get_queued_jobs():
+            handler = self._handlers.get(doc["kind"])
+            if handler is None or (doc["status"] == "running" and not handler[2]) or self.has_job(doc["user_id"], doc["kind"]):
+                await db.remove_queued_job(doc["_id"])
+                continue
+            await self._push({
+                "_id": doc["_id"],
+                "kind": doc["kind"],
+                "user_id": doc["user_id"],
+                "priority": doc["priority"],
+                "payload": doc["payload"]
+            })
+            logger.info(f"Recovered {doc['kind']} job of user {doc['user_id']}")
+
+    def stats(self):
+        """Queue depth, running jobs per kind and the average wait, for /stats"""
+        return {
+            "queued": {kind: sum(1 for entry in queue if not entry[2]["cancelled"]) for kind, queue in self._queues.items()},
+            "running": dict(self._running),
+            "avg_wait": round(self._wait_avg, 1)
+        }
+
+job_queue = JobQueue()
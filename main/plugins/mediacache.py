@@ -0,0 +1,134 @@
+import time
+import logging
+from collections import OrderedDict
+
+from pyrogram.enums import ParseMode
+from pyrogram.errors import FileReferenceEmpty, FileReferenceExpired, FileReferenceInvalid, FileIdInvalid, MediaEmpty, MediaInvalid
+
+from main.plugins.db import db
+from main.plugins.ratelimit import limiter
+
+logger = logging.getLogger(__name__)
+
+# Lookups are memoised in process: uploads are kept until evicted
+# least-recently-used past MEDIA_CACHE_SIZE, misses for MEDIA_MISS_TTL seconds
+MEDIA_CACHE_SIZE = 5000
+MEDIA_MISS_TTL = 300
+
+# Media kinds the cache can re-send, in the order a message is checked
+MEDIA_KINDS = ("video", "document", "audio", "photo", "voice")
+SEND_METHODS = {
+    "video": "send_video",
+    "document": "send_document",
+    "audio": "send_audio",
+    "photo": "send_photo",
+    "voice": "send_voice"
+}
+# Errors that mean the cached file_id itself is no longer usable; anything
+# else (flood waits, network, the target chat) leaves the entry alone
+STALE_MEDIA_ERRORS = (FileReferenceEmpty, FileReferenceExpired, FileReferenceInvalid, FileIdInvalid, MediaEmpty, MediaInvalid)
+
+def message_media(msg):
+    """(kind, media) of the first cacheable media on a message, or (None, None)"""
+    for kind in MEDIA_KINDS:
+        media = getattr(msg, kind, None) if msg else None
+        if media is not None:
+            return kind, media
+    return None, None
+
+class MediaCache:
+    """Index from source media to the Bot's own upload of it, shared by all users.
+
+    Entries are keyed by the source's file_unique_id and size plus the user
+    settings that change what gets uploaded (custom thumbnail, watermark), so
+    a hit can be re-sent by file_id and look exactly like a fresh upload.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(msg, ctx):
+        kind, media = message_media(msg)
+        if media is None or ctx is None or not getattr(media, 'file_unique_id', None):
+            return None
+        # Photos and voice notes are sent without a thumbnail
+        variant = "" if kind in ("photo", "voice") else f"{ctx.thumbnail or ''}|{ctx.thumbnail_enabled}|{ctx.watermark_text or ''}"
+        return (media.file_unique_id, getattr(media, 'file_size', 0) or 0, variant)
+
+    def _memo(self, key, doc):
+        expires = float("inf") if doc else time.monotonic() + MEDIA_MISS_TTL
+        self._entries[key] = (expires, doc)
+        self._entries.move_to_end(key)
+        while len(self._entries) > MEDIA_CACHE_SIZE:
+            self._entries.popitem(last=False)
+
+    async def lookup(self, msg, ctx):
+        """The cached upload of a message's media, or None"""
+        key = self._key(msg, ctx)
+        if key is None:
+            return None
+        cached = self._entries.get(key)
+        if cached and cached[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            return cached[1]
+        doc = await db.get_cached_media(*key)
+        self._memo(key, doc)
+        return doc
+
+    async def send(self, client, msg, target_chat_id, caption, topic_id, ctx):
+        """Send a message's media by the Bot's cached file_id, skipping download
+        and upload. Returns the sent message, or None on a miss."""
+        key = self._key(msg, ctx)
+        if key is None:
+            return None
+        doc = await self.lookup(msg, ctx)
+        if not doc:
+            self.misses += 1
+            return None
+        try:
+            result = await limiter.call(
+                getattr(client, SEND_METHODS[doc["kind"]]),
+                target_chat_id,
+                doc["file_id"],
+                caption=caption,
+                parse_mode=ParseMode.MARKDOWN,
+                reply_to_message_id=topic_id
+            )
+        except STALE_MEDIA_ERRORS as e:
+            # A file_id the Bot can no longer use is dropped, the caller uploads again
+            logger.warning(f"Cached file_id for {key[0]} is stale, removing it: {e}")
+            self._entries.pop(key, None)
+            await db.remove_cached_media(*key)
+            self.misses += 1
+            return None
+        except Exception as e:
+            # The entry is fine; let the caller upload this once
+            logger.warning(f"Sending cached file_id for {key[0]} failed: {e}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    async def remember(self, msg, sent, ctx):
+        """Record the Bot's upload `sent` of the media on source message `msg`"""
+        key = self._key(msg, ctx)
+        kind, media = message_media(sent)
+        if key is None or media is None:
+            return
+        doc = {"kind": kind, "file_id": media.file_id}
+        self._memo(key, doc)
+        await db.cache_media(*key, kind, media.file_id)
+
+    def stats(self):
+        """Hits, lookups and hit rate since start, for /stats"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "lookups": lookups,
+            "hit_rate": round(self.hits * 100 / lookups, 1) if lookups else 0
+        }
+
+media_cache = MediaCache()
@@ -0,0 +1,99 @@
+import asyncio
+import heapq
+import itertools
+import logging
+
+from config import FFMPEG_SLOTS, FFMPEG_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+class MediaPool:
+    """Bounded pool for ffmpeg/ffprobe style subprocesses.
+
+    At most `slots` processes run at once; callers beyond that wait in a
+    priority queue (higher first, FIFO within a priority). Every process
+    gets a wall-clock timeout after which it is killed, and stderr is
+    discarded instead of buffered, so a burst of finished uploads queues up
+    thumbnail work rather than starting a decoder each.
+    """
+
+    def __init__(self, slots=FFMPEG_SLOTS, timeout=FFMPEG_TIMEOUT):
+        self.slots = slots
+        self.timeout = timeout
+        self._running = 0
+        self._waiters = []
+        self._seq = itertools.count()
+        self.completed = 0
+        self.timeouts = 0
+
+    async def _acquire(self, priority):
+        if self._running < self.slots and not self._waiters:
+            self._running += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (-priority, next(self._seq), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before the cancel
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+
+    def _release(self):
+        # Hand the slot straight to the best waiter still waiting
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._running -= 1
+
+    async def _exec(self, cmd, priority, timeout, capture):
+        await self._acquire(priority)
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE if capture else asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+            try:
+                if capture:
+                    stdout, _ = await asyncio.wait_for(process.communicate(), timeout or self.timeout)
+                else:
+                    stdout = None
+                    await asyncio.wait_for(process.wait(), timeout or self.timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                process.kill()
+                await process.wait()
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                self.timeouts += 1
+                logger.warning(f"{cmd[0]} killed after {timeout or self.timeout}s")
+                return None, None
+            self.completed += 1
+            return process.returncode, stdout
+        finally:
+            self._release()
+
+    async def run(self, cmd, priority=0, timeout=None):
+        """Run `cmd` in a pool slot; returns its exit code, or None if it timed out"""
+        returncode, _ = await self._exec(cmd, priority, timeout, capture=False)
+        return returncode
+
+    async def output(self, cmd, priority=0, timeout=None):
+        """Run `cmd` in a pool slot; returns its stdout, or None if it failed or timed out"""
+        returncode, stdout = await self._exec(cmd, priority, timeout, capture=True)
+        return stdout if returncode == 0 else None
+
+    def stats(self):
+        """Running and queued processes, completions and timeouts, for /stats"""
+        return {
+            "running": self._running,
+            "queued": sum(1 for _, _, future in self._waiters if not future.done()),
+            "completed": self.completed,
+            "timeouts": self.timeouts
+        }
+
+media_pool = MediaPool()
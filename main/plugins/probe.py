@@ -0,0 +1,89 @@
+import os
+import json
+import logging
+from collections import OrderedDict
+
+from main.plugins.mediapool import media_pool
+
+logger = logging.getLogger(__name__)
+
+# Probe results kept per file, least-recently-used past this
+PROBE_CACHE_SIZE = 256
+# Container headers are small; a probe that takes longer than this is stuck
+PROBE_TIMEOUT = 20
+
+PROBE_CMD = [
+    "ffprobe", "-v", "error",
+    "-select_streams", "v:0",
+    "-show_entries", "stream=width,height,duration,avg_frame_rate,nb_frames:format=duration",
+    "-of", "json"
+]
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0
+
+def _frame_rate(value):
+    """ffprobe rates come as "num/den"; 0 when unknown"""
+    num, _, den = str(value or "").partition("/")
+    num, den = _number(num), _number(den or 1)
+    return num / den if den else 0
+
+def parse_probe(data):
+    """width/height/duration (seconds) from ffprobe JSON, zeros where unknown"""
+    stream = (data.get("streams") or [{}])[0]
+    duration = _number(stream.get("duration")) or _number(data.get("format", {}).get("duration"))
+    if not duration:
+        fps = _frame_rate(stream.get("avg_frame_rate"))
+        if fps:
+            duration = _number(stream.get("nb_frames")) / fps
+    return {
+        'width': int(stream.get("width") or 0),
+        'height': int(stream.get("height") or 0),
+        'duration': round(duration)
+    }
+
+class VideoProber:
+    """Reads video dimensions and duration from container headers with ffprobe.
+
+    ffprobe runs in the media pool, so probing never blocks the event loop,
+    and results are cached per (path, inode, size, mtime) so the same file is
+    only probed once however many times it is uploaded.
+    """
+
+    def __init__(self, size=PROBE_CACHE_SIZE):
+        self.size = size
+        self._cache = OrderedDict()
+
+    @staticmethod
+    def _key(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (os.path.abspath(path), st.st_ino, st.st_size, st.st_mtime_ns)
+
+    async def probe(self, path, priority=0):
+        key = self._key(path)
+        if key is not None and key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        # Failures aren't cached, the next upload of the file probes again
+        try:
+            stdout = await media_pool.output(PROBE_CMD + [str(path)], priority, PROBE_TIMEOUT)
+            if not stdout:
+                logger.error(f"Could not probe {path}")
+                return {'width': 0, 'height': 0, 'duration': 0}
+            metadata = parse_probe(json.loads(stdout))
+        except Exception as e:
+            logger.error(f"Error probing {path}: {e}")
+            return {'width': 0, 'height': 0, 'duration': 0}
+        if key is not None:
+            self._cache[key] = metadata
+            while len(self._cache) > self.size:
+                self._cache.popitem(last=False)
+        return metadata
+
+video_prober = VideoProber()
@@ -1,83 +1,209 @@
+import asyncio
+import logging
 import math
-import os
 import time
-import json
+import weakref
 from main.plugins.helpers import TimeFormatter, humanbytes
+from main.plugins.ratelimit import limiter
+
+logger = logging.getLogger(__name__)
 
 # Enhanced progress indicators with gradient-like appearance
 FINISHED_PROGRESS_STR = "🟢"  # Green circle for completed portions
 UN_FINISHED_PROGRESS_STR = "◯"  # White circle for incomplete portions
-DOWNLOAD_LOCATION = "/app"
-
-
-async def progress_for_pyrogram(
-    current,
-    total,
-    bot,
-    ud_type,
-    message,
-    start
-):
-    now = time.time()
-    diff = now - start
-    if round(diff % 10.00) == 0 or current == total:
-        percentage = current * 100 / total
-        status = f"{DOWNLOAD_LOCATION}/status.json"
-        if os.path.exists(status):
-            with open(status, 'r+') as f:
-                statusMsg = json.load(f)
-                if not statusMsg["running"]:
-                    bot.stop_transmission()
-        speed = current / diff
-        elapsed_time = round(diff) * 1
-        time_to_completion = round((total - current) / speed) * 1
-        estimated_total_time = elapsed_time + time_to_completion
-
-        elapsed_time = TimeFormatter(milliseconds=elapsed_time)
-        estimated_total_time = TimeFormatter(milliseconds=estimated_total_time)
-
-        # Calculate percentage for display
-        percent_str = f"{percentage:.1f}%"
-        
-        # Beautiful progress header with decorative elements
-        progress = "━━━━━━━━━━━━━━━━━━━━━━━\n"
-        progress += f"**✨ 𝐏𝐫𝐨𝐠𝐫𝐞𝐬𝐬 𝐒𝐭𝐚𝐭𝐮𝐬 ✨** `{percent_str}`\n\n"
-        
-        # Enhanced progress bar
-        progress += "**「{0}{1}」**\n".format(
-            ''.join(                
-                    FINISHED_PROGRESS_STR
-                    for _ in range(math.floor(percentage / 10))                
-            ),
-            ''.join(                
-                    UN_FINISHED_PROGRESS_STR
-                    for _ in range(10 - math.floor(percentage / 10))               
-            )
-        )
-        
-        # Status details with fancy formatting
-        tmp = progress + "\n"
-        tmp += "**📦 __𝐂𝐨𝐦𝐩𝐥𝐞𝐭𝐞𝐝__:** `{0}` / `{1}`\n".format(
-            humanbytes(current),
-            humanbytes(total)
-        )
-        tmp += "**🚀 __𝐒𝐩𝐞𝐞𝐝__:** `{0}/s`\n".format(
-            humanbytes(speed)
+
+# Minimum seconds between two progress states rendered for one transfer
+PROGRESS_EDIT_INTERVAL = 5
+# Weight of the newest sample in the moving-average speed
+SPEED_SMOOTHING = 0.3
+
+# Progress hub: how often pending states are flushed, the minimum gap
+# between two edits in the same chat, and the most edits sent per flush
+HUB_TICK = 0.5
+HUB_CHAT_INTERVAL = 3
+HUB_MAX_EDITS_PER_TICK = 5
+
+# Live reporters per owner (user ID), so /cancel can stop their transfers
+_active = {}
+
+
+class ProgressHub:
+    """Single writer for every progress/status message the bot keeps editing.
+
+    Transfers publish the latest text for a message and return at once.
+    Every HUB_TICK the hub sends at most one edit per chat (per
+    HUB_CHAT_INTERVAL) and HUB_MAX_EDITS_PER_TICK overall, final states
+    first. Intermediate states that were overtaken are simply dropped, so
+    status updates can't eat the flood budget that uploads need.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._chat_flushed = {}
+        self._flusher = None
+
+    def publish(self, client, chat_id, message_id, text, reply_markup=None, caption=False, final=False):
+        """Queue `text` as the next state of a message, replacing any queued one."""
+        key = (chat_id, message_id)
+        # Re-insert so a message that was just flushed goes to the back of the line
+        self._pending.pop(key, None)
+        self._pending[key] = {
+            "client": client,
+            "text": text,
+            "reply_markup": reply_markup,
+            "caption": caption,
+            "final": final
+        }
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    def discard(self, chat_id, message_id):
+        """Drop a queued state, e.g. because the message is edited or deleted directly."""
+        self._pending.pop((chat_id, message_id), None)
+
+    async def _flush_loop(self):
+        while self._pending:
+            await asyncio.sleep(HUB_TICK)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing progress edits: {e}")
+        self._chat_flushed.clear()
+
+    async def flush(self):
+        now = time.monotonic()
+        due = [
+            key for key, entry in self._pending.items()
+            if entry["final"] or now - self._chat_flushed.get(key[0], 0) >= HUB_CHAT_INTERVAL
+        ]
+        # Final states jump the queue; the sort is stable, so order holds otherwise
+        due.sort(key=lambda key: not self._pending[key]["final"])
+
+        edits = []
+        for key in due:
+            if len(edits) >= HUB_MAX_EDITS_PER_TICK:
+                break
+            if key[0] in self._chat_flushed and self._chat_flushed[key[0]] == now:
+                continue
+            self._chat_flushed[key[0]] = now
+            edits.append((key, self._pending.pop(key)))
+        await asyncio.gather(*(self._edit(key, entry) for key, entry in edits))
+
+    async def _edit(self, key, entry):
+        chat_id, message_id = key
+        client = entry["client"]
+        try:
+            if entry["caption"]:
+                await limiter.call(client.edit_message_caption, chat_id, message_id, entry["text"], reply_markup=entry["reply_markup"])
+            else:
+                await limiter.call(client.edit_message_text, chat_id, message_id, entry["text"], reply_markup=entry["reply_markup"])
+        except Exception as e:
+            logger.debug(f"Progress edit of {message_id} in {chat_id} skipped: {e}")
+
+
+progress_hub = ProgressHub()
+
+
+def render_progress(current, total, speed, eta, ud_type):
+    percentage = current * 100 / total if total else 100
+
+    # Calculate percentage for display
+    percent_str = f"{percentage:.1f}%"
+
+    # Beautiful progress header with decorative elements
+    progress = "━━━━━━━━━━━━━━━━━━━━━━━\n"
+    progress += f"**✨ 𝐏𝐫𝐨𝐠𝐫𝐞𝐬𝐬 𝐒𝐭𝐚𝐭𝐮𝐬 ✨** `{percent_str}`\n\n"
+
+    # Enhanced progress bar
+    progress += "**「{0}{1}」**\n".format(
+        ''.join(
+                FINISHED_PROGRESS_STR
+                for _ in range(math.floor(percentage / 10))
+        ),
+        ''.join(
+                UN_FINISHED_PROGRESS_STR
+                for _ in range(10 - math.floor(percentage / 10))
         )
-        tmp += "**⏳ __𝐓𝐢𝐦𝐞 𝐋𝐞𝐟𝐭__:** `{0}`\n".format(
-            estimated_total_time if estimated_total_time != '' else "0 s"
+    )
+
+    # Status details with fancy formatting
+    tmp = progress + "\n"
+    tmp += "**📦 __𝐂𝐨𝐦𝐩𝐥𝐞𝐭𝐞𝐝__:** `{0}` / `{1}`\n".format(
+        humanbytes(current),
+        humanbytes(total)
+    )
+    tmp += "**🚀 __𝐒𝐩𝐞𝐞𝐝__:** `{0}/s`\n".format(
+        humanbytes(speed)
+    )
+    tmp += "**⏳ __𝐓𝐢𝐦𝐞 𝐋𝐞𝐟𝐭__:** `{0}`\n".format(
+        TimeFormatter(milliseconds=eta) or "0 s"
+    )
+    tmp += "━━━━━━━━━━━━━━━━━━━━━━━"
+
+    # Format the message with decorative elements
+    header = f"**🔄 {ud_type.upper()} 🔄**\n"
+    return f"{header}{tmp}"
+
+
+class ProgressReporter:
+    """Progress callback for one transfer; pass its `update` as `progress=` to Pyrogram.
+
+    Pyrogram only awaits callbacks that are coroutine functions (it checks
+    with inspect.iscoroutinefunction, which is False for an object with an
+    async __call__), so the bound `update` method is what gets passed.
+    All state lives on the object: a chunk callback only updates counters
+    and returns, a new state is rendered at most once per `interval`
+    seconds (plus once at completion) and handed to the progress hub, and
+    speed/ETA come from a moving average instead of the whole-transfer mean.
+    """
+
+    def __init__(self, client, ud_type, message, owner=None, interval=PROGRESS_EDIT_INTERVAL):
+        self.client = client
+        self.ud_type = ud_type
+        self.message = message
+        self.interval = interval
+        self.cancelled = False
+        self.speed = 0
+        self._last_edit = 0
+        self._last_text = None
+        self._sample_time = time.monotonic()
+        self._sample_bytes = 0
+        if owner is not None:
+            _active.setdefault(owner, weakref.WeakSet()).add(self)
+
+    def cancel(self):
+        """Stop the transfer at its next chunk."""
+        self.cancelled = True
+
+    async def update(self, current, total, *args):
+        if self.cancelled:
+            self.client.stop_transmission()
+
+        now = time.monotonic()
+        elapsed = now - self._sample_time
+        if elapsed > 0 and current >= self._sample_bytes:
+            sample = (current - self._sample_bytes) / elapsed
+            self.speed = sample if not self.speed else SPEED_SMOOTHING * sample + (1 - SPEED_SMOOTHING) * self.speed
+            self._sample_time = now
+            self._sample_bytes = current
+
+        if current < total and now - self._last_edit < self.interval:
+            return
+        self._last_edit = now
+
+        eta = round((total - current) / self.speed) if self.speed else 0
+        text = render_progress(current, total, self.speed, eta, self.ud_type)
+        if text == self._last_text or self.message is None:
+            return
+        self._last_text = text
+        progress_hub.publish(
+            self.client, self.message.chat.id, self.message.id, text,
+            caption=bool(self.message.photo),
+            final=current >= total
         )
-        tmp += "━━━━━━━━━━━━━━━━━━━━━━━"
-        
-        try:
-            # Format the message with decorative elements
-            header = f"**🔄 {ud_type.upper()} 🔄**\n"
-            text = f"{header}{tmp}"
-            
-            if message.text != text or message.caption != text:
-                if not message.photo:
-                    await message.edit_text(text=text)
-                else:
-                    await message.edit_caption(caption=text)
-        except:
-            pass
+
+
+def cancel_transfers(owner):
+    """Flag every running transfer of `owner` as cancelled"""
+    for reporter in list(_active.pop(owner, ())):
+        reporter.cancel()
@@ -1,20 +1,23 @@
 import asyncio, time, os
-import aiofiles
-import requests
 import gc
 from pyrogram.enums import ParseMode, MessageMediaType
 from .. import Bot
-from main.plugins.progress import progress_for_pyrogram
-from main.plugins.helpers import screenshot, video_metadata
+from main.plugins.progress import ProgressReporter, progress_hub
+from main.plugins.helpers import screenshot, video_metadata, FileSlice
 from main.plugins.db import db
-from config import AUTH
-from pyrogram import Client, filters
+from main.plugins.ratelimit import limiter
+from main.plugins.chatcache import chat_cache
+from main.plugins.streaming import pipe_upload, send_streamed, send_uploaded_document, streamable_media, streamed_file_name
+from main.plugins.jobqueue import stage, job_priority
+from main.plugins.mediacache import media_cache, message_media
+from main.plugins.httpclient import http_client
+from main.plugins.earlythumb import early_thumbnails
+from config import AUTH, STREAM_MEDIA
+from pyrogram import Client, filters, StopTransmission
 from pyrogram.errors import ChannelBanned, ChannelInvalid, ChannelPrivate, ChatIdInvalid, ChatInvalid, FloodWait, PeerIdInvalid
 from urllib.parse import urlparse, parse_qs
 from pyrogram.raw import functions
 from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup, Message
-import glob
-import shutil
 import traceback
 import logging
 
@@ -31,12 +34,18 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 logging.getLogger("pyrogram").setLevel(logging.INFO)
 
-def is_auth(user_id):
+# Parts of a >2 GB file uploaded at the same time by split_and_upload_file
+SPLIT_UPLOAD_WORKERS = 3
+
+async def is_auth(user_id, ctx=None):
     try:
         if user_id in AUTH:
             return True
         
-        if db.is_user_authorized(user_id):
+        if ctx is not None:
+            return ctx.is_authorized
+        
+        if await db.is_user_authorized(user_id):
             return True
             
         return False
@@ -47,39 +56,7 @@ def is_auth(user_id):
 async def check_channel_content_protection(userbot, chat_id):
     """Check if channel has content protection (forwarding restrictions)"""
     try:
-        chat = await userbot.get_chat(chat_id)
-        
-        # Check if the chat has content protection enabled (case-insensitive)
-        if hasattr(chat, 'has_protected_content'):
-            protected_value = getattr(chat, 'has_protected_content', False)
-            if isinstance(protected_value, str):
-                protected_value = protected_value.lower()
-                if protected_value in ['true', '1', 'yes']:
-                    return True
-            elif protected_value:
-                return True
-            
-        # Check for noforwards attribute (case-insensitive)
-        if hasattr(chat, 'noforwards'):
-            noforwards_value = getattr(chat, 'noforwards', False)
-            if isinstance(noforwards_value, str):
-                noforwards_value = noforwards_value.lower()
-                if noforwards_value in ['true', '1', 'yes']:
-                    return True
-            elif noforwards_value:
-                return True
-                
-        # Check for restricted attribute (case-insensitive)  
-        if hasattr(chat, 'restricted'):
-            restricted_value = getattr(chat, 'restricted', False)
-            if isinstance(restricted_value, str):
-                restricted_value = restricted_value.lower()
-                if restricted_value in ['true', '1', 'yes']:
-                    return True
-            elif restricted_value:
-                return True
-                
-        return False
+        return (await chat_cache.get(userbot, chat_id)).is_protected
     except Exception as e:
         logger.error(f"Error checking channel protection: {e}")
         # If we can't determine, assume it's protected to be safe
@@ -99,7 +76,7 @@ async def try_forward_message(userbot, client, sender, chat_id, msg_id, target_c
     try:
         # First verify userbot can access the source chat
         try:
-            await userbot.get_chat(chat_id)
+            await chat_cache.get(userbot, chat_id)
         except (ChannelInvalid, PeerIdInvalid, ChatIdInvalid, Exception) as e:
             logger.error(f"Userbot cannot access source chat {chat_id}: {e}")
             return None
@@ -108,13 +85,13 @@ async def try_forward_message(userbot, client, sender, chat_id, msg_id, target_c
         dump_message = None
         try:
             # Add unique identifier as caption to ensure we get the right message back
-            original_msg = await userbot.get_messages(chat_id, msg_id)
+            original_msg = await limiter.call(userbot.get_messages, chat_id, msg_id)
             if not original_msg:
                 logger.error("Could not get original message")
                 return None
                 
             # Forward with unique identifier
-            dump_message = await userbot.forward_messages(DUMP_CHANNEL_ID, chat_id, msg_id)
+            dump_message = await limiter.call(userbot.forward_messages, DUMP_CHANNEL_ID, chat_id, msg_id)
             if not dump_message:
                 logger.error("Failed to forward message to dump channel")
                 return None
@@ -123,30 +100,12 @@ async def try_forward_message(userbot, client, sender, chat_id, msg_id, target_c
             dump_msg_id = dump_message.id if hasattr(dump_message, 'id') else dump_message[0].id
             
             # Add a text message with unique identifier right after the forwarded message
-            identifier_msg = await userbot.send_message(DUMP_CHANNEL_ID, f"BRIDGE_ID:{unique_id}")
+            identifier_msg = await limiter.call(userbot.send_message, DUMP_CHANNEL_ID, f"BRIDGE_ID:{unique_id}")
             identifier_msg_id = identifier_msg.id
             
         except FloodWait as e:
-            logger.warning(f"FloodWait during dump forward: {e.value} seconds")
-            if e.value < 300:  # Wait if less than 5 minutes
-                await asyncio.sleep(e.value)
-                # Retry the forward operation
-                try:
-                    original_msg = await userbot.get_messages(chat_id, msg_id)
-                    if not original_msg:
-                        return None
-                    dump_message = await userbot.forward_messages(DUMP_CHANNEL_ID, chat_id, msg_id)
-                    if not dump_message:
-                        return None
-                    dump_msg_id = dump_message.id if hasattr(dump_message, 'id') else dump_message[0].id
-                    identifier_msg = await userbot.send_message(DUMP_CHANNEL_ID, f"BRIDGE_ID:{unique_id}")
-                    identifier_msg_id = identifier_msg.id
-                except Exception as retry_e:
-                    logger.error(f"Retry after FloodWait failed: {retry_e}")
-                    return None
-            else:
-                logger.error(f"FloodWait too long ({e.value}s), skipping bridge method")
-                return None
+            logger.error(f"FloodWait too long ({e.value}s), skipping bridge method")
+            return None
         except Exception as e:
             logger.error(f"Failed to forward to dump channel: {e}")
             return None
@@ -156,66 +115,22 @@ async def try_forward_message(userbot, client, sender, chat_id, msg_id, target_c
         
         # Step 2: Main bot copies from dump channel to target chat
         try:
-            result = await client.copy_message(target_chat_id, DUMP_CHANNEL_ID, dump_msg_id, reply_to_message_id=topic_id)
+            result = await limiter.call(client.copy_message, target_chat_id, DUMP_CHANNEL_ID, dump_msg_id, reply_to_message_id=topic_id)
             if result:
-                db.increment_cloned_count(sender)
-                
-                # Step 3: Clean up - delete both messages from dump channel using main bot
-                try:
-                    await client.delete_messages(DUMP_CHANNEL_ID, [dump_msg_id, identifier_msg_id])
-                except FloodWait as cleanup_flood:
-                    logger.warning(f"FloodWait during cleanup: {cleanup_flood.value} seconds")
-                    if cleanup_flood.value < 60:  # Wait for cleanup if reasonable
-                        await asyncio.sleep(cleanup_flood.value)
-                        try:
-                            await client.delete_messages(DUMP_CHANNEL_ID, [dump_msg_id, identifier_msg_id])
-                        except Exception as cleanup_retry_error:
-                            logger.warning(f"Cleanup retry failed: {cleanup_retry_error}")
-                    else:
-                        logger.warning(f"Cleanup FloodWait too long, messages may remain in dump channel")
-                except Exception as cleanup_error:
-                    logger.warning(f"Failed to cleanup dump messages: {cleanup_error}")
-                    
+                await db.increment_cloned_count(sender)
                 return result
-                
         except FloodWait as e:
-            logger.warning(f"FloodWait during copy: {e.value} seconds")
-            if e.value < 300:  # Wait if less than 5 minutes
-                await asyncio.sleep(e.value)
-                # Retry the copy operation
-                try:
-                    result = await client.copy_message(target_chat_id, DUMP_CHANNEL_ID, dump_msg_id, reply_to_message_id=topic_id)
-                    if result:
-                        db.increment_cloned_count(sender)
-                        # Clean up after successful retry using main bot
-                        try:
-                            await client.delete_messages(DUMP_CHANNEL_ID, [dump_msg_id, identifier_msg_id])
-                        except Exception as cleanup_error:
-                            logger.warning(f"Failed to cleanup after retry: {cleanup_error}")
-                        return result
-                except Exception as retry_e:
-                    logger.error(f"Copy retry after FloodWait failed: {retry_e}")
-            else:
-                logger.error(f"Copy FloodWait too long ({e.value}s), falling back to download method")
-            
-            # Clean up even if copy failed due to FloodWait using main bot
-            try:
-                await client.delete_messages(DUMP_CHANNEL_ID, [dump_msg_id, identifier_msg_id])
-            except Exception as cleanup_error:
-                logger.warning(f"Failed to cleanup after copy FloodWait: {cleanup_error}")
-            
+            logger.error(f"Copy FloodWait too long ({e.value}s), falling back to download method")
             return None
-            
         except Exception as e:
             logger.error(f"Failed to copy from dump channel: {e}")
-            
-            # Clean up even if copy failed using main bot
+            return None
+        finally:
+            # Step 3: Clean up - delete both messages from dump channel using main bot
             try:
-                await client.delete_messages(DUMP_CHANNEL_ID, [dump_msg_id, identifier_msg_id])
+                await limiter.call(client.delete_messages, DUMP_CHANNEL_ID, [dump_msg_id, identifier_msg_id])
             except Exception as cleanup_error:
-                logger.warning(f"Failed to cleanup dump message after copy failure: {cleanup_error}")
-            
-            return None
+                logger.warning(f"Failed to cleanup dump messages: {cleanup_error}")
             
     except Exception as e:
         logger.error(f"Bridge forward failed: {e}")
@@ -226,19 +141,7 @@ async def try_forward_message(userbot, client, sender, chat_id, msg_id, target_c
 async def is_message_pinned(client, chat_id, message_id):
     """Check if a message is pinned in a chat"""
     try:
-        chat = await client.get_chat(chat_id)
-        if chat.pinned_message and chat.pinned_message.id == message_id:
-            return True
-            
-        # For some chats with multiple pinned messages
-        try:
-            message = await client.get_messages(chat_id, message_id)
-            if message and hasattr(message, 'pinned') and message.pinned:
-                return True
-        except Exception as e:
-            logger.error(f"Error checking multiple pinned messages: {e}")
-            
-        return False
+        return message_id in await chat_cache.pinned_ids(client, chat_id)
     except Exception as e:
         logger.error(f"Error checking pinned status: {e}")
         return False
@@ -247,7 +150,8 @@ async def safe_pin_message(client, chat_id, message_id):
     """Safely pin a message with error handling"""
     try:
         # Pin message without notification
-        await client.pin_chat_message(chat_id, message_id, disable_notification=True, both_sides=True)
+        await limiter.call(client.pin_chat_message, chat_id, message_id, disable_notification=True, both_sides=True)
+        chat_cache.invalidate(chat_id)
         
         # Delete service message that appears after pinning
         await asyncio.sleep(1)  # Small delay to ensure service message is created
@@ -264,13 +168,8 @@ async def safe_pin_message(client, chat_id, message_id):
                 
         return True
     except FloodWait as e:
-        if e.value < 30:
-            logger.warning(f"FloodWait detected while pinning. Waiting {e.value}s")
-            await asyncio.sleep(e.value)
-            return await safe_pin_message(client, chat_id, message_id)
-        else:
-            logger.warning(f"Long FloodWait while pinning: {e.value}s")
-            return False
+        logger.warning(f"Long FloodWait while pinning: {e.value}s")
+        return False
     except Exception as e:
         logger.error(f"Error pinning message: {e}")
         return False
@@ -313,7 +212,85 @@ async def check(userbot, client, link):
             logging.info(e)
             return False, "Maybe bot is banned from the chat, or your link is invalid!"
             
-async def upload_media(client, sender, target_chat_id, file, caption, edit, topic_id):
+async def fetch_thumbnail(thumbnail_url, sender):
+    """Download a user's custom thumbnail; returns its path or None."""
+    thumb_path = f"thumbnail_{sender}.jpg"
+    try:
+        content = await http_client.get_bytes(thumbnail_url)
+        if content:
+            with open(thumb_path, 'wb') as f:
+                f.write(content)
+            return thumb_path
+        logger.error(f"Failed to download thumbnail from {thumbnail_url}")
+    except Exception as e:
+        logger.error(f"Error downloading thumbnail: {e}")
+    return None
+
+async def source_thumbnail(userbot, media):
+    """Download the smallest thumbnail Telegram keeps for the source media; returns its path or None."""
+    thumbs = getattr(media, 'thumbs', None)
+    if userbot is None or not thumbs:
+        return None
+    try:
+        thumb = min(thumbs, key=lambda t: t.file_size or 0)
+        return await limiter.call(userbot.download_media, thumb.file_id)
+    except Exception as e:
+        logger.error(f"Error downloading source thumbnail: {e}")
+        return None
+
+def will_stream(msg, ctx):
+    """Whether stream_clone can take this message for the given user context"""
+    if not STREAM_MEDIA or not streamable_media(msg):
+        return False
+    # A watermarked thumbnail is a screenshot of the whole file on disk
+    watermark_text = ctx.watermark_text if ctx else None
+    return not (msg.video and watermark_text and watermark_text.lower() != "no")
+
+async def stream_clone(userbot, client, sender, msg, target_chat_id, caption, topic_id, edit, ctx=None, uploaded=None):
+    """Clone media by piping the userbot's download straight into the Bot's upload.
+
+    `uploaded` is the InputFile of a pipe the batch engine already ran
+    (prestream_media), which is then only sent.
+    Returns the sent message, or None when the message isn't streamable or
+    the pipe failed, in which case the caller falls back to download + upload.
+    """
+    if ctx is None:
+        ctx = await db.get_user_context(sender)
+    if not will_stream(msg, ctx):
+        return None
+    
+    media = streamable_media(msg)
+    thumb_path = None
+    try:
+        if ctx.thumbnail and (ctx.thumbnail_enabled or not msg.video):
+            thumb_path = await fetch_thumbnail(ctx.thumbnail, sender)
+        if not thumb_path:
+            thumb_path = await source_thumbnail(userbot, media)
+        
+        await safe_edit_message(edit, "**Streaming to destination...**")
+        if uploaded is not None:
+            result = await send_streamed(userbot, client, msg, target_chat_id, caption, topic_id, thumb_path, input_file=uploaded)
+        else:
+            async with stage("download"), stage("upload"):
+                result = await send_streamed(
+                    userbot, client, msg, target_chat_id, caption, topic_id, thumb_path,
+                    ProgressReporter(client, "**__Unrestricting__(Streaming): __[Team Voice](https://t.me/officialharsh_g)__**\n ", edit, ctx.user_id).update
+                )
+        if result:
+            await db.increment_cloned_count(sender)
+            await media_cache.remember(msg, result, ctx)
+        return result
+    except (asyncio.CancelledError, StopTransmission):
+        # Cancelled by the user: falling back would start the transfer over
+        raise
+    except Exception as e:
+        logger.error(f"Streaming failed, falling back to download: {e}")
+        return None
+    finally:
+        if thumb_path and os.path.exists(thumb_path):
+            os.remove(thumb_path)
+
+async def upload_media(client, sender, target_chat_id, file, caption, edit, topic_id, ctx=None, source=None, userbot=None):
     thumb_path = None
     try:
         size_limit = 2000 * 1024 * 1024
@@ -321,7 +298,9 @@ async def upload_media(client, sender, target_chat_id, file, caption, edit, topi
         
         if file_size > size_limit:
             await edit.edit("File is too large. Splitting and uploading in parts...")
-            await split_and_upload_file(client, sender, target_chat_id, file, caption, topic_id)
+            # One upload slot for the whole split file; its parts share it
+            async with stage("upload"):
+                await split_and_upload_file(client, sender, target_chat_id, file, caption, topic_id)
             return
             
         video_formats = {'mp4', 'mkv', 'avi', 'mov'}
@@ -329,117 +308,100 @@ async def upload_media(client, sender, target_chat_id, file, caption, edit, topi
         image_formats = {'jpg', 'png', 'jpeg'}
 
         if file.split('.')[-1].lower() in video_formats:
-            metadata = video_metadata(file)
-            width, height, duration = metadata['width'], metadata['height'], metadata['duration']
-            
+            # Screenshots of the same source video are shared through the screenshot cache
+            kind, media = message_media(source)
+            media_id = getattr(media, 'file_unique_id', None)
+            # The source message already knows the video's attributes; the
+            # file is only probed for the ones it doesn't have
+            width = height = duration = 0
+            if kind == "video":
+                width, height, duration = media.width or 0, media.height or 0, media.duration or 0
+            if not (width and height and duration):
+                metadata = await video_metadata(file, job_priority(sender, ctx))
+                width = width or metadata['width']
+                height = height or metadata['height']
+                duration = duration or metadata['duration']
+            early_thumb = None
             try:
-                thumb_enable = db.get_thumbnail_enabled(sender)
-                if thumb_enable:
-                    result = db.get_watermark_text(sender)
-                    if result is None:
-                      watermark_text = "no"
-                    else:
-                      watermark_text = result
-                    thumbnail_url = db.get_thumbnail(sender)
-                    
-                    if watermark_text.lower() != "no":
-                        thumb_path = await screenshot(file, duration, sender)
-                    elif thumbnail_url:
-                        thumb_path = os.path.join("thumbnail.jpg")
-                        try:
-                            response = requests.get(thumbnail_url)
-                            if response.status_code == 200:
-                                with open(thumb_path, 'wb') as f:
-                                    f.write(response.content)
-                            else:
-                                logger.error(f"Failed to download thumbnail: {response.status_code}")
-                                thumb_path = await screenshot(file, duration, sender)
-                        except Exception as e:
-                            logger.error(f"Error downloading thumbnail: {e}")
-                            thumb_path = await screenshot(file, duration, sender)
-                    else:
-                        thumb_path = await screenshot(file, duration, sender)
+                thumb_enable = ctx.thumbnail_enabled if ctx else await db.get_thumbnail_enabled(sender)
+                result = ctx.watermark_text if ctx else await db.get_watermark_text(sender)
+                if result is None:
+                  watermark_text = "no"
                 else:
-                    thumbnail_url = None
-                    thumb_path = await screenshot(file, duration, sender)
+                  watermark_text = result
+                
+                # A screenshot taken from the head of the file during the download
+                early_thumb = await early_thumbnails.take(media_id, watermark_text if watermark_text.lower() != "no" else "")
+                
+                if watermark_text.lower() != "no":
+                    thumb_path = early_thumb or await screenshot(file, duration, sender, ctx, media_id, watermark_text)
+                else:
+                    if thumb_enable:
+                        thumbnail_url = ctx.thumbnail if ctx else await db.get_thumbnail(sender)
+                        if thumbnail_url:
+                            thumb_path = await fetch_thumbnail(thumbnail_url, sender)
+                    # Without a watermark the source's own thumbnail does as well as a screenshot
+                    if not thumb_path:
+                        thumb_path = await source_thumbnail(userbot, media)
+                    if not thumb_path:
+                        thumb_path = early_thumb or await screenshot(file, duration, sender, ctx, media_id, "")
             except Exception as e:
                 logger.error(f"Error setting thumbnail: {e}")
-                thumb_path = await screenshot(file, duration, sender)
+                thumb_path = await screenshot(file, duration, sender, ctx, media_id)
+            if early_thumb and early_thumb != thumb_path and os.path.exists(early_thumb):
+                os.remove(early_thumb)
                 
-            sent_msg = await client.send_video(
-                chat_id=target_chat_id,
-                video=file,
-                caption=caption,
-                height=height,
-                width=width,
-                duration=duration,
-                thumb=thumb_path,
-                reply_to_message_id=topic_id,
-                parse_mode=ParseMode.MARKDOWN,
-                progress=progress_for_pyrogram,
-                progress_args=(
-                    client,
-                    "**__Unrestricting__(Uploading): __[Team Voice](https://t.me/officialharsh_g)__**\n ",
-                    edit,
-                    time.time()
+            async with stage("upload"):
+                sent_msg = await client.send_video(
+                    chat_id=target_chat_id,
+                    video=file,
+                    caption=caption,
+                    height=height,
+                    width=width,
+                    duration=duration,
+                    thumb=thumb_path,
+                    reply_to_message_id=topic_id,
+                    parse_mode=ParseMode.MARKDOWN,
+                    progress=ProgressReporter(client, "**__Unrestricting__(Uploading): __[Team Voice](https://t.me/officialharsh_g)__**\n ", edit, ctx.user_id if ctx else sender).update
                 )
-            )
-            db.increment_cloned_count(sender)
+            await db.increment_cloned_count(sender)
             return sent_msg
                 
         elif file.split('.')[-1].lower() in image_formats:
-            sent_msg = await client.send_photo(
-                chat_id=target_chat_id,
-                photo=file,
-                caption=caption,
-                parse_mode=ParseMode.MARKDOWN,
-                progress=progress_for_pyrogram,
-                reply_to_message_id=topic_id,
-                progress_args=(
-                    client,
-                    "**__Unrestricting__(Uploading): __[Team Voice](https://t.me/officialharsh_g)__**\n ",
-                    edit,
-                    time.time()
+            async with stage("upload"):
+                sent_msg = await client.send_photo(
+                    chat_id=target_chat_id,
+                    photo=file,
+                    caption=caption,
+                    parse_mode=ParseMode.MARKDOWN,
+                    progress=ProgressReporter(client, "**__Unrestricting__(Uploading): __[Team Voice](https://t.me/officialharsh_g)__**\n ", edit, ctx.user_id if ctx else sender).update,
+                    reply_to_message_id=topic_id
                 )
-            )
-            db.increment_cloned_count(sender)
+            await db.increment_cloned_count(sender)
             return sent_msg
         else:
             if file.split('.')[-1].lower() in document_formats:
                 try:
-                    thumbnail_url = db.get_thumbnail(sender)
+                    thumbnail_url = ctx.thumbnail if ctx else await db.get_thumbnail(sender)
                     if thumbnail_url:
-                        thumb_path = os.path.join("thumbnail.jpg")
-                        try:
-                            response = requests.get(thumbnail_url)
-                            if response.status_code == 200:
-                                with open(thumb_path, 'wb') as f:
-                                    f.write(response.content)
-                            else:
-                                logger.error(f"Failed to download thumbnail: {response.status_code}")
-                                thumb_path = None
-                        except Exception as e:
-                            logger.error(f"Error downloading thumbnail: {e}")
-                            thumb_path = None
+                        thumb_path = await fetch_thumbnail(thumbnail_url, sender)
                 except Exception:
                     thumb_path = None
+            if not thumb_path:
+                _, media = message_media(source)
+                thumb_path = await source_thumbnail(userbot, media)
                     
-            sent_msg = await client.send_document(
-                chat_id=target_chat_id,
-                document=file,
-                caption=caption,
-                thumb=thumb_path,
-                reply_to_message_id=topic_id,
-                parse_mode=ParseMode.MARKDOWN,
-                progress=progress_for_pyrogram,
-                progress_args=(
-                    client,
-                    "**__Unrestricting__(Uploading): __[Team Voice](https://t.me/officialharsh_g)__**\n ",
-                    edit,
-                    time.time()
+            async with stage("upload"):
+                sent_msg = await client.send_document(
+                    chat_id=target_chat_id,
+                    document=file,
+                    caption=caption,
+                    thumb=thumb_path,
+                    reply_to_message_id=topic_id,
+                    parse_mode=ParseMode.MARKDOWN,
+                    progress=ProgressReporter(client, "**__Unrestricting__(Uploading): __[Team Voice](https://t.me/officialharsh_g)__**\n ", edit, ctx.user_id if ctx else sender).update
                 )
-            )
-            db.increment_cloned_count(sender)
+            await db.increment_cloned_count(sender)
             await asyncio.sleep(2)
             return sent_msg
 
@@ -456,9 +418,9 @@ async def upload_media(client, sender, target_chat_id, file, caption, edit, topi
                 logger.error(f"Error removing thumbnail file: {e}")
         gc.collect()
 
-async def copy_message_with_chat_id(app, userbot, sender, chat_id, message_id, edit):
+async def copy_message_with_chat_id(app, userbot, sender, chat_id, message_id, edit, ctx=None):
     try:
-        target_chat_id = db.get_chat_id(sender)
+        target_chat_id = ctx.chat_id if ctx else await db.get_chat_id(sender)
     except Exception as e:
         logger.error(f"Error getting chat_id from database: {e}")
         target_chat_id = sender
@@ -471,8 +433,8 @@ async def copy_message_with_chat_id(app, userbot, sender, chat_id, message_id, e
         msg = await app.get_messages(chat_id, message_id)
         caption = msg.caption
         
-        # Check if message is pinned - improved method
-        is_pinned = await is_message_pinned(app, chat_id, message_id)
+        # Bots can't search pinned messages, so index them with the userbot
+        is_pinned = await is_message_pinned(userbot, chat_id, message_id)
 
         topic_id = None
         if isinstance(target_chat_id, str) and '/' in target_chat_id:
@@ -482,13 +444,13 @@ async def copy_message_with_chat_id(app, userbot, sender, chat_id, message_id, e
             result = await send_media_message(app, target_chat_id, msg, caption, topic_id)
             if result and is_pinned:
                 await safe_pin_message(app, target_chat_id, result.id)
-            db.increment_cloned_count(sender)
+            await db.increment_cloned_count(sender)
             return
         elif msg.text:
             result = await app.copy_message(target_chat_id, chat_id, message_id, reply_to_message_id=topic_id)
             if result and is_pinned:
                 await safe_pin_message(app, target_chat_id, result.id)
-            db.increment_cloned_count(sender)
+            await db.increment_cloned_count(sender)
             return
 
         if result is None:
@@ -503,7 +465,7 @@ async def copy_message_with_chat_id(app, userbot, sender, chat_id, message_id, e
                 print(e)
                 pass
                 
-            chat_id = (await userbot.get_chat(f"@{chat_id}")).id
+            chat_id = (await chat_cache.get(userbot, f"@{chat_id}")).id
             msg = await userbot.get_messages(chat_id, message_id)
             caption = msg.caption
             if not msg or msg.service or not msg:
@@ -519,7 +481,7 @@ async def copy_message_with_chat_id(app, userbot, sender, chat_id, message_id, e
                 result = await app.send_message(target_chat_id, msg.text.markdown, reply_to_message_id=topic_id)
                 if result and is_pinned:
                     await safe_pin_message(app, target_chat_id, result.id)
-                db.increment_cloned_count(sender)
+                await db.increment_cloned_count(sender)
                 return
 
             # For media messages in public channels, try direct copy first if not protected
@@ -534,60 +496,76 @@ async def copy_message_with_chat_id(app, userbot, sender, chat_id, message_id, e
                 except Exception as e:
                     logger.error(f"Direct copy failed, falling back to download: {e}")
 
-            # If protected or direct copy failed, use download method
+            # Media the Bot already uploaded for anyone is re-sent by file_id
+            result = await media_cache.send(app, msg, target_chat_id, caption, topic_id, ctx)
+            if result:
+                if is_pinned:
+                    await safe_pin_message(app, target_chat_id, result.id)
+                await db.increment_cloned_count(sender)
+                return
+            
+            # If protected or direct copy failed, stream or download the media
+            result = await stream_clone(userbot, app, sender, msg, target_chat_id, caption, topic_id, edit, ctx)
+            if result:
+                if is_pinned:
+                    await safe_pin_message(app, target_chat_id, result.id)
+                return
+            
             try:
-              file = await userbot.download_media(
-                msg,
-                progress=progress_for_pyrogram,
-                progress_args=(
-                    app,
-                    "**__Unrestricting__(Downloading): __[Team Voice](https://t.me/officialharsh_g)__**\n ",
-                    edit,
-                    time.time()
-                )
-              )
-              db.increment_downloaded_count()
+              early_thumbnails.start(userbot, msg, sender, ctx)
+              async with stage("download"):
+                  file = await limiter.call(
+                    userbot.download_media,
+                    msg,
+                    progress=ProgressReporter(app, "**__Unrestricting__(Downloading): __[Team Voice](https://t.me/officialharsh_g)__**\n ", edit, ctx.user_id if ctx else sender).update
+                  )
+              await db.increment_downloaded_count()
             except FloodWait as e:
               print(f"Flood wait: {e.value} seconds")
-              if e.value < 300:
-                  await asyncio.sleep(e.value)
-                  await safe_edit_message(edit, "Retrying after FloodWait...")
-              else:
-                  await safe_edit_message(edit, f"⚠️ **Telegram Rate Limit Detected** ⚠️\n\nPlease try again after {e.value} seconds. Telegram has temporary restrictions on downloading this content.")
+              await safe_edit_message(edit, f"⚠️ **Telegram Rate Limit Detected** ⚠️\n\nPlease try again after {e.value} seconds. Telegram has temporary restrictions on downloading this content.")
               return
 
             if msg.photo:
                 result = await app.send_photo(target_chat_id, file, caption=caption, reply_to_message_id=topic_id)
                 if result and is_pinned:
                     await safe_pin_message(app, target_chat_id, result.id)
-                db.increment_cloned_count(sender)
+                await db.increment_cloned_count(sender)
+                await media_cache.remember(msg, result, ctx)
             elif msg.video or msg.document:
                 file_size = get_message_file_size(msg)
                 if file_size > size_limit:
                     await safe_edit_message(edit, "File is too large. Splitting and uploading in parts...")
-                    await split_and_upload_file(app, sender, target_chat_id, file, caption, topic_id)
+                    # One upload slot for the whole split file; its parts share it
+                    async with stage("upload"):
+                        await split_and_upload_file(app, sender, target_chat_id, file, caption, topic_id)
                     return
-                result = await upload_media(app, sender, target_chat_id, file, caption, edit, topic_id)
+                result = await upload_media(app, sender, target_chat_id, file, caption, edit, topic_id, ctx, msg, userbot)
                 if result and is_pinned:
                     await safe_pin_message(app, target_chat_id, result.id)
+                if result:
+                    await media_cache.remember(msg, result, ctx)
             elif msg.audio:
                 result = await app.send_audio(target_chat_id, file, caption=caption, reply_to_message_id=topic_id)
                 if result and is_pinned:
                     await safe_pin_message(app, target_chat_id, result.id)
-                db.increment_cloned_count(sender)
+                await db.increment_cloned_count(sender)
+                await media_cache.remember(msg, result, ctx)
             elif msg.voice:
                 result = await app.send_voice(target_chat_id, file, reply_to_message_id=topic_id)
                 if result and is_pinned:
                     await safe_pin_message(app, target_chat_id, result.id)
-                db.increment_cloned_count(sender)
+                await db.increment_cloned_count(sender)
+                await media_cache.remember(msg, result, ctx)
             elif msg.sticker:
                 result = await app.send_sticker(target_chat_id, msg.sticker.file_id, reply_to_message_id=topic_id)
                 if result and is_pinned:
                     await safe_pin_message(app, target_chat_id, result.id)
-                db.increment_cloned_count(sender)
+                await db.increment_cloned_count(sender)
             else:
                 await safe_edit_message(edit, "Unsupported media type.")
 
+    except StopTransmission:
+        raise
     except Exception as e:
         print(f"Error : {e}")
         pass
@@ -597,32 +575,26 @@ async def copy_message_with_chat_id(app, userbot, sender, chat_id, message_id, e
             os.remove(file)
             
 async def safe_edit_message(message, text):
+    # A direct edit supersedes any progress state still queued for this message
+    progress_hub.discard(message.chat.id, message.id)
     try:
-        await message.edit(text)
+        await limiter.call(message.edit, text)
     except FloodWait as e:
-        if e.value < 30:
-            await asyncio.sleep(e.value)
-            await safe_edit_message(message, text)
-        else:
-            logger.warning(f"FloodWait: {e.value} seconds. Skipping edit.")
+        logger.warning(f"FloodWait: {e.value} seconds. Skipping edit.")
     except Exception as e:
         logger.error(f"Failed to edit message: {e}")
 
 async def safe_send_message(client, chat_id, text):
     try:
-        return await client.send_message(chat_id, text)
+        return await limiter.call(client.send_message, chat_id, text)
     except FloodWait as e:
-        if e.value < 30:
-            await asyncio.sleep(e.value)
-            return await safe_send_message(client, chat_id, text)
-        else:
-            logger.warning(f"FloodWait: {e.value} seconds. Skipping message.")
-            return None
+        logger.warning(f"FloodWait: {e.value} seconds. Skipping message.")
+        return None
     except Exception as e:
         logger.error(f"Failed to send message: {e}")
         return None
             
-async def get_msg(userbot, client, sender, edit_id, msg_link, i):
+async def get_msg(userbot, client, sender, edit_id, msg_link, i, ctx=None, prepared=None):
     try:
         msg_link = msg_link.split("?single")[0]
         chat, msg_id = None, None
@@ -630,18 +602,12 @@ async def get_msg(userbot, client, sender, edit_id, msg_link, i):
         file = ''
         
         try:
-            edit = await client.edit_message_text(sender, edit_id, "**Processing your request...**")
-        except FloodWait as e:
-            if e.value < 30:
-                await asyncio.sleep(e.value)
-                edit = await client.edit_message_text(sender, edit_id, "**Processing your request...**")
-            else:
-                edit = await client.send_message(sender, "**Processing your request...**")
+            edit = await limiter.call(client.edit_message_text, sender, edit_id, "**Processing your request...**")
         except Exception as e:
             edit = await client.send_message(sender, "**Processing your request...**")
         
         if is_bot_url(msg_link):
-          if not is_auth(sender):
+          if not await is_auth(sender, ctx):
             await client.send_message(sender, "**Only for premium users.**")
             return
           else:
@@ -666,22 +632,28 @@ async def get_msg(userbot, client, sender, edit_id, msg_link, i):
                 
             try:
                 await safe_edit_message(edit, "**Accessing private channel...**")
-                try:
-                    await userbot.get_chat(chat)
-                except Exception:
-                    await safe_edit_message(edit, "**Cannot access this private channel.** Please send the invitation link of this channel first so the bot can join.")
-                    return
-                
-                msg = await userbot.get_messages(chat, msg_id)
+                if prepared and prepared.get("message"):
+                    # Prefetched by the batch engine, which already proved access
+                    msg = prepared["message"]
+                else:
+                    try:
+                        await chat_cache.get(userbot, chat)
+                    except Exception:
+                        await safe_edit_message(edit, "**Cannot access this private channel.** Please send the invitation link of this channel first so the bot can join.")
+                        return
+                    msg = await userbot.get_messages(chat, msg_id)
                 if not msg or msg.service or not msg:
                     await safe_edit_message(edit, "**Message not found or is a service message.**")
                     return
                 
                 # Check if message is pinned - improved method
-                is_pinned = await is_message_pinned(userbot, chat, msg_id)
+                if prepared and prepared.get("message"):
+                    is_pinned = prepared["is_pinned"]
+                else:
+                    is_pinned = await is_message_pinned(userbot, chat, msg_id)
                 
                 try:
-                    target_chat_id = db.get_chat_id(sender)
+                    target_chat_id = ctx.chat_id if ctx else await db.get_chat_id(sender)
                     topic_id = None
                     if isinstance(target_chat_id, str) and '/' in target_chat_id:
                         target_chat_id, topic_id = map(int, target_chat_id.split('/', 1))
@@ -692,7 +664,10 @@ async def get_msg(userbot, client, sender, edit_id, msg_link, i):
 
                 # Check if channel has content protection
                 await safe_edit_message(edit, "**Checking channel content protection...**")
-                is_protected = await check_channel_content_protection(userbot, chat)
+                if prepared and "is_protected" in prepared:
+                    is_protected = prepared["is_protected"]
+                else:
+                    is_protected = await check_channel_content_protection(userbot, chat)
                 
                 if hasattr(msg, 'web_preview') and msg.web_preview:
                     result = await clone_message(client, msg, target_chat_id, topic_id, edit_id)
@@ -705,7 +680,7 @@ async def get_msg(userbot, client, sender, edit_id, msg_link, i):
                     result = await client.send_message(target_chat_id, msg.text.markdown if hasattr(msg.text, 'markdown') else msg.text, reply_to_message_id=topic_id)
                     if is_pinned:
                         await safe_pin_message(client, target_chat_id, result.id)
-                    db.increment_cloned_count(sender)
+                    await db.increment_cloned_count(sender)
                     await safe_edit_message(edit, "**Message cloned successfully!**")
                     await asyncio.sleep(2)
                     await edit.delete()
@@ -732,7 +707,25 @@ async def get_msg(userbot, client, sender, edit_id, msg_link, i):
                     else:
                         await safe_edit_message(edit, "**Direct copy failed. Switching to download method...**")
 
-                # If channel is protected or direct copy failed, use download method
+                # Media the Bot already uploaded for anyone is re-sent by file_id
+                result = await media_cache.send(client, msg, target_chat_id, msg.caption or "", topic_id, ctx)
+                if result:
+                    if is_pinned:
+                        await safe_pin_message(client, target_chat_id, result.id)
+                    await db.increment_cloned_count(sender)
+                    await edit.delete()
+                    return
+                
+                # If channel is protected or direct copy failed, stream or download the media
+                if not (prepared and prepared.get("file")):
+                    uploaded = prepared.get("uploaded") if prepared else None
+                    result = await stream_clone(userbot, client, sender, msg, target_chat_id, msg.caption or "", topic_id, edit, ctx, uploaded)
+                    if result:
+                        if is_pinned:
+                            await safe_pin_message(client, target_chat_id, result.id)
+                        await edit.delete()
+                        return
+                
                 await safe_edit_message(edit, "**Using download and upload method...**")
                 
                 file_size = get_message_file_size(msg)
@@ -740,38 +733,22 @@ async def get_msg(userbot, client, sender, edit_id, msg_link, i):
                 await safe_edit_message(edit, "**Downloading...**")
                 
                 try:
-                    file = await userbot.download_media(
-                        msg,
-                        file_name=file_name,
-                        progress=progress_for_pyrogram,
-                        progress_args=(
-                            client,
-                            "**__Unrestricting__(Downloading): __[Team Voice](https://t.me/officialharsh_g)__**\n ",
-                            edit,
-                            time.time()
-                        )
-                    )
-                    db.increment_downloaded_count()
-                except FloodWait as e:
-                    if e.value < 300:
-                        await safe_edit_message(edit, f"Flood wait detected. Waiting for {e.value} seconds...")
-                        await asyncio.sleep(e.value)
-                        await safe_edit_message(edit, "Retrying download...")
-                        file = await userbot.download_media(
-                            msg,
-                            file_name=file_name,
-                            progress=progress_for_pyrogram,
-                            progress_args=(
-                                client,
-                                "**__Unrestricting__(Downloading): __[Team Voice](https://t.me/officialharsh_g)__**\n ",
-                                edit,
-                                time.time()
-                            )
-                        )
-                        db.increment_downloaded_count()
+                    if prepared and prepared.get("file"):
+                        # Already fetched by the batch download stage
+                        file = prepared["file"]
                     else:
-                        await safe_edit_message(edit, f"⚠️ **Telegram Rate Limit Detected** ⚠️\n\nPlease try again after {e.value} seconds. Telegram has temporary restrictions on downloading this content.")
-                        return
+                        early_thumbnails.start(userbot, msg, sender, ctx)
+                        async with stage("download"):
+                            file = await limiter.call(
+                                userbot.download_media,
+                                msg,
+                                file_name=file_name,
+                                progress=ProgressReporter(client, "**__Unrestricting__(Downloading): __[Team Voice](https://t.me/officialharsh_g)__**\n ", edit, ctx.user_id if ctx else sender).update
+                            )
+                        await db.increment_downloaded_count()
+                except FloodWait as e:
+                    await safe_edit_message(edit, f"⚠️ **Telegram Rate Limit Detected** ⚠️\n\nPlease try again after {e.value} seconds. Telegram has temporary restrictions on downloading this content.")
+                    return
                 
                 caption = msg.caption if msg.caption else ""
 
@@ -779,7 +756,8 @@ async def get_msg(userbot, client, sender, edit_id, msg_link, i):
                     result = await client.send_audio(target_chat_id, file, caption=caption, reply_to_message_id=topic_id)
                     if is_pinned:
                         await safe_pin_message(client, target_chat_id, result.id)
-                    db.increment_cloned_count(sender)
+                    await db.increment_cloned_count(sender)
+                    await media_cache.remember(msg, result, ctx)
                     await edit.delete()
                     os.remove(file)
                     return
@@ -788,7 +766,8 @@ async def get_msg(userbot, client, sender, edit_id, msg_link, i):
                     result = await client.send_voice(target_chat_id, file, reply_to_message_id=topic_id)
                     if is_pinned:
                         await safe_pin_message(client, target_chat_id, result.id)
-                    db.increment_cloned_count(sender)
+                    await db.increment_cloned_count(sender)
+                    await media_cache.remember(msg, result, ctx)
                     await edit.delete()
                     os.remove(file)
                     return
@@ -797,7 +776,7 @@ async def get_msg(userbot, client, sender, edit_id, msg_link, i):
                     result = await client.send_video_note(target_chat_id, file, reply_to_message_id=topic_id)
                     if is_pinned:
                         await safe_pin_message(client, target_chat_id, result.id)
-                    db.increment_cloned_count(sender)
+                    await db.increment_cloned_count(sender)
                     await edit.delete()
                     os.remove(file)
                     return
@@ -806,14 +785,17 @@ async def get_msg(userbot, client, sender, edit_id, msg_link, i):
                     result = await client.send_photo(target_chat_id, file, caption=caption, reply_to_message_id=topic_id)
                     if is_pinned:
                         await safe_pin_message(client, target_chat_id, result.id)
-                    db.increment_cloned_count(sender)
+                    await db.increment_cloned_count(sender)
+                    await media_cache.remember(msg, result, ctx)
                     await edit.delete()
                     os.remove(file)
                     return
                 else:
-                    result = await upload_media(client, sender, target_chat_id, file, caption, edit, topic_id)
+                    result = await upload_media(client, sender, target_chat_id, file, caption, edit, topic_id, ctx, msg, userbot)
                     if result and is_pinned:
                         await safe_pin_message(client, target_chat_id, result.id)
+                    if result:
+                        await media_cache.remember(msg, result, ctx)
                 
             except (ChannelBanned, ChannelInvalid, ChannelPrivate, ChatIdInvalid, ChatInvalid) as e:
                 await safe_edit_message(edit, f"**Cannot access this channel:** {str(e)}\n\nPlease send the invitation link of this channel first so the bot can join.")
@@ -821,6 +803,8 @@ async def get_msg(userbot, client, sender, edit_id, msg_link, i):
             except FloodWait as e:
                 await safe_edit_message(edit, f"⚠️ **Telegram Rate Limit Detected** ⚠️\n\nPlease try again after {e.value} seconds.")
                 return
+            except StopTransmission:
+                raise
             except Exception as e:
                 logger.error(f"Error accessing private channel: {e}")
                 await safe_edit_message(edit, f"**Error:** {str(e)}")
@@ -830,38 +814,21 @@ async def get_msg(userbot, client, sender, edit_id, msg_link, i):
                 await safe_edit_message(edit, "**Public link detected...**")
                 chat = msg_link.split("t.me/")[1].split("/")[0]
                 msg_id = int(msg_link.split("/")[-1])
-                
-                # Check if message is pinned in public chat - improved method
-                is_pinned = await is_message_pinned(client, chat, msg_id)
                     
-                await copy_message_with_chat_id(client, userbot, sender, chat, msg_id, edit)
+                await copy_message_with_chat_id(client, userbot, sender, chat, msg_id, edit, ctx)
                 await edit.delete()
                 return
             except FloodWait as e:
-                if e.value < 300:
-                    await safe_send_message(client, sender, f"⚠️ **Rate limit detected. Waiting for {e.value} seconds before retrying.**")
-                    await asyncio.sleep(e.value)
-                    chat = msg_link.split("t.me/")[1].split("/")[0]
-                    msg_id = int(msg_link.split("/")[-1])
-                    await copy_message_with_chat_id(client, userbot, sender, chat, msg_id, edit)
-                    await edit.delete()
-                    return
-                else:
-                    await safe_send_message(client, sender, f"⚠️ **Telegram Rate Limit Detected** ⚠️\n\nPlease try again after {e.value} seconds.")
-                    return
+                await safe_send_message(client, sender, f"⚠️ **Telegram Rate Limit Detected** ⚠️\n\nPlease try again after {e.value} seconds.")
+                return
             
     except FloodWait as e:
+        # Waits the limiter could absorb were already retried; this one is too long
         logger.warning(f"FloodWait: {e.value} seconds")
-        try:
-            if e.value < 300:
-                await safe_send_message(client, sender, f"⚠️ **Rate limit detected. Waiting for {e.value} seconds before retrying.**")
-                await asyncio.sleep(e.value)
-                await get_msg(userbot, client, sender, edit_id, msg_link, i)
-            else:
-                await safe_send_message(client, sender, f"⚠️ **Telegram Rate Limit Detected** ⚠️\n\nPlease try again after {e.value} seconds.")
-        except Exception as inner_e:
-            logger.error(f"Error handling FloodWait: {inner_e}")
-            await safe_send_message(client, sender, f"⚠️ **Error:** {str(inner_e)}")
+        limiter.penalize(client, e.value)
+        await safe_send_message(client, sender, f"⚠️ **Telegram Rate Limit Detected** ⚠️\n\nPlease try again after {e.value} seconds.")
+    except StopTransmission:
+        await safe_edit_message(edit, "❌ **Transfer cancelled.**")
     except Exception as e:
         logger.error(f"Error in get_msg: {e}")
         try:
@@ -874,86 +841,66 @@ async def get_msg(userbot, client, sender, edit_id, msg_link, i):
         
 async def clone_message(app, msg, target_chat_id, topic_id, edit_id):
     try:
-        edit = await app.edit_message_text(target_chat_id, edit_id, "Cloning...")
-        result = await app.send_message(target_chat_id, msg.text.markdown, reply_to_message_id=topic_id)
-        db.increment_cloned_count(msg.from_user.id if msg.from_user else target_chat_id)
+        edit = await limiter.call(app.edit_message_text, target_chat_id, edit_id, "Cloning...")
+        result = await limiter.call(app.send_message, target_chat_id, msg.text.markdown, reply_to_message_id=topic_id)
+        await db.increment_cloned_count(msg.from_user.id if msg.from_user else target_chat_id)
         await edit.delete()
         return result
     except FloodWait as e:
-        if e.value < 30:
-            await asyncio.sleep(e.value)
-            return await clone_message(app, msg, target_chat_id, topic_id, edit_id)
-        else:
-            await safe_send_message(app, target_chat_id, f"⚠️ **Rate limit detected: {e.value}s. Your message will be cloned when the rate limit expires.**")
-            return None
+        await safe_send_message(app, target_chat_id, f"⚠️ **Rate limit detected: {e.value}s. Your message will be cloned when the rate limit expires.**")
+        return None
 
 async def clone_text_message(app, msg, target_chat_id, topic_id, edit_id):
     try:
-        edit = await app.edit_message_text(target_chat_id, edit_id, "Cloning text message...")
-        result = await app.send_message(target_chat_id, msg.text.markdown, reply_to_message_id=topic_id)
-        db.increment_cloned_count(msg.from_user.id if msg.from_user else target_chat_id)
+        edit = await limiter.call(app.edit_message_text, target_chat_id, edit_id, "Cloning text message...")
+        result = await limiter.call(app.send_message, target_chat_id, msg.text.markdown, reply_to_message_id=topic_id)
+        await db.increment_cloned_count(msg.from_user.id if msg.from_user else target_chat_id)
         await edit.delete()
         return result
     except FloodWait as e:
-        if e.value < 30:
-            await asyncio.sleep(e.value)
-            return await clone_text_message(app, msg, target_chat_id, topic_id, edit_id)
-        else:
-            await safe_send_message(app, target_chat_id, f"⚠️ **Rate limit detected: {e.value}s. Your message will be cloned when the rate limit expires.**")
+        await safe_send_message(app, target_chat_id, f"⚠️ **Rate limit detected: {e.value}s. Your message will be cloned when the rate limit expires.**")
 
 async def handle_sticker(app, msg, target_chat_id, topic_id, edit_id):
     try:
-        edit = await app.edit_message_text(target_chat_id, edit_id, "Handling sticker...")
-        result = await app.send_sticker(target_chat_id, msg.sticker.file_id, reply_to_message_id=topic_id)
-        db.increment_cloned_count(msg.from_user.id if msg.from_user else target_chat_id)
+        edit = await limiter.call(app.edit_message_text, target_chat_id, edit_id, "Handling sticker...")
+        result = await limiter.call(app.send_sticker, target_chat_id, msg.sticker.file_id, reply_to_message_id=topic_id)
+        await db.increment_cloned_count(msg.from_user.id if msg.from_user else target_chat_id)
         await edit.delete()
     except FloodWait as e:
-        if e.value < 30:
-            await asyncio.sleep(e.value)
-            await handle_sticker(app, msg, target_chat_id, topic_id, edit_id)
-        else:
-            await safe_send_message(app, target_chat_id, f"⚠️ **Rate limit detected: {e.value}s. Your sticker will be sent when the rate limit expires.**")
+        await safe_send_message(app, target_chat_id, f"⚠️ **Rate limit detected: {e.value}s. Your sticker will be sent when the rate limit expires.**")
 
 async def send_media_message(app, target_chat_id, msg, caption, topic_id):
     try:
         result = None
         if msg.video:
-            result = await app.send_video(target_chat_id, msg.video.file_id, caption=caption, reply_to_message_id=topic_id)
+            result = await limiter.call(app.send_video, target_chat_id, msg.video.file_id, caption=caption, reply_to_message_id=topic_id)
         elif msg.document:
-            result = await app.send_document(target_chat_id, msg.document.file_id, caption=caption, reply_to_message_id=topic_id)
+            result = await limiter.call(app.send_document, target_chat_id, msg.document.file_id, caption=caption, reply_to_message_id=topic_id)
         elif msg.photo:
-            result = await app.send_photo(target_chat_id, msg.photo.file_id, caption=caption, reply_to_message_id=topic_id)
+            result = await limiter.call(app.send_photo, target_chat_id, msg.photo.file_id, caption=caption, reply_to_message_id=topic_id)
         elif msg.audio:
-            result = await app.send_audio(target_chat_id, msg.audio.file_id, caption=caption, reply_to_message_id=topic_id)
+            result = await limiter.call(app.send_audio, target_chat_id, msg.audio.file_id, caption=caption, reply_to_message_id=topic_id)
         elif msg.voice:
-            result = await app.send_voice(target_chat_id, msg.voice.file_id, caption=caption, reply_to_message_id=topic_id)
+            result = await limiter.call(app.send_voice, target_chat_id, msg.voice.file_id, caption=caption, reply_to_message_id=topic_id)
         elif msg.sticker:
-            result = await app.send_sticker(target_chat_id, msg.sticker.file_id, reply_to_message_id=topic_id)
+            result = await limiter.call(app.send_sticker, target_chat_id, msg.sticker.file_id, reply_to_message_id=topic_id)
         
         if result:
-            db.increment_cloned_count(msg.from_user.id if msg.from_user else target_chat_id)
+            await db.increment_cloned_count(msg.from_user.id if msg.from_user else target_chat_id)
             return result
     except FloodWait as e:
-        if e.value < 30:
-            await asyncio.sleep(e.value)
-            return await send_media_message(app, target_chat_id, msg, caption, topic_id)
-        else:
-            await safe_send_message(app, target_chat_id, f"⚠️ **Rate limit detected: {e.value}s. Media will be sent when the rate limit expires.**")
-            return None
+        await safe_send_message(app, target_chat_id, f"⚠️ **Rate limit detected: {e.value}s. Media will be sent when the rate limit expires.**")
+        return None
     except Exception as e:
         print(f"Error while sending media: {e}")
     
     try:
-        result = await app.copy_message(target_chat_id, msg.chat.id, msg.id, reply_to_message_id=topic_id)
-        db.increment_cloned_count(msg.from_user.id if msg.from_user else target_chat_id)
+        result = await limiter.call(app.copy_message, target_chat_id, msg.chat.id, msg.id, reply_to_message_id=topic_id)
+        await db.increment_cloned_count(msg.from_user.id if msg.from_user else target_chat_id)
         return result
     except FloodWait as e:
-        if e.value < 30:
-            await asyncio.sleep(e.value)
-            return await send_media_message(app, target_chat_id, msg, caption, topic_id)
-        else:
-            await safe_send_message(app, target_chat_id, f"⚠️ **Rate limit detected: {e.value}s. Message will be copied when the rate limit expires.**")
-            return None
+        await safe_send_message(app, target_chat_id, f"⚠️ **Rate limit detected: {e.value}s. Message will be copied when the rate limit expires.**")
+        return None
     
 async def get_media_filename(msg):
     if msg.document:
@@ -970,6 +917,46 @@ async def get_media_filename(msg):
         return "video_note.mp4"
     return "unknown_file"
 
+def batch_download_dir(chat_id, msg_id):
+    """Per-message download folder, so concurrent batch downloads never share a path."""
+    return os.path.join("downloads", f"batch_{chat_id}_{msg_id}")
+
+def needs_download(msg):
+    return bool(msg and not msg.service and not msg.text and not msg.sticker and
+                (msg.photo or msg.video or msg.document or msg.audio or msg.voice or msg.video_note))
+
+async def prefetch_media(userbot, chat_id, msg, ctx=None):
+    """Download a message's media ahead of its upload; returns the path or None."""
+    try:
+        file_name = await get_media_filename(msg)
+        early_thumbnails.start(userbot, msg, ctx.user_id if ctx else None, ctx)
+        async with stage("download"):
+            file = await limiter.call(
+                userbot.download_media,
+                msg,
+                file_name=os.path.join(batch_download_dir(chat_id, msg.id), file_name)
+            )
+        await db.increment_downloaded_count()
+        return file
+    except FloodWait:
+        raise
+    except Exception as e:
+        logger.error(f"Error prefetching media for {msg.id}: {e}")
+        return None
+
+async def prestream_media(userbot, client, msg):
+    """Pipe a message's media into an upload by `client` ahead of sending it;
+    returns the InputFile for stream_clone, or None."""
+    try:
+        media = streamable_media(msg)
+        async with stage("download"), stage("upload"):
+            return await pipe_upload(userbot, client, msg, media.file_size, streamed_file_name(msg))
+    except FloodWait:
+        raise
+    except Exception as e:
+        logger.error(f"Error prestreaming media for {msg.id}: {e}")
+        return None
+
 def get_message_file_size(msg):
     if msg.document and hasattr(msg.document, 'file_size'):
         return msg.document.file_size
@@ -986,6 +973,7 @@ def get_message_file_size(msg):
     return 1
 
 async def split_and_upload_file(app, sender, target_chat_id, file_path, caption, topic_id):
+    upload_tasks = []
     try:
         if not os.path.exists(file_path):
             await app.send_message(sender, "❌ File not found!")
@@ -993,7 +981,6 @@ async def split_and_upload_file(app, sender, target_chat_id, file_path, caption,
 
         file_size = os.path.getsize(file_path)
         PART_SIZE = int(1.5 * 1024 * 1024 * 1024)
-        BUFFER_SIZE = 8 * 1024 * 1024
         total_parts = (file_size + PART_SIZE - 1) // PART_SIZE
 
         start = await app.send_message(sender, 
@@ -1001,71 +988,49 @@ async def split_and_upload_file(app, sender, target_chat_id, file_path, caption,
             f"🔢 **Splitting into:** {total_parts} parts (1.5GB each)"
         )
 
-        for part_number in range(total_parts):
-            part_file = f"{file_path}.part{part_number:03d}"
-            bytes_written = 0
-            
-            progress_msg = await app.send_message(sender, f"📝 Creating part {part_number+1}/{total_parts}")
-            
+        file_ext = os.path.splitext(file_path)[1].lower()
+        
+        how_to_watch = ""
+        if file_ext in ['.mp4', '.mkv', '.mov', '.avi', '.wmv', '.m4v']:
+            how_to_watch = (
+                "\n\n📱 **How to watch this split video:**\n"
+                "**For Android:** Download all parts, then use MX Player or VLC and select 'Open as > Combine files'\n"
+                "**For PC:** Download all parts, then use HJSplit or 7-Zip to join files before playing"
+            )
+
+        # Up to SPLIT_UPLOAD_WORKERS parts upload at once; all report into the
+        # single `start` message, and parts are posted strictly in order below
+        uploaded = [0] * total_parts
+        semaphore = asyncio.Semaphore(SPLIT_UPLOAD_WORKERS)
+        reporter = ProgressReporter(app, f"**Uploading {total_parts} parts (0 posted)**", start, sender)
+
+        async def report(current, total, part_number):
+            uploaded[part_number] = current
+            await reporter.update(sum(uploaded), file_size)
+
+        async def upload_part(part_number):
+            # Each part is uploaded straight from its byte range of the original file
+            offset = part_number * PART_SIZE
+            part_name = f"{os.path.basename(file_path)}.part{part_number:03d}"
+            async with semaphore:
+                part = FileSlice(file_path, offset, min(PART_SIZE, file_size - offset), part_name)
+                try:
+                    return await app.save_file(part, progress=report, progress_args=(part_number,))
+                finally:
+                    part.close()
+
+        upload_tasks = [asyncio.create_task(upload_part(n)) for n in range(total_parts)]
+
+        for part_number, task in enumerate(upload_tasks):
             try:
-                async with aiofiles.open(file_path, "rb") as source_file:
-                    await source_file.seek(part_number * PART_SIZE)
-                    
-                    async with aiofiles.open(part_file, "wb") as part_f:
-                        while bytes_written < PART_SIZE:
-                            read_size = min(BUFFER_SIZE, PART_SIZE - bytes_written)
-                            buffer = await source_file.read(read_size)
-                            
-                            if not buffer:
-                                break
-                                
-                            await part_f.write(buffer)
-                            bytes_written += len(buffer)
-                            
-                            if bytes_written % (100 * 1024 * 1024) < BUFFER_SIZE:
-                                await progress_msg.edit(
-                                    f"📝 Creating part {part_number+1}/{total_parts}\n"
-                                    f"Progress: {bytes_written/PART_SIZE*100:.1f}%"
-                                )
-                
-                await progress_msg.edit(f"⏫ Uploading part {part_number+1}/{total_parts}")
-                
-                file_ext = os.path.splitext(file_path)[1].lower()
-                
-                how_to_watch = ""
-                if file_ext in ['.mp4', '.mkv', '.mov', '.avi', '.wmv', '.m4v']:
-                    how_to_watch = (
-                        "\n\n📱 **How to watch this split video:**\n"
-                        "**For Android:** Download all parts, then use MX Player or VLC and select 'Open as > Combine files'\n"
-                        "**For PC:** Download all parts, then use HJSplit or 7-Zip to join files before playing"
-                    )
-                
+                input_file = await task
                 part_caption = f"{caption}\n\nPart {part_number+1}/{total_parts}{how_to_watch}" if caption else f"Part {part_number+1}/{total_parts}{how_to_watch}"
-                
-                await app.send_document(
-                    chat_id=target_chat_id,
-                    document=part_file,
-                    caption=part_caption,
-                    reply_to_message_id=topic_id,
-                    progress=progress_for_pyrogram,
-                    progress_args=(
-                        app,
-                        f"**Uploading Part {part_number+1}/{total_parts}**",
-                        progress_msg,
-                        time.time()
-                    )
-                )
-                
-                await progress_msg.delete()
-                
+                await send_uploaded_document(app, target_chat_id, input_file, part_caption, topic_id)
+                reporter.ud_type = f"**Uploading {total_parts} parts ({part_number+1} posted)**"
             except Exception as e:
                 logger.error(f"Error processing part {part_number+1}: {str(e)}\n{traceback.format_exc()}")
                 await app.send_message(sender, f"❌ Error on part {part_number+1}: {str(e)}")
                 raise
-            finally:
-                if os.path.exists(part_file):
-                    os.remove(part_file)
-                gc.collect()
 
         await start.edit(f"✅ Successfully uploaded {total_parts} parts!")
         os.remove(file_path)
@@ -1073,18 +1038,12 @@ async def split_and_upload_file(app, sender, target_chat_id, file_path, caption,
     except Exception as e:
         error_msg = f"❌ Error: {str(e)}\n\n{traceback.format_exc()}"
         logger.error(f"Split error: {error_msg}")
-        
-        for part_file in glob.glob(f"{file_path}.part*"):
-            try:
-                os.remove(part_file)
-            except Exception as cleanup_error:
-                logger.error(f"Cleanup error: {cleanup_error}")
-
         await app.send_message(sender, f"❌ Upload failed: {str(e)}")
 
     finally:
-        if 'temp_dir' in locals() and os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir, ignore_errors=True)
+        for task in upload_tasks:
+            task.cancel()
+        await asyncio.gather(*upload_tasks, return_exceptions=True)
         gc.collect()
 
 def is_bot_url(url: str) -> bool:
@@ -1522,7 +1481,7 @@ async def process_bot_messages(userbot, bot, sender_id, edit_msg, messages, targ
         
         if target_chat_id is None:
             from main.plugins.db import db
-            target_chat_id = db.get_chat_id(sender_id)
+            target_chat_id = await db.get_chat_id(sender_id)
             
         topic_id = None
         if isinstance(target_chat_id, str) and '/' in target_chat_id:
@@ -1614,20 +1573,15 @@ async def process_bot_messages(userbot, bot, sender_id, edit_msg, messages, targ
                     )
                     return
                 
-                file = await userbot.download_media(
-                    msg,
-                    progress=progress_for_pyrogram,
-                    progress_args=(
-                        bot,
-                        "**__Unrestricting__(Downloading): __[Team Voice](https://t.me/officialharsh_g)__**\n ",
-                        edit_msg,
-                        time.time()
+                async with stage("download"):
+                    file = await userbot.download_media(
+                        msg,
+                        progress=ProgressReporter(bot, "**__Unrestricting__(Downloading): __[Team Voice](https://t.me/officialharsh_g)__**\n ", edit_msg, sender_id).update
                     )
-                )
                 
                 if file:
                     caption = msg.caption if msg.caption else ""
-                    await upload_media(bot, sender_id, target_chat_id, file, caption, edit_msg, topic_id)
+                    await upload_media(bot, sender_id, target_chat_id, file, caption, edit_msg, topic_id, source=msg, userbot=userbot)
                     
             elif msg.text:
                 await bot.send_message(
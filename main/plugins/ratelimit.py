@@ -0,0 +1,139 @@
+import asyncio
+import time
+import logging
+
+from pyrogram.errors import FloodWait
+
+from config import BATCH_RATE
+
+logger = logging.getLogger(__name__)
+
+class RateLimiter:
+    """Token bucket shared by every coroutine that paces Telegram requests.
+
+    `rate` is the number of tokens refilled per second and `burst` the most
+    that can be spent back to back after an idle period.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens=1):
+        """Wait until `tokens` are available and take them. Waiters are served in order."""
+        async with self._lock:
+            self._refill()
+            while self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
+
+class AdaptiveBucket(RateLimiter):
+    """Token bucket whose rate follows FloodWait feedback: it halves and
+    blocks until the wait is over on every FloodWait, then creeps back up
+    by `step` per successful call, settling just under Telegram's limit."""
+
+    def __init__(self, name, rate, burst, min_rate, max_rate, step):
+        super().__init__(rate, burst)
+        self.name = name
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.step = step
+        self.blocked_until = 0
+
+    async def acquire(self, tokens=1):
+        delay = self.blocked_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await super().acquire(tokens)
+
+    def on_success(self):
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.step)
+            if self.rate == self.max_rate:
+                logger.info(f"{self.name} budget recovered to {self.rate:.2f} req/s")
+
+    def on_flood_wait(self, seconds):
+        self._refill()
+        self.rate = max(self.min_rate, self.rate / 2)
+        self._tokens = 0
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        logger.warning(f"FloodWait {seconds}s on {self.name}: budget now {self.rate:.2f} req/s")
+
+class AdaptiveLimiter:
+    """Shared limiter for Bot and userbot calls, one bucket per (client, method).
+
+    Wrap any Telegram call as `await limiter.call(client.send_message, chat_id, text)`.
+    FloodWaits up to `max_wait` seconds are absorbed: every caller of that
+    method is held back for the wait and the call is retried. Longer ones
+    are raised so the caller can give up.
+    """
+
+    def __init__(self, rate=10, burst=5, min_rate=0.05, max_rate=30, step=0.05, max_wait=300):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.step = step
+        self.max_wait = max_wait
+        self._buckets = {}
+
+    @staticmethod
+    def _client_name(client):
+        return getattr(client, "name", None) or type(client).__name__
+
+    def bucket(self, fn):
+        owner = getattr(fn, "__self__", None)
+        # Bound Message methods (edit, delete, ...) spend their client's budget
+        client = getattr(owner, "_client", owner)
+        key = (self._client_name(client), getattr(fn, "__name__", repr(fn)))
+        if key not in self._buckets:
+            self._buckets[key] = AdaptiveBucket(
+                f"{key[0]}.{key[1]}", self.rate, self.burst,
+                self.min_rate, self.max_rate, self.step
+            )
+        return self._buckets[key]
+
+    async def call(self, fn, *args, **kwargs):
+        bucket = self.bucket(fn)
+        while True:
+            await bucket.acquire()
+            try:
+                result = await fn(*args, **kwargs)
+            except FloodWait as e:
+                bucket.on_flood_wait(e.value)
+                if e.value > self.max_wait:
+                    raise
+                continue
+            bucket.on_success()
+            return result
+
+    def penalize(self, client, seconds):
+        """Apply a FloodWait seen outside `call` to every bucket of `client`."""
+        name = self._client_name(client)
+        for (client_name, _), bucket in self._buckets.items():
+            if client_name == name:
+                bucket.on_flood_wait(seconds)
+
+    def budget(self):
+        """Current rate of every bucket, for logs and /stats."""
+        return {bucket.name: round(bucket.rate, 2) for bucket in self._buckets.values()}
+
+# One bucket for all running batches, so several users batching at once
+# share the Bot's send budget instead of each pacing on its own
+batch_limiter = RateLimiter(BATCH_RATE, burst=3)
+
+limiter = AdaptiveLimiter()
+
+# Raw upload parts (SaveFilePart/SaveBigFilePart) are file transfer, not
+# message traffic: they get their own, much larger budget so a streamed
+# upload neither crawls at the message rate nor starves other calls
+upload_limiter = AdaptiveLimiter(rate=100, burst=20, min_rate=5, max_rate=400, step=1)
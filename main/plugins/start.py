@@ -1,12 +1,14 @@
 import os
 import re
+import time
 from .. import Bot
 from pyrogram import Client, filters, enums
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from pyrogram.errors import MessageNotModified
 from main.plugins.db import db
 import cloudinary
-import cloudinary.uploader
+import cloudinary.utils
+from main.plugins.httpclient import http_client
 import logging
 from config import CLOUD_NAME, API_KEY, API_SECRET, LOG_GROUP
 from datetime import timedelta
@@ -56,7 +58,7 @@ HELP_TEXT = """
 - `/redeem <key>` : Activate premium features
 - `/id` : Get chat/user ID
 
-**Note:** Max 100,000 files per batch. Use `/cancel` to stop ongoing processes.
+**Note:** Max 100,000 files per batch. Use `/cancel` to stop ongoing processes and `/resume` to continue a batch that was interrupted.
 """
 PLANS_TEXT = """
 <b>🌟 PREMIUM PLANS 🌟</b>
@@ -126,7 +128,7 @@ Rules are strictly enforced to maintain the educational integrity of our service
 
 async def add_user(user):
     try:
-        db.add_user(
+        await db.add_user(
             user_id=user.id,
             username=user.username,
             first_name=user.first_name,
@@ -141,15 +143,15 @@ async def msg_command(client, message):
     user_id = message.from_user.id
     
     # Check if user is banned
-    is_banned, ban_reason = db.is_user_banned(user_id)
+    is_banned, ban_reason = await db.is_user_banned(user_id)
     if is_banned:
         await message.reply(f"❌ You are not allowed to send messages. Reason: {ban_reason or 'No reason provided'}")
         return
     
     # Check if user is muted
-    is_muted, mute_reason, _ = db.is_user_muted(user_id)
+    is_muted, mute_reason, _ = await db.is_user_muted(user_id)
     if is_muted:
-        mute_time = db.get_mute_time_formatted(user_id)
+        mute_time = await db.get_mute_time_formatted(user_id)
         mute_text = f"❌ You are currently muted for {mute_time} remaining"
         if mute_reason:
             mute_text += f". Reason: {mute_reason}"
@@ -184,7 +186,7 @@ async def msg_command(client, message):
         return
     
     # Format the message for the log group
-    user_info = db.get_user_info(user_id) or {}
+    user_info = await db.get_user_info(user_id) or {}
     username = user_info.get('username', 'No username')
     first_name = user_info.get('first_name', '')
     last_name = user_info.get('last_name', '')
@@ -335,15 +337,15 @@ async def plans_handler(client, message):
     await add_user(user)
     
     # Check if user is banned
-    is_banned, ban_reason = db.is_user_banned(user.id)
+    is_banned, ban_reason = await db.is_user_banned(user.id)
     if is_banned:
         await message.reply(f"You are banned from using this bot. Reason: {ban_reason or 'No reason provided'}")
         return
 
     # Check if user is muted
-    is_muted, mute_reason, _ = db.is_user_muted(user.id)
+    is_muted, mute_reason, _ = await db.is_user_muted(user.id)
     if is_muted:
-        mute_time = db.get_mute_time_formatted(user.id)
+        mute_time = await db.get_mute_time_formatted(user.id)
         mute_text = f"🔇 You are muted for {mute_time} remaining"
         if mute_reason:
             mute_text += f". Reason: {mute_reason}"
@@ -470,15 +472,15 @@ async def start_handler(client, message):
     await add_user(user)
     
     # Check if user is banned
-    is_banned, ban_reason = db.is_user_banned(user_id)
+    is_banned, ban_reason = await db.is_user_banned(user_id)
     if is_banned:
       await message.reply(f"You are banned from using this bot. Reason: {ban_reason or 'No reason provided'}")
       return
 
     # Check if user is muted
-    is_muted, mute_reason, _ = db.is_user_muted(user_id)
+    is_muted, mute_reason, _ = await db.is_user_muted(user_id)
     if is_muted:
-      mute_time = db.get_mute_time_formatted(user_id)
+      mute_time = await db.get_mute_time_formatted(user_id)
       mute_text = f"🔇 You are muted for {mute_time} remaining"
       if mute_reason:
         mute_text += f". Reason: {mute_reason}"
@@ -508,29 +510,30 @@ async def redeem_handler(client, message):
         )
     
     key = message.command[1]
-    success, response = db.redeem_key(key, message.from_user.id)
+    success, response = await db.redeem_key(key, message.from_user.id)
     await message.reply(response)
 
 @Bot.on_message(filters.command("me"))
 async def me_handler(client, message):
     user_id = message.from_user.id
-    user_info = db.get_user_info(user_id)
+    user_info = await db.get_user_info(user_id)
     
     if not user_info:
         return await message.reply("❌ User data not found.")
     
-    expiry = db.get_expiration_time_remaining(user_id)
+    expiry = await db.get_expiration_time_remaining(user_id)
     expiry_str = "Lifetime" if not expiry else (
         "Expired" if expiry.days < 0 else
         f"{expiry.days}d {expiry.seconds//3600}h {(expiry.seconds%3600)//60}m"
     )
+    is_authorized = await db.is_user_authorized(user_id)
     
     response = f"""
 **🆔 ID:** `{user_info['user_id']}`
 **👤 Name:** {user_info.get('first_name', '')} {user_info.get('last_name', '')}
 **🌟 Premium:** Tier {user_info.get('premium_level', 0)}
 **⏳ Expiry:** {expiry_str}
-**🔐 Status:** {'✅ Authorized' if db.is_user_authorized(user_id) else '❌ Unauthorized'}
+**🔐 Status:** {'✅ Authorized' if is_authorized else '❌ Unauthorized'}
 """
     await message.reply(response)
 
@@ -552,7 +555,7 @@ async def id_handler(client, message):
 @Bot.on_message(filters.command("settings"))
 async def settings_handler(client, message):
     user_id = message.from_user.id
-    if not db.is_user_authorized(user_id):
+    if not await db.is_user_authorized(user_id):
         return await message.reply("🔒 Please authenticate first.")
     
     buttons = InlineKeyboardMarkup([
@@ -569,9 +572,9 @@ async def settings_handler(client, message):
 @Bot.on_callback_query(filters.regex(r"^thumb_settings$"))
 async def thumb_settings(client, query):
     user_id = query.from_user.id
-    thumb = db.get_thumbnail(user_id)
-    enabled = db.get_thumbnail_enabled(user_id)
-    watermark = db.get_watermark_text(user_id) or "Not set"
+    thumb = await db.get_thumbnail(user_id)
+    enabled = await db.get_thumbnail_enabled(user_id)
+    watermark = await db.get_watermark_text(user_id) or "Not set"
     
     text = f"""
 **🖼 Thumbnail Settings**
@@ -601,24 +604,26 @@ async def thumb_settings(client, query):
 @Bot.on_callback_query(filters.regex(r"^toggle_thumb$"))
 async def toggle_thumbnail(client, query):
     user_id = query.from_user.id
-    new_state = not db.get_thumbnail_enabled(user_id)
-    db.set_thumbnail_enabled(user_id, new_state)
+    new_state = not await db.get_thumbnail_enabled(user_id)
+    await db.set_thumbnail_enabled(user_id, new_state)
     status = "enabled ✅" if new_state else "disabled ❌"
     await query.answer(f"Thumbnail {status}")
 
 @Bot.on_callback_query(filters.regex(r"^remove_thumb$"))
 async def remove_thumbnail(client, query):
     user_id = query.from_user.id
-    if db.remove_thumbnail(user_id):
+    if await db.remove_thumbnail(user_id):
         await query.answer("✅ Thumbnail removed")
     else:
         await query.answer("❌ No thumbnail exists")
 
 async def upload_thumbnail(file_path, user_id):
     try:
-        result = cloudinary.uploader.upload(file_path)
+        # Same signed request cloudinary.uploader.upload makes, sent without blocking the loop
+        params = cloudinary.utils.sign_request({"timestamp": int(time.time())}, {})
+        result = await http_client.post_json(cloudinary.utils.cloudinary_api_url("upload"), params, {"file": file_path})
         if result and "secure_url" in result:
-            db.set_thumbnail(user_id, result["secure_url"])
+            await db.set_thumbnail(user_id, result["secure_url"])
             return True, "✅ Thumbnail uploaded successfully"
         return False, "❌ Cloud upload failed"
     except Exception as e:
@@ -642,7 +647,7 @@ async def set_thumbnail(client, query):
         
         if response.text:
             if validate_thumbnail(response.text):
-                db.set_thumbnail(query.from_user.id, response.text.strip())
+                await db.set_thumbnail(query.from_user.id, response.text.strip())
                 await msg.edit("✅ Thumbnail URL set")
             else:
                 await msg.edit("❌ Invalid image URL format")
@@ -674,10 +679,10 @@ async def set_watermark(client, query):
         text = response.text.strip().lower()
         
         if text == "no":
-            db.set_watermark_text(response.from_user.id, None)
+            await db.set_watermark_text(response.from_user.id, None)
             await msg.edit("✅ Watermark removed")
         else:
-            db.set_watermark_text(response.from_user.id, text)
+            await db.set_watermark_text(response.from_user.id, text)
             await msg.edit("✅ Watermark updated")
     except TimeoutError:
         await msg.edit("⏰ Response timed out")
@@ -710,7 +715,7 @@ async def coming_soon(client, query):
 @Bot.on_callback_query(filters.regex(r"^chatid_settings$"))
 async def chatid_settings(client, query):
     user_id = query.from_user.id
-    chat_id = db.get_chat_id(user_id)
+    chat_id = await db.get_chat_id(user_id)
     
     chat_info = "Not set"
     if chat_id:
@@ -806,7 +811,7 @@ async def set_chatid(client, query):
                 chat = await client.get_chat(chat_id)
                 
                 # Set the chat ID in database
-                if db.set_chat_id(query.from_user.id, chat_id):
+                if await db.set_chat_id(query.from_user.id, chat_id):
                     chat_type = chat.type
                     chat_name = getattr(chat, 'title', None) or getattr(chat, 'first_name', None) or "Unknown"
                     
@@ -829,7 +834,7 @@ async def set_chatid(client, query):
 async def remove_chatid(client, query):
     user_id = query.from_user.id
     
-    if db.remove_chat_id(user_id):
+    if await db.remove_chat_id(user_id):
         await query.answer("✅ Chat ID removed successfully")
     else:
         await query.answer("❌ Failed to remove Chat ID")
@@ -876,7 +881,8 @@ async def rules_handler(client, message):
     user = message.from_user
     await add_user(user)
     
-    if db.is_user_banned(user.id):
+    is_banned, _ = await db.is_user_banned(user.id)
+    if is_banned:
         return await message.reply("🚫 You are banned from using this bot.")   
     try:
         await message.reply(
@@ -6,6 +6,10 @@ from psutil import disk_usage, cpu_percent, swap_memory, cpu_count, virtual_memo
 from time import time
 import requests
 from main.plugins.helpers import TimeFormatter, humanbytes
+from main.plugins.jobqueue import job_queue
+from main.plugins.mediacache import media_cache
+from main.plugins.thumbcache import screenshot_cache
+from main.plugins.mediapool import media_pool
 from config import AUTH
 
 @Bot.on_message(filters.command("stats") & filters.user(AUTH))
@@ -30,6 +34,12 @@ async def stats(client, message):
     mem_t = humanbytes(memory.total)
     mem_a = humanbytes(memory.available)
     mem_u = humanbytes(memory.used)
+    queue = job_queue.stats()
+    dedup = media_cache.stats()
+    shots = screenshot_cache.stats()
+    ffmpeg = media_pool.stats()
+    queued = ", ".join(f"{kind}: {n}" for kind, n in queue["queued"].items()) or "0"
+    running = ", ".join(f"{kind}: {n}" for kind, n in queue["running"].items()) or "0"
     stats = f'Bot Uptime: {currentTime}\n'\
             f'OS Uptime: {osUptime}\n'\
             f'Total Disk Space: {total}\n'\
@@ -45,6 +55,11 @@ async def stats(client, message):
             f'Memory Total: {mem_t}\n'\
             f'Memory Free: {mem_a}\n'\
             f'Memory Used: {mem_u}\n'\
+            f'Jobs Queued: {queued} | Running: {running}\n'\
+            f'Avg Queue Wait: {queue["avg_wait"]}s\n'\
+            f'Media Cache: {dedup["hits"]}/{dedup["lookups"]} hits ({dedup["hit_rate"]}%)\n'\
+            f'FFmpeg: {ffmpeg["running"]} running | {ffmpeg["queued"]} queued | {ffmpeg["timeouts"]} timed out\n'\
+            f'Screenshot Cache: {shots["memory_hits"]} memory + {shots["disk_hits"]} disk / {shots["lookups"]} ({shots["hit_rate"]}%)\n'\
             f'Powered by **__[Team Voice](https://t.me/officialharsh_g)__**\n'
     
     await message.reply(f"{stats}")
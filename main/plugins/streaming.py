@@ -0,0 +1,166 @@
+import asyncio
+import math
+import logging
+
+from pyrogram import raw, types, utils
+from pyrogram.enums import ParseMode
+
+from main.plugins.ratelimit import limiter, upload_limiter
+
+logger = logging.getLogger(__name__)
+
+# Telegram upload parts must all be the same size; stream_media yields
+# 1 MiB chunks, which split evenly into two of these
+STREAM_PART_SIZE = 512 * 1024
+# Parts held in memory between the download and upload sides (8 MiB)
+STREAM_BUFFER_PARTS = 16
+STREAM_UPLOAD_WORKERS = 4
+# Files above this must go through SaveBigFilePart
+BIG_FILE_SIZE = 10 * 1024 * 1024
+# Same ceiling upload_media uses before it falls back to splitting
+STREAM_SIZE_LIMIT = 2000 * 1024 * 1024
+
+def streamable_media(msg):
+    """The media object of a message the pipe can re-upload, or None."""
+    media = msg.video or msg.document or msg.audio
+    if media is None or not getattr(media, 'file_size', None):
+        return None
+    if media.file_size > STREAM_SIZE_LIMIT:
+        return None
+    return media
+
+async def pipe_upload(userbot, client, msg, file_size, file_name, progress=None, progress_args=()):
+    """Upload a message's media through `client` while `userbot` is still downloading it.
+
+    Download chunks go through a bounded queue to STREAM_UPLOAD_WORKERS
+    part uploaders, so memory use is capped at STREAM_BUFFER_PARTS parts and
+    nothing touches the disk. Returns the InputFile for messages.SendMedia.
+    """
+    file_id = client.rnd_id()
+    total_parts = max(1, math.ceil(file_size / STREAM_PART_SIZE))
+    is_big = file_size > BIG_FILE_SIZE
+    queue = asyncio.Queue(maxsize=STREAM_BUFFER_PARTS)
+    errors = []
+    uploaded = 0
+
+    async def upload_worker():
+        nonlocal uploaded
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            if errors:
+                # Keep draining so the download side never blocks on a dead pipe
+                continue
+            part_index, data = item
+            try:
+                if is_big:
+                    rpc = raw.functions.upload.SaveBigFilePart(
+                        file_id=file_id,
+                        file_part=part_index,
+                        file_total_parts=total_parts,
+                        bytes=data
+                    )
+                else:
+                    rpc = raw.functions.upload.SaveFilePart(file_id=file_id, file_part=part_index, bytes=data)
+                await upload_limiter.call(client.invoke, rpc)
+                uploaded += len(data)
+                if progress:
+                    await progress(uploaded, file_size, *progress_args)
+            except Exception as e:
+                errors.append(e)
+
+    workers = [asyncio.create_task(upload_worker()) for _ in range(STREAM_UPLOAD_WORKERS)]
+    try:
+        part_index = 0
+        buffer = b""
+        async for chunk in userbot.stream_media(msg):
+            if errors:
+                raise errors[0]
+            buffer += chunk
+            while len(buffer) >= STREAM_PART_SIZE:
+                await queue.put((part_index, buffer[:STREAM_PART_SIZE]))
+                buffer = buffer[STREAM_PART_SIZE:]
+                part_index += 1
+        if buffer or part_index == 0:
+            await queue.put((part_index, buffer))
+            part_index += 1
+        if part_index != total_parts:
+            raise ValueError(f"Streamed {part_index} parts, expected {total_parts}")
+    finally:
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers, return_exceptions=True)
+    if errors:
+        raise errors[0]
+
+    if is_big:
+        return raw.types.InputFileBig(id=file_id, parts=total_parts, name=file_name)
+    return raw.types.InputFile(id=file_id, parts=total_parts, name=file_name, md5_checksum="")
+
+def streamed_file_name(msg):
+    media = streamable_media(msg)
+    return getattr(media, 'file_name', None) or ("video.mp4" if msg.video else "audio.mp3" if msg.audio else "document.file")
+
+async def send_streamed(userbot, client, msg, target_chat_id, caption, topic_id, thumb=None, progress=None, progress_args=(), input_file=None):
+    """Clone a video, document or audio message without a temp file.
+
+    Same result as downloading and calling send_video/send_document/send_audio,
+    but the upload starts as soon as the first part arrives. `input_file` is
+    a pipe_upload result made earlier, which is then only sent.
+    """
+    media = streamable_media(msg)
+    file_name = streamed_file_name(msg)
+    if input_file is None:
+        input_file = await pipe_upload(userbot, client, msg, media.file_size, file_name, progress, progress_args)
+
+    attributes = [raw.types.DocumentAttributeFilename(file_name=file_name)]
+    if msg.video:
+        attributes.append(raw.types.DocumentAttributeVideo(
+            duration=msg.video.duration or 0,
+            w=msg.video.width or 0,
+            h=msg.video.height or 0,
+            supports_streaming=True
+        ))
+    elif msg.audio:
+        attributes.append(raw.types.DocumentAttributeAudio(
+            duration=msg.audio.duration or 0,
+            performer=msg.audio.performer,
+            title=msg.audio.title
+        ))
+
+    return await send_uploaded_document(
+        client, target_chat_id, input_file, caption, topic_id,
+        mime_type=getattr(media, 'mime_type', None),
+        attributes=attributes,
+        thumb=thumb
+    )
+
+async def send_uploaded_document(client, target_chat_id, input_file, caption, topic_id, mime_type=None, attributes=None, thumb=None):
+    """Post a file already uploaded with SaveFilePart/SaveBigFilePart (or
+    client.save_file) as a document message, parsed like send_document's result."""
+    if attributes is None:
+        attributes = [raw.types.DocumentAttributeFilename(file_name=input_file.name)]
+    r = await limiter.call(
+        client.invoke,
+        raw.functions.messages.SendMedia(
+            peer=await client.resolve_peer(target_chat_id),
+            media=raw.types.InputMediaUploadedDocument(
+                mime_type=mime_type or "application/octet-stream",
+                file=input_file,
+                thumb=await client.save_file(thumb) if thumb else None,
+                attributes=attributes
+            ),
+            reply_to=raw.types.InputReplyToMessage(reply_to_msg_id=topic_id) if topic_id else None,
+            random_id=client.rnd_id(),
+            **await utils.parse_text_entities(client, caption or "", ParseMode.MARKDOWN, None)
+        )
+    )
+    for update in r.updates:
+        if isinstance(update, (raw.types.UpdateNewMessage, raw.types.UpdateNewChannelMessage)):
+            return await types.Message._parse(
+                client, update.message,
+                {u.id: u for u in r.users},
+                {c.id: c for c in r.chats}
+            )
+    return None
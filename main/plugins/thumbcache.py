@@ -0,0 +1,139 @@
+import os
+import hashlib
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Generated screenshots are kept as JPEGs on disk up to SCREENSHOT_DISK_BYTES
+# and the most recent ones in memory up to SCREENSHOT_MEMORY_BYTES, each
+# evicted least-recently-used
+SCREENSHOT_CACHE_DIR = os.path.join("downloads", "screenshots")
+SCREENSHOT_DISK_BYTES = 512 * 1024 * 1024
+SCREENSHOT_MEMORY_BYTES = 32 * 1024 * 1024
+
+class ScreenshotCache:
+    """Screenshots generated by `helpers.screenshot`, reused across users.
+
+    A screenshot only depends on the source video and the watermark drawn on
+    it, so it is keyed by (file_unique_id, watermark text). Files on disk are
+    named after a hash of the key, which lets the disk tier survive restarts.
+    """
+
+    def __init__(self, directory=SCREENSHOT_CACHE_DIR, disk_bytes=SCREENSHOT_DISK_BYTES, memory_bytes=SCREENSHOT_MEMORY_BYTES):
+        self.directory = directory
+        self.disk_bytes = disk_bytes
+        self.memory_bytes = memory_bytes
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._disk = OrderedDict()
+        self._disk_size = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._load()
+
+    def _load(self):
+        """Index the files a previous process left, oldest first"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            entries = []
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if name.endswith(".jpg") and os.path.isfile(path):
+                    st = os.stat(path)
+                    entries.append((st.st_mtime, name[:-4], st.st_size))
+            for _, digest, size in sorted(entries):
+                self._disk[digest] = size
+                self._disk_size += size
+            self._evict_disk()
+        except Exception as e:
+            logger.error(f"Error loading screenshot cache: {e}")
+
+    @staticmethod
+    def _digest(media_id, watermark_text):
+        return hashlib.sha1(f"{media_id}|{watermark_text or ''}".encode()).hexdigest()
+
+    def _path(self, digest):
+        return os.path.join(self.directory, f"{digest}.jpg")
+
+    def _remember(self, digest, data):
+        if len(data) > self.memory_bytes:
+            return
+        old = self._memory.pop(digest, None)
+        if old is not None:
+            self._memory_size -= len(old)
+        self._memory[digest] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    def _evict_disk(self):
+        while self._disk_size > self.disk_bytes and self._disk:
+            digest, size = self._disk.popitem(last=False)
+            self._disk_size -= size
+            try:
+                os.remove(self._path(digest))
+            except OSError:
+                pass
+
+    def get(self, media_id, watermark_text, out):
+        """Write the cached screenshot to `out`; returns `out`, or None on a miss"""
+        if not media_id:
+            return None
+        digest = self._digest(media_id, watermark_text)
+        data = self._memory.get(digest)
+        try:
+            if data is not None:
+                self._memory.move_to_end(digest)
+                self.memory_hits += 1
+            elif digest in self._disk:
+                with open(self._path(digest), "rb") as f:
+                    data = f.read()
+                self._remember(digest, data)
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+                return None
+            if digest in self._disk:
+                self._disk.move_to_end(digest)
+            with open(out, "wb") as f:
+                f.write(data)
+            return out
+        except Exception as e:
+            logger.error(f"Error reading cached screenshot: {e}")
+            self._memory.pop(digest, None)
+            self._disk_size -= self._disk.pop(digest, 0)
+            self.misses += 1
+            return None
+
+    def put(self, media_id, watermark_text, path):
+        """Store a freshly generated screenshot; `path` itself is left to the caller"""
+        if not media_id:
+            return
+        digest = self._digest(media_id, watermark_text)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            with open(self._path(digest), "wb") as f:
+                f.write(data)
+            self._disk_size += len(data) - self._disk.pop(digest, 0)
+            self._disk[digest] = len(data)
+            self._evict_disk()
+            self._remember(digest, data)
+        except Exception as e:
+            logger.error(f"Error caching screenshot: {e}")
+
+    def stats(self):
+        """Hits per tier, lookups and hit rate since start, for /stats"""
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "lookups": lookups,
+            "hit_rate": round(hits * 100 / lookups, 1) if lookups else 0
+        }
+
+screenshot_cache = ScreenshotCache()
@@ -0,0 +1,87 @@
+import asyncio
+import logging
+from collections import OrderedDict
+
+from PIL import Image, ImageDraw, ImageFont
+
+logger = logging.getLogger(__name__)
+
+# Same look the ffmpeg drawtext filter used: bold 90px chocolate text,
+# centred 50px above the bottom edge
+WATERMARK_COLOR = (210, 105, 30, 255)
+WATERMARK_FONT_SIZE = 90
+WATERMARK_MARGIN = 50
+WATERMARK_FONTS = (
+    "arialbd.ttf",
+    "Arial Bold.ttf",
+    "/usr/share/fonts/truetype/msttcorefonts/Arial_Bold.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+    "DejaVuSans-Bold.ttf"
+)
+# Rendered overlays kept, least-recently-used past this
+WATERMARK_CACHE_SIZE = 512
+
+def load_font():
+    for name in WATERMARK_FONTS:
+        try:
+            return ImageFont.truetype(name, WATERMARK_FONT_SIZE)
+        except OSError:
+            continue
+    logger.warning("No TrueType font found for watermarks, using Pillow's default")
+    return ImageFont.load_default()
+
+class WatermarkOverlays:
+    """Per-user watermark text rendered once into an RGBA image.
+
+    A watermarked thumbnail is then one plain frame grab plus an alpha blit
+    done in a worker thread, instead of an ffmpeg drawtext graph that loads
+    the font for every video. Entries are keyed by (user, text) and dropped
+    by `invalidate` when the user sets a new watermark.
+    """
+
+    def __init__(self, size=WATERMARK_CACHE_SIZE):
+        self.size = size
+        self._font = None
+        self._overlays = OrderedDict()
+
+    def _render(self, text):
+        if self._font is None:
+            self._font = load_font()
+        left, top, right, bottom = self._font.getbbox(text)
+        overlay = Image.new("RGBA", (max(1, right - left), max(1, bottom - top)), (0, 0, 0, 0))
+        ImageDraw.Draw(overlay).text((-left, -top), text, font=self._font, fill=WATERMARK_COLOR)
+        return overlay
+
+    def overlay(self, user_id, text):
+        key = (user_id, text)
+        overlay = self._overlays.get(key)
+        if overlay is not None:
+            self._overlays.move_to_end(key)
+            return overlay
+        overlay = self._render(text)
+        self._overlays[key] = overlay
+        while len(self._overlays) > self.size:
+            self._overlays.popitem(last=False)
+        return overlay
+
+    def invalidate(self, user_id):
+        for key in [key for key in self._overlays if key[0] == user_id]:
+            del self._overlays[key]
+
+    @staticmethod
+    def _composite(path, overlay):
+        with Image.open(path) as frame:
+            frame = frame.convert("RGB")
+        x = (frame.width - overlay.width) // 2
+        y = frame.height - overlay.height - WATERMARK_MARGIN
+        frame.paste(overlay, (x, y), overlay)
+        frame.save(path, "JPEG", quality=90)
+        return path
+
+    async def apply(self, path, user_id, text):
+        """Draw the user's watermark onto the JPEG at `path`, in place"""
+        # The cache is only touched on the loop; the thread gets a finished overlay
+        overlay = self.overlay(user_id, text)
+        return await asyncio.to_thread(self._composite, path, overlay)
+
+watermark_overlays = WatermarkOverlays()
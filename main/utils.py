@@ -6,6 +6,11 @@ from pathlib import Path
 def load_plugins(plugin_name):
     path = Path(f"main/plugins/{plugin_name}.py")
     name = f"main.plugins.{plugin_name}"
+    if name in sys.modules:
+        # Already imported by another plugin; executing it again would create
+        # a second copy of its module state (db cache, handler registrations)
+        print(f"main has Imported {plugin_name}")
+        return
     spec = importlib.util.spec_from_file_location(name, path)
     load = importlib.util.module_from_spec(spec)
     load.logger = logging.getLogger(plugin_name)
@@ -0,0 +1,49 @@
+import importlib.util
+import sys
+import types
+from pathlib import Path
+from unittest import mock
+
+PLUGINS_DIR = Path(__file__).resolve().parent.parent / "main" / "plugins"
+
+
+class FakeModule(types.ModuleType):
+    """Stand-in for a module a plugin imports; names not set explicitly are
+    MagicMocks, or exception classes in modules named like `*.errors`."""
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        if self.__name__.endswith("errors"):
+            value = type(name, (Exception,), {})
+        else:
+            value = mock.MagicMock(name=f"{self.__name__}.{name}")
+        setattr(self, name, value)
+        return value
+
+
+def fake_module(name, **attrs):
+    module = FakeModule(name)
+    for attr, value in attrs.items():
+        setattr(module, attr, value)
+    return module
+
+
+def passthrough(*args, **kwargs):
+    """A handler decorator (`Bot.on_message(...)`) that leaves the function as is"""
+    return lambda func: func
+
+
+def load_plugin(monkeypatch, name, fakes):
+    """Load main/plugins/<name>.py on its own.
+
+    Importing the `main` package starts the Telegram clients, so the module
+    is loaded from its file with its imports served from `fakes`, a dict of
+    module name to module.
+    """
+    for module_name, module in fakes.items():
+        monkeypatch.setitem(sys.modules, module_name, module)
+    spec = importlib.util.spec_from_file_location(f"main.plugins.{name}", PLUGINS_DIR / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
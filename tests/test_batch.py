@@ -0,0 +1,107 @@
+import asyncio
+import contextvars
+import types
+from datetime import timedelta
+from unittest import mock
+
+import pytest
+
+from conftest import fake_module, load_plugin, passthrough
+
+
+@pytest.fixture
+def batch(monkeypatch):
+    bot = fake_module("Bot", on_message=passthrough, on_callback_query=passthrough)
+    db = mock.MagicMock()
+    db.get_user_context = mock.AsyncMock()
+    db.get_resumable_batch_job = mock.AsyncMock(return_value={"_id": "job"})
+    fakes = {
+        "main": fake_module("main", Bot=bot, userbot=mock.MagicMock()),
+        "main.plugins.db": fake_module("main.plugins.db", db=db),
+        "config": fake_module("config", AUTH=[1], ADMIN_ONLY=False, BATCH_WORKERS=2, BATCH_SLOTS=2)
+    }
+    for name in (
+        "main.plugins.pyroplug", "main.plugins.ratelimit", "main.plugins.chatcache",
+        "main.plugins.mediacache", "main.plugins.progress", "main.plugins.helpers",
+        "main.plugins.jobqueue", "pyrogram", "pyrogram.types", "pyrogram.errors"
+    ):
+        fakes[name] = fake_module(name)
+    module = load_plugin(monkeypatch, "batch", fakes)
+    module.job_queue.has_job.return_value = False
+    monkeypatch.setattr(module, "queue_batch", mock.AsyncMock())
+    return module
+
+
+def resume(batch, user_id, ctx):
+    batch.db.get_user_context.return_value = ctx
+    message = types.SimpleNamespace(from_user=types.SimpleNamespace(id=user_id), reply=mock.AsyncMock())
+    asyncio.run(batch.resume_command(None, message))
+    return message
+
+
+def test_resume_refuses_unauthorised_user(batch):
+    ctx = types.SimpleNamespace(is_authorized=False, expiration_remaining=None)
+    message = resume(batch, 2, ctx)
+
+    message.reply.assert_awaited_once_with("🚫 **You are not authorized to use batch!**")
+    batch.db.get_resumable_batch_job.assert_not_awaited()
+    batch.queue_batch.assert_not_awaited()
+
+
+def test_resume_refuses_expired_user(batch):
+    ctx = types.SimpleNamespace(is_authorized=False, expiration_remaining=timedelta(0))
+    resume(batch, 2, ctx)
+
+    batch.queue_batch.assert_not_awaited()
+
+
+def test_resume_queues_authorised_user(batch):
+    ctx = types.SimpleNamespace(is_authorized=True, expiration_remaining=None)
+    resume(batch, 2, ctx)
+
+    batch.queue_batch.assert_awaited_once_with(2, {"batch_job_id": "job"}, ctx)
+
+
+def test_streamed_items_upload_in_parallel(batch, monkeypatch):
+    messages = [types.SimpleNamespace(id=msg_id, video=types.SimpleNamespace(file_size=10)) for msg_id in range(1, 5)]
+    running, overlap, committed = 0, 0, []
+
+    async def prestream_media(userbot, client, msg):
+        nonlocal running, overlap
+        running += 1
+        overlap = max(overlap, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+        return f"upload-{msg.id}"
+
+    async def get_msg(userbot, client, sender, edit_id, link, i, ctx, prepared):
+        committed.append((prepared["msg_id"], prepared["uploaded"]))
+
+    monkeypatch.setattr(batch, "prestream_media", prestream_media)
+    monkeypatch.setattr(batch, "get_msg", get_msg)
+    monkeypatch.setattr(batch, "will_stream", lambda msg, ctx: True)
+    monkeypatch.setattr(batch, "needs_download", lambda msg: True)
+    monkeypatch.setattr(batch, "check_channel_content_protection", mock.AsyncMock(return_value=True))
+    monkeypatch.setattr(batch, "check_user_limits", mock.AsyncMock(return_value=(True, None)))
+    monkeypatch.setattr(batch, "update_countdown", mock.AsyncMock())
+    monkeypatch.setattr(batch, "release_batch_quota", mock.AsyncMock())
+    monkeypatch.setattr(batch, "extract_chat_info", mock.AsyncMock(
+        return_value={"channel_name": "source", "chat_id": -1001, "chat_type": "private"}
+    ))
+    batch.limiter.call = mock.AsyncMock(return_value=messages)
+    batch.batch_limiter.acquire = mock.AsyncMock()
+    batch.media_cache.lookup = mock.AsyncMock(return_value=None)
+    batch.chat_cache.get = mock.AsyncMock()
+    batch.chat_cache.pinned_ids = mock.AsyncMock(return_value=set())
+    for name in ("create_batch_job", "checkpoint_batch_job", "set_batch_job_status", "set_user_in_batch"):
+        setattr(batch.db, name, mock.AsyncMock())
+    batch.reserved_billing = contextvars.ContextVar("reserved_billing", default=False)
+    batch.batch.add("1")
+
+    ctx = types.SimpleNamespace(is_authorized=True, chat_id=None)
+    asyncio.run(batch.run_batch(
+        mock.MagicMock(), mock.AsyncMock(), 1, 99, "https://t.me/c/1001", [m.id for m in messages], ctx=ctx
+    ))
+
+    assert overlap == batch.BATCH_WORKERS
+    assert committed == [(m.id, f"upload-{m.id}") for m in messages]
@@ -0,0 +1,60 @@
+import asyncio
+from unittest import mock
+
+import pytest
+
+from conftest import fake_module, load_plugin
+
+
+@pytest.fixture
+def jobqueue(monkeypatch):
+    async def save_queued_job(*args):
+        # Yield like a real insert, so a second submit can arrive meanwhile
+        await asyncio.sleep(0.01)
+        return "doc"
+
+    db = mock.MagicMock()
+    db.save_queued_job = mock.AsyncMock(side_effect=save_queued_job)
+    db.remove_queued_job = mock.AsyncMock()
+    db.set_queued_job_status = mock.AsyncMock()
+    fakes = {
+        "main.plugins.db": fake_module("main.plugins.db", db=db),
+        "config": fake_module("config", AUTH=[], QUEUE_WORKERS=1, DOWNLOAD_SLOTS=1, UPLOAD_SLOTS=1)
+    }
+    return load_plugin(monkeypatch, "jobqueue", fakes)
+
+
+def test_concurrent_submits_queue_one_job(jobqueue):
+    async def main():
+        queue = jobqueue.JobQueue()
+        queue.register("clone", mock.AsyncMock())
+        return await asyncio.gather(*(queue.submit("clone", 1, {"n": n}) for n in range(2)))
+
+    jobs = asyncio.run(main())
+
+    assert sum(job is not None for job in jobs) == 1
+    jobqueue.db.save_queued_job.assert_awaited_once()
+
+
+def test_failed_insert_frees_the_slot(jobqueue):
+    jobqueue.db.save_queued_job.side_effect = RuntimeError("insert failed")
+    queue = jobqueue.JobQueue()
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(queue.submit("clone", 1, {}))
+    assert not queue.has_job(1, "clone")
+
+
+def test_cancel_during_insert_drops_the_job(jobqueue):
+    async def main():
+        queue = jobqueue.JobQueue()
+        queue.register("clone", mock.AsyncMock())
+        submit = asyncio.create_task(queue.submit("clone", 1, {}))
+        await asyncio.sleep(0)
+        await queue.cancel(1, "clone")
+        return queue, await submit
+
+    queue, job = asyncio.run(main())
+
+    assert job is None and not queue.has_job(1, "clone")
+    jobqueue.db.remove_queued_job.assert_awaited_once_with("doc")
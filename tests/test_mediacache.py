@@ -0,0 +1,55 @@
+import asyncio
+import sys
+import types
+from unittest import mock
+
+import pytest
+
+from conftest import fake_module, load_plugin
+
+
+@pytest.fixture
+def mediacache(monkeypatch):
+    db = mock.MagicMock()
+    db.get_cached_media = mock.AsyncMock(return_value={"kind": "video", "file_id": "cached"})
+    db.remove_cached_media = mock.AsyncMock()
+    limiter = mock.MagicMock()
+    limiter.call = mock.AsyncMock()
+    fakes = {
+        "main.plugins.db": fake_module("main.plugins.db", db=db),
+        "main.plugins.ratelimit": fake_module("main.plugins.ratelimit", limiter=limiter),
+        "pyrogram.enums": fake_module("pyrogram.enums"),
+        "pyrogram.errors": fake_module("pyrogram.errors")
+    }
+    return load_plugin(monkeypatch, "mediacache", fakes)
+
+
+def source_message():
+    video = types.SimpleNamespace(file_unique_id="src", file_size=100)
+    return types.SimpleNamespace(video=video)
+
+
+def send(mediacache, error):
+    mediacache.limiter.call.side_effect = error
+    ctx = types.SimpleNamespace(thumbnail=None, thumbnail_enabled=False, watermark_text=None)
+    cache = mediacache.MediaCache()
+    result = asyncio.run(cache.send(mock.MagicMock(), source_message(), 1, "", None, ctx))
+    return cache, result
+
+
+def test_stale_file_id_is_evicted(mediacache):
+    cache, result = send(mediacache, mediacache.FileReferenceExpired("expired"))
+
+    assert result is None and cache.misses == 1
+    mediacache.db.remove_cached_media.assert_awaited_once()
+    assert not cache._entries
+
+
+@pytest.mark.parametrize("error", ["FloodWait", "ChatWriteForbidden", "TimeoutError"])
+def test_other_failures_keep_the_entry(mediacache, error):
+    exception = TimeoutError() if error == "TimeoutError" else getattr(sys.modules["pyrogram.errors"], error)()
+    cache, result = send(mediacache, exception)
+
+    assert result is None and cache.misses == 1
+    mediacache.db.remove_cached_media.assert_not_awaited()
+    assert cache._entries
@@ -0,0 +1,30 @@
+import asyncio
+import json
+from unittest import mock
+
+import pytest
+
+from conftest import fake_module, load_plugin
+
+PROBED = json.dumps({"streams": [{"width": 1280, "height": 720, "duration": "61.2"}]}).encode()
+
+
+@pytest.fixture
+def probe(monkeypatch):
+    media_pool = mock.MagicMock()
+    media_pool.output = mock.AsyncMock()
+    fakes = {"main.plugins.mediapool": fake_module("main.plugins.mediapool", media_pool=media_pool)}
+    return load_plugin(monkeypatch, "probe", fakes)
+
+
+@pytest.mark.parametrize("failure", [None, b"not json"])
+def test_failed_probe_is_retried(probe, tmp_path, failure):
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"\0" * 16)
+    probe.media_pool.output.side_effect = [failure, PROBED]
+    prober = probe.VideoProber()
+
+    assert asyncio.run(prober.probe(video)) == {'width': 0, 'height': 0, 'duration': 0}
+    assert asyncio.run(prober.probe(video)) == {'width': 1280, 'height': 720, 'duration': 61}
+    assert asyncio.run(prober.probe(video))['duration'] == 61
+    assert probe.media_pool.output.await_count == 2
@@ -0,0 +1,70 @@
+import asyncio
+import importlib.util
+import inspect
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+PROGRESS_PATH = Path(__file__).resolve().parent.parent / "main" / "plugins" / "progress.py"
+
+
+class StopTransmission(Exception):
+    pass
+
+
+class FakeClient:
+    name = "fake"
+
+    def stop_transmission(self):
+        raise StopTransmission
+
+
+@pytest.fixture
+def progress(monkeypatch):
+    """main.plugins.progress loaded on its own.
+
+    Importing the `main` package starts the Telegram clients, so the module
+    is loaded from its file with its two in-repo imports replaced.
+    """
+    helpers = types.ModuleType("main.plugins.helpers")
+    helpers.TimeFormatter = lambda milliseconds: f"{milliseconds} ms"
+    helpers.humanbytes = lambda size: f"{size} B"
+    ratelimit = types.ModuleType("main.plugins.ratelimit")
+    ratelimit.limiter = None
+    monkeypatch.setitem(sys.modules, "main.plugins.helpers", helpers)
+    monkeypatch.setitem(sys.modules, "main.plugins.ratelimit", ratelimit)
+
+    spec = importlib.util.spec_from_file_location("progress_under_test", PROGRESS_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+async def dispatch(progress, current, total, *args):
+    """What Pyrogram does with a `progress=` callback (save_file, get_file):
+    coroutine functions are awaited, anything else goes to the executor."""
+    if inspect.iscoroutinefunction(progress):
+        await progress(current, total, *args)
+        return True
+    await asyncio.get_running_loop().run_in_executor(None, progress, current, total, *args)
+    return False
+
+
+def test_update_is_awaited_by_pyrogram(progress, monkeypatch):
+    published = []
+    monkeypatch.setattr(progress.progress_hub, "publish", lambda *args, **kwargs: published.append(kwargs))
+    message = types.SimpleNamespace(chat=types.SimpleNamespace(id=1), id=2, photo=None)
+    reporter = progress.ProgressReporter(FakeClient(), "Uploading", message)
+
+    assert asyncio.run(dispatch(reporter.update, 10, 10))
+    assert published and published[0]["final"]
+
+
+def test_cancel_stops_the_transmission(progress):
+    reporter = progress.ProgressReporter(FakeClient(), "Uploading", None, owner=7)
+    progress.cancel_transfers(7)
+
+    with pytest.raises(StopTransmission):
+        asyncio.run(dispatch(reporter.update, 1, 10))